@@ -0,0 +1,317 @@
+"""Memory Aids Codec
+memory_aids 的压缩存储：安装了 zstandard 时使用 zstd + 训练字典，否则使用 zlib 预置字典
+
+blob 格式: [1 字节编码][4 字节字典 ID][2 字节辅助工具数量][压缩数据]
+辅助工具数量写在头部，列表接口统计数量时无需解压。
+
+字典目录中的文件永不删除：旧 blob 头部记录的字典 ID 仍可找到对应字典。
+解码时遇到未加载的字典 ID 会到字典目录中按 ID 加载，滚动重启期间其他 worker 用新字典写入的 blob
+在尚未重启的 worker 上同样可以解码（新写入仍使用本进程启动时的当前字典）。
+重新训练字典并查看压缩率:
+    python aids_codec.py train [--samples aids.ndjson] [--size 32768]
+    python aids_codec.py report [--samples aids.ndjson]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import zlib
+from collections import Counter
+from typing import Iterable, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+ZLIB = b"z"
+ZSTD = b"s"
+_HEADER = struct.Struct("<cIH")
+_CURRENT_FILE = "current"
+_ZLIB_MAX_DICT = 32 * 1024
+
+# 内置 zlib 预置字典：生成结果中反复出现的键、类型取值与结构片段（越常见越靠后）
+_DEFAULT_ZDICT = "".join([
+    '"keyPrinciples":[{"concept":"', '","example":"', '"corePoint":"', '"theme":"',
+    '"scenes":[{"principle":"', '","scene":"', '","anchor":"',
+    '"type":"acronym"', '"type":"story"', '"type":"association"', '"type":"tactile"',
+    '"content":[{"dynasty":"', '","texture":"', '","feeling":"', '","sound":"', '","rhythm":"',
+    '","image":"', '","color":"#', '","association":"',
+    '"type":"auditory"', '"type":"visual"', '"type":"rhyme"',
+    '{"id":"visual-1","title":"视觉联想","type":"visual",',
+    '{"id":"auditory-1","title":"听觉联想","type":"auditory",',
+    '"sensoryAssociations":[{"id":"', '"mnemonics":[{"id":"', '","explanation":"',
+    '","title":"', '","content":"', '","type":"',
+    '{"mindMap":{"id":"root","label":"', '","children":[{"id":"', '"},{"id":"', '","label":"',
+]).encode("utf-8")
+
+
+def count_memory_aids(aids) -> int:
+    """思维导图算 1 个，再加上助记法与感官联想的数量"""
+    if not aids:
+        return 0
+    return (1 if aids.get("mindMap") else 0) + len(aids.get("mnemonics") or []) + len(aids.get("sensoryAssociations") or [])
+
+
+def _dict_id(data: bytes) -> int:
+    return zlib.crc32(data)
+
+
+def _dict_filename(kind: bytes, dict_id: int) -> str:
+    return f"{'zstd' if kind == ZSTD else 'zlib'}-{dict_id:08x}.dict"
+
+
+class AidsCodec:
+    """memory_aids 编解码器"""
+
+    def __init__(self, dict_dir: str = ""):
+        self.dict_dir = dict_dir
+        self._dicts = {}
+        self._local = threading.local()
+        self._load_lock = threading.Lock()
+        self.current = self._register(ZLIB, _DEFAULT_ZDICT)
+        if dict_dir:
+            self.load_dir(dict_dir)
+
+    def _register(self, kind: bytes, data: bytes):
+        dict_id = _dict_id(data)
+        self._dicts[dict_id] = (kind, data)
+        return kind, dict_id
+
+    def load_dir(self, dict_dir: str) -> None:
+        if not os.path.isdir(dict_dir):
+            return
+        for name in sorted(os.listdir(dict_dir)):
+            if not name.endswith(".dict"):
+                continue
+            kind = ZSTD if name.startswith("zstd-") else ZLIB
+            if kind == ZSTD and zstandard is None:
+                logger.warning(f"Skipping {name}: zstandard is not installed")
+                continue
+            with open(os.path.join(dict_dir, name), "rb") as f:
+                self._register(kind, f.read())
+        current_path = os.path.join(dict_dir, _CURRENT_FILE)
+        if os.path.exists(current_path):
+            with open(current_path) as f:
+                name = f.read().strip()
+            kind = ZSTD if name.startswith("zstd-") else ZLIB
+            dict_id = int(name.split("-")[1].split(".")[0], 16)
+            if dict_id in self._dicts:
+                self.current = (kind, dict_id)
+
+    def _load_dict(self, kind: bytes, dict_id: int) -> bool:
+        """按 ID 从字典目录加载一个字典（其他进程训练的）；找不到时返回 False"""
+        if not self.dict_dir or (kind == ZSTD and zstandard is None):
+            return False
+        with self._load_lock:
+            if dict_id in self._dicts:
+                return True
+            try:
+                with open(os.path.join(self.dict_dir, _dict_filename(kind, dict_id)), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return False
+            if _dict_id(data) != dict_id:
+                logger.warning(f"Ignoring {_dict_filename(kind, dict_id)}: content does not match its id")
+                return False
+            self._register(kind, data)
+            logger.info(f"Loaded memory_aids dictionary {_dict_filename(kind, dict_id)}")
+            return True
+
+    # --- 编解码 ---
+    def _zstd(self, dict_id: int, compress: bool):
+        cache = self._local.__dict__.setdefault("zstd", {})
+        key = (dict_id, compress)
+        if key not in cache:
+            zdict = zstandard.ZstdCompressionDict(self._dicts[dict_id][1])
+            cache[key] = zstandard.ZstdCompressor(level=9, dict_data=zdict) if compress else zstandard.ZstdDecompressor(dict_data=zdict)
+        return cache[key]
+
+    def compress(self, raw: bytes, count: int = 0, using=None) -> bytes:
+        kind, dict_id = using or self.current
+        if kind == ZSTD:
+            body = self._zstd(dict_id, True).compress(raw)
+        else:
+            c = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=self._dicts[dict_id][1])
+            body = c.compress(raw) + c.flush()
+        return _HEADER.pack(kind, dict_id, min(count, 0xFFFF)) + body
+
+    def decompress(self, blob: bytes) -> bytes:
+        kind, dict_id, _ = _HEADER.unpack_from(blob)
+        if dict_id not in self._dicts and not self._load_dict(kind, dict_id):
+            raise ValueError(f"Unknown memory_aids dictionary {dict_id:08x}; is AIDS_DICT_DIR missing files?")
+        body = memoryview(blob)[_HEADER.size:]
+        if kind == ZSTD:
+            return self._zstd(dict_id, False).decompress(body)
+        d = zlib.decompressobj(-15, zdict=self._dicts[dict_id][1])
+        return d.decompress(body) + d.flush()
+
+    def encode(self, aids) -> Optional[bytes]:
+        """dict -> blob；None 与已编码的 blob 原样返回"""
+        if aids is None or isinstance(aids, bytes):
+            return aids
+        raw = json.dumps(aids, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return self.compress(raw, count_memory_aids(aids))
+
+    def decode(self, blob) -> Optional[dict]:
+        if blob is None or isinstance(blob, dict):
+            return blob
+        return json.loads(self.decompress(blob))
+
+    @staticmethod
+    def count(blob) -> int:
+        if blob is None:
+            return 0
+        if isinstance(blob, dict):
+            return count_memory_aids(blob)
+        return _HEADER.unpack_from(blob)[2]
+
+    # --- 字典训练 ---
+    def train(self, samples: List[bytes], size: int) -> tuple:
+        """训练新字典并写入字典目录，设为当前字典"""
+        if not self.dict_dir:
+            raise ValueError("AIDS_DICT_DIR (or STORE_DATA_DIR) must be set to save a trained dictionary")
+        if zstandard is not None:
+            kind, data = ZSTD, zstandard.train_dictionary(size, samples).as_bytes()
+        else:
+            kind, data = ZLIB, _build_zlib_dictionary(samples, min(size, _ZLIB_MAX_DICT))
+        os.makedirs(self.dict_dir, exist_ok=True)
+        kind, dict_id = self._register(kind, data)
+        name = _dict_filename(kind, dict_id)
+        with open(os.path.join(self.dict_dir, name), "wb") as f:
+            f.write(data)
+        tmp = os.path.join(self.dict_dir, f"{_CURRENT_FILE}.tmp")
+        with open(tmp, "w") as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(self.dict_dir, _CURRENT_FILE))
+        self.current = (kind, dict_id)
+        return self.current
+
+
+def _build_zlib_dictionary(samples: List[bytes], size: int) -> bytes:
+    """按 文档频率 × 长度 选取高价值片段拼成预置字典，价值最高的放在末尾（距离最近）"""
+    token = re.compile(rb'"(?:[^"\\]|\\.)*"|[^",]+|,')
+    document_freq = Counter()
+    for sample in samples:
+        tokens = token.findall(sample)
+        fragments = set()
+        for n in (1, 2, 3, 4):
+            for i in range(len(tokens) - n + 1):
+                fragment = b"".join(tokens[i:i + n])
+                if 4 <= len(fragment) <= 96:
+                    fragments.add(fragment)
+        document_freq.update(fragments)
+    ranked = sorted(
+        (f for f, df in document_freq.items() if df >= 2),
+        key=lambda f: document_freq[f] * len(f),
+        reverse=True,
+    )
+    chosen, total = [], 0
+    for fragment in ranked:
+        if total + len(fragment) > size:
+            continue
+        if any(fragment in c for c in chosen):
+            continue
+        chosen.append(fragment)
+        total += len(fragment)
+    return b"".join(reversed(chosen))
+
+
+def _default_dict_dir() -> str:
+    if settings.AIDS_DICT_DIR:
+        return settings.AIDS_DICT_DIR
+    return os.path.join(settings.STORE_DATA_DIR, "aids_dicts") if settings.STORE_DATA_DIR else ""
+
+
+codec = AidsCodec(_default_dict_dir())
+
+
+# --- 命令行工具 ---
+def _load_samples(path: Optional[str]) -> List[bytes]:
+    """从 NDJSON 文件（每行一个 aids 或带 memory_aids 字段的条目）或存储快照 + 日志中收集样本"""
+    aids_list = []
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    aids_list.append(row.get("memory_aids", row) if isinstance(row, dict) else row)
+    elif settings.STORE_DATA_DIR:
+        import mock_store  # 延迟导入：mock_store 依赖本模块
+        # 按 STORE_BACKEND 打开同一种日志（WAL 或 SQLite），只读取、不修复
+        journal = mock_store._make_journal(settings.STORE_DATA_DIR, settings.STORE_BACKEND)
+        try:
+            state, tail = journal.recover(repair=False)
+            items = {}
+            if state is not None:
+                items.update((key, item["memory_aids"]) for key, item in state["tables"]["memory_items"].items())
+            for _, op, table, key, value in tail:
+                if table != "memory_items":
+                    continue
+                if op == "put":
+                    items[key] = value["memory_aids"]
+                elif op == "update" and value.get("memory_aids") is not None:
+                    items[key] = value["memory_aids"]
+                elif op == "delete":
+                    items.pop(key, None)
+        finally:
+            journal.close()
+        aids_list.extend(items.values())
+    else:
+        raise SystemExit("Provide --samples or set STORE_DATA_DIR")
+    samples = []
+    for aids in aids_list:
+        aids = codec.decode(aids)
+        if aids:
+            samples.append(json.dumps(aids, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    return samples
+
+
+def _report(samples: Iterable[bytes], label: str) -> None:
+    samples = list(samples)
+    raw = sum(len(s) for s in samples)
+    plain = sum(len(zlib.compress(s, 9)) for s in samples)
+    stored = sum(len(codec.compress(s)) for s in samples)
+    kind, dict_id = codec.current
+    print(f"[{label}] 样本数 {len(samples)}，原始 {raw} 字节")
+    print(f"  zlib（无字典）:           {plain:>10} 字节  压缩率 {raw / max(plain, 1):.2f}x")
+    print(f"  当前字典 {_dict_filename(kind, dict_id)}: {stored:>10} 字节  压缩率 {raw / max(stored, 1):.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="memory_aids 压缩字典工具")
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--samples", help="NDJSON 样本文件；默认读取 STORE_DATA_DIR 中的存储")
+    parser.add_argument("--size", type=int, default=32 * 1024, help="字典大小（字节）")
+    parser.add_argument("--holdout", type=float, default=0.2, help="不参与训练、只用于评估的样本比例")
+    args = parser.parse_args(argv)
+
+    samples = _load_samples(args.samples)
+    if not samples:
+        raise SystemExit("No memory_aids samples found")
+    if args.command == "report":
+        _report(samples, "全部样本")
+        return
+
+    random.Random(0).shuffle(samples)
+    cut = max(1, int(len(samples) * (1 - args.holdout)))
+    train, holdout = samples[:cut], samples[cut:] or samples
+    _report(holdout, "训练前")
+    kind, dict_id = codec.train(train, args.size)
+    print(f"已写入新字典 {_dict_filename(kind, dict_id)} 到 {codec.dict_dir}（重启服务后生效）")
+    _report(holdout, "训练后")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(sys.argv[1:])
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+内存占用基准：旧的 dict 表示 vs 紧凑 slots 记录
+
+用法: python bench_store_memory.py [条目数]
+输出每个记忆条目（含 5 条默认复习计划）的平均字节数。
+"""
+
+import sys
+import os
+import gc
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from records import MemoryItemRecord, ReviewScheduleRecord, pack_uuid, to_epoch_us
+
+DAYS = [1, 3, 7, 14, 30]
+CATEGORIES = ["历史", "英语", "数学", "其他"]
+
+
+def legacy_item(user_id, n):
+    """与原 mock_store.create_memory_item / create_default_schedule 相同的 dict 表示"""
+    item_id = str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    item = {
+        "id": item_id, "user_id": user_id, "title": f"条目 {n}", "content": f"条目 {n}",
+        "category": CATEGORIES[n % 4], "tags": ["考试"], "type": "general", "difficulty": "medium",
+        "mastery": 0, "review_count": 0, "review_date": None, "next_review_date": None,
+        "starred": False, "created_at": now, "updated_at": now, "memory_aids": None,
+    }
+    schedules = []
+    for d in DAYS:
+        schedules.append({
+            "id": str(uuid.uuid4()), "memory_item_id": item_id, "user_id": user_id,
+            "review_date": (datetime.utcnow() + timedelta(days=d)).isoformat(),
+            "completed": False, "created_at": datetime.utcnow().isoformat(),
+        })
+    return item, schedules
+
+
+def compact_item(user_id, n):
+    """与当前 mock_store 相同的 slots 记录表示"""
+    item_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    created_at = to_epoch_us(now)
+    item = MemoryItemRecord(
+        id=item_id, user_id=user_id, title=f"条目 {n}", content=f"条目 {n}",
+        category=CATEGORIES[n % 4], tags=["考试"], type="general", difficulty="medium",
+        mastery=0, review_count=0, review_date=None, next_review_date=None,
+        starred=False, created_at=created_at, updated_at=created_at, memory_aids=None,
+    )
+    packed_item_id = pack_uuid(item_id)
+    schedules = [
+        ReviewScheduleRecord(id=str(uuid.uuid4()), memory_item_id=packed_item_id, user_id=user_id,
+                             review_date=now + timedelta(days=d), completed=False, created_at=created_at)
+        for d in DAYS
+    ]
+    return item, schedules
+
+
+def measure(build, count):
+    user_ids = [str(uuid.uuid4()) for _ in range(max(1, count // 100))]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = [build(user_ids[n % len(user_ids)], n) for n in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+    return (after - before) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    legacy = measure(legacy_item, count)
+    compact = measure(compact_item, count)
+    print(f"条目数: {count}（每个条目含 {len(DAYS)} 条复习计划）")
+    print(f"dict 表示:   {legacy:8.0f} 字节/条目")
+    print(f"slots 记录:  {compact:8.0f} 字节/条目")
+    print(f"节省:        {1 - compact / legacy:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
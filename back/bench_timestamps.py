@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+读取路径的时间戳开销基准：ISO 字符串 vs 原生存储
+
+用法: python bench_timestamps.py [行数]
+输出每行的平均耗时:
+  - 复习计划列表：旧实现按 ISO 字符串存储，排序时每行 fromisoformat，再经模型校验、
+    FastAPI 重新校验与 json.dumps；现在记录中是纪元微秒整数，按整数排序，
+    直接由记录编码为 JSON（时间只在这一步格式化）
+  - 分享过期检查：旧实现每次解析 expires_at 字符串，现在直接比较整数
+"""
+
+import sys
+import os
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pydantic import TypeAdapter
+
+import schemas
+from http_cache import records_response
+from records import ReviewScheduleRecord, ShareRecord, to_epoch_us
+
+_response_adapter = TypeAdapter(List[schemas.ReviewSchedule])
+_by_review_date = ReviewScheduleRecord.sort_key("review_date")
+
+
+def legacy_rows(count):
+    now = datetime.utcnow()
+    schedules = [{
+        "id": str(uuid.uuid4()), "memory_item_id": str(uuid.uuid4()), "user_id": str(uuid.uuid4()),
+        "review_date": (now + timedelta(days=n % 30, seconds=n)).isoformat(), "completed": False, "created_at": now.isoformat(),
+    } for n in range(count)]
+    shares = [{
+        "id": str(uuid.uuid4()), "share_type": "mindmap", "share_content": "{}",
+        "created_at": now.isoformat(), "expires_at": (now + timedelta(days=7)).isoformat(),
+    } for _ in range(count)]
+    return schedules, shares
+
+
+def native_rows(schedules, shares):
+    return [ReviewScheduleRecord(**s) for s in schedules], [ShareRecord(**s) for s in shares]
+
+
+def legacy_list(schedules):
+    rows = sorted(schedules, key=lambda s: datetime.fromisoformat(s["review_date"]))
+    models = [schemas.ReviewSchedule.model_validate(s) for s in rows]
+    # FastAPI 按 response_model 重新校验并转为可 JSON 化的对象，再由 json.dumps 编码
+    return json.dumps(_response_adapter.dump_python(_response_adapter.validate_python(models), mode="json")).encode()
+
+
+def native_list(schedules):
+    rows = sorted(schedules, key=_by_review_date)
+    return records_response(rows).body
+
+
+def legacy_expiry(shares):
+    now = datetime.utcnow()
+    return sum(now <= datetime.fromisoformat(s["expires_at"]) for s in shares)
+
+
+def native_expiry(shares):
+    now = to_epoch_us(datetime.utcnow())
+    return sum(now <= s._expires_at for s in shares)
+
+
+def timed(fn, rows, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best / len(rows) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    legacy_schedules, legacy_shares = legacy_rows(count)
+    schedules, shares = native_rows(legacy_schedules, legacy_shares)
+    assert json.loads(legacy_list(legacy_schedules)) == json.loads(native_list(schedules))
+
+    print(f"行数: {count}")
+    for name, old, new in (
+        ("复习计划列表", timed(legacy_list, legacy_schedules), timed(native_list, schedules)),
+        ("分享过期检查", timed(legacy_expiry, legacy_shares), timed(native_expiry, shares)),
+    ):
+        print(f"{name}: ISO 字符串 {old:.2f} µs/行，原生 {new:.2f} µs/行，每行节省 {old - new:.2f} µs（{old / new:.1f}x）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Background Compactor
+后台分片回收孤立与过期的行
+
+删除条目时已级联删除其复习计划与分享；压缩器兜底回收级联之外残留的行
+（例如旧日志重放出的孤立行、分享被删除或过期后留下的浏览计数），以及过期超过保留期的分享。
+扫描在写锁之外按时间片进行（每片只运行 slice_ms 毫秒，片与片之间让出事件循环），表的键每次只取
+delete_batch 个，不一次复制整张表；命中的键按 delete_batch 个一批在一个事务中复核并删除，删除在线程中执行，
+不阻塞事件循环。
+
+此外每 ttl_interval 秒按到期索引回收到期的临时行（二维码会话、超过保留期的分享）与 TTLStore 中的键，
+每批最多 ttl_batch 个，批与批之间同样让出事件循环，无需扫描整张表。
+
+多个 worker 共享存储时，共享表的扫描与到期回收只在 leader 上运行（见 leader），
+各进程自己的 TTLStore（如已验证的 JWT）在每个 worker 上回收。
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+import mock_store
+import ttl_store
+from config import settings
+from leader import LeaderLock, leader
+
+logger = logging.getLogger(__name__)
+
+# 每处理这么多个键检查一次时间片是否用完
+_CHECK_EVERY = 64
+
+
+def _is_orphan(row) -> bool:
+    return row["memory_item_id"] not in mock_store.memory_items
+
+
+def _is_orphan_view(row) -> bool:
+    return row["share_id"] not in mock_store.shares
+
+
+def _share_expired_before(cutoff: datetime):
+    def predicate(share) -> bool:
+        if _is_orphan(share):
+            return True
+        expires_at = share["expires_at"]
+        return expires_at is not None and expires_at < cutoff
+    return predicate
+
+
+class Compactor:
+    """时间分片的回收器，在应用的事件循环中作为后台任务运行"""
+
+    def __init__(self, slice_ms: float = 2.0, sweep_interval: float = 300.0, share_retention_days: int = 7,
+                 ttl_interval: float = 1.0, ttl_batch: int = 256, delete_batch: int = 500,
+                 leader: Optional[LeaderLock] = None):
+        self.slice = slice_ms / 1000.0
+        self.sweep_interval = sweep_interval
+        self.ttl_interval = ttl_interval
+        self.ttl_batch = ttl_batch
+        self.delete_batch = delete_batch
+        self.leader = leader
+        self.share_retention = timedelta(days=share_retention_days)
+        self.reclaimed = Counter()
+        self.sweeps = 0
+        self._sweep: Optional[Iterator[None]] = None
+        # 待删除的 (表, 条件, 键列表)
+        self._batches = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    def _run_sweep(self) -> Iterator[None]:
+        """一次完整扫描；每检查一个键 yield 一次，由 step() 控制暂停点"""
+        cutoff = datetime.utcnow() - self.share_retention
+        checks = (
+            ("review_schedules", _is_orphan),
+            ("shares", _share_expired_before(cutoff)),
+            ("share_views", _is_orphan_view),
+        )
+        for table, predicate in checks:
+            # 在写锁之外检查；删除时在事务内复核，检查后被修改的行不会误删
+            rows = mock_store.TABLES[table]
+            keys = []
+            for chunk in mock_store.key_slices(table, self.delete_batch):
+                for key in chunk:
+                    row = rows.get(key)
+                    if row is not None and predicate(row):
+                        keys.append(key)
+                        if len(keys) >= self.delete_batch:
+                            self._batches.append((table, predicate, keys))
+                            keys = []
+                    yield
+            if keys:
+                self._batches.append((table, predicate, keys))
+
+    def step(self) -> bool:
+        """运行一个时间片；扫描完成时返回 False。命中的键由 delete_pending() 删除"""
+        if self._sweep is None:
+            self._sweep = self._run_sweep()
+        deadline = time.perf_counter() + self.slice
+        while True:
+            for _ in range(_CHECK_EVERY):
+                if next(self._sweep, StopIteration) is StopIteration:
+                    self._sweep = None
+                    self.sweeps += 1
+                    return False
+            if time.perf_counter() >= deadline or self._batches:
+                return True
+
+    def delete_pending(self) -> None:
+        """每批一个事务删除扫描命中的键"""
+        while self._batches:
+            table, predicate, keys = self._batches.popleft()
+            deleted = mock_store.delete_where(table, keys, predicate)
+            if deleted:
+                self.reclaimed[table] += deleted
+
+    def expire(self, shared: bool = True) -> bool:
+        """回收一批到期的键，shared 时还回收共享存储中到期的临时行；可能还有剩余时返回 True"""
+        expired = mock_store.expire_due(self.ttl_batch) if shared else Counter()
+        for store in ttl_store.registry:
+            n = store.expire_due(self.ttl_batch)
+            if n:
+                expired[store.name] = n
+        self.reclaimed.update(expired)
+        return any(n >= self.ttl_batch for n in expired.values())
+
+    def _is_leader(self) -> bool:
+        return self.leader is None or self.leader.is_leader()
+
+    def run_once(self) -> None:
+        """同步完成一次扫描（测试与命令行使用）"""
+        while self.expire():
+            pass
+        while self.step():
+            self.delete_pending()
+        self.delete_pending()
+
+    async def run(self) -> None:
+        next_sweep = 0.0
+        while True:
+            is_leader = await asyncio.to_thread(self._is_leader)
+            while await asyncio.to_thread(self.expire, is_leader):
+                pass
+            if is_leader and time.monotonic() >= next_sweep:
+                # 先追上其他 worker 的写入，再在本地副本上扫描
+                await asyncio.to_thread(mock_store.sync)
+                while self.step():
+                    if self._batches:
+                        await asyncio.to_thread(self.delete_pending)
+                    else:
+                        await asyncio.sleep(0)
+                await asyncio.to_thread(self.delete_pending)
+                if self.reclaimed:
+                    logger.info(f"Compactor sweep {self.sweeps} done, reclaimed so far: {dict(self.reclaimed)}")
+                next_sweep = time.monotonic() + self.sweep_interval
+            await asyncio.sleep(min(self.ttl_interval, self.sweep_interval))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+compactor = Compactor(
+    slice_ms=settings.COMPACTOR_SLICE_MS,
+    sweep_interval=settings.COMPACTOR_SWEEP_INTERVAL,
+    share_retention_days=settings.SHARE_EXPIRED_RETENTION_DAYS,
+    ttl_interval=settings.TTL_SWEEP_INTERVAL,
+    ttl_batch=settings.TTL_SWEEP_BATCH,
+    delete_batch=settings.COMPACTOR_DELETE_BATCH,
+    leader=leader,
+)
@@ -14,6 +14,11 @@ class Settings(BaseSettings):
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "your-supabase-url-here")
     SUPABASE_KEY: str = os.getenv("SUPABASE_ANON_KEY", "your-supabase-key-here")
     SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "your-supabase-jwt-secret-here")
+    # Shared PostgREST connection pool
+    SUPABASE_HTTP_TIMEOUT: float = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "10"))
+    SUPABASE_POOL_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+    SUPABASE_POOL_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+    SUPABASE_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
 
     # Gemini
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "your-gemini-api-key-here")
@@ -33,6 +38,87 @@ class Settings(BaseSettings):
     WECHAT_WEB_APP_ID: str = os.getenv("WECHAT_WEB_APP_ID", "")
     WECHAT_WEB_APP_SECRET: str = os.getenv("WECHAT_WEB_APP_SECRET", "")
     
+    # Similar-item discovery (local hashed n-gram embeddings)
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "256"))
+    DUPLICATE_SIMILARITY_THRESHOLD: float = float(os.getenv("DUPLICATE_SIMILARITY_THRESHOLD", "0.9"))
+
+    # In-memory store durability (write-ahead log + snapshots); empty STORE_DATA_DIR disables it
+    STORE_DATA_DIR: str = os.getenv("STORE_DATA_DIR", "")
+    # wal: per-process log files (single worker); sqlite: change log shared by all workers on the host
+    STORE_BACKEND: str = os.getenv("STORE_BACKEND", "wal")
+    STORE_FSYNC: str = os.getenv("STORE_FSYNC", "interval")  # always / interval / never
+    STORE_FSYNC_INTERVAL: float = float(os.getenv("STORE_FSYNC_INTERVAL", "1.0"))
+    STORE_SNAPSHOT_EVERY: int = int(os.getenv("STORE_SNAPSHOT_EVERY", "100000"))
+
+    # Compressed memory_aids dictionaries; defaults to STORE_DATA_DIR/aids_dicts when unset
+    AIDS_DICT_DIR: str = os.getenv("AIDS_DICT_DIR", "")
+
+    # Background compactor: reclaims orphaned schedules/shares and long-expired shares in small time slices
+    COMPACTOR_SLICE_MS: float = float(os.getenv("COMPACTOR_SLICE_MS", "2"))
+    COMPACTOR_SWEEP_INTERVAL: float = float(os.getenv("COMPACTOR_SWEEP_INTERVAL", "300"))
+    COMPACTOR_DELETE_BATCH: int = int(os.getenv("COMPACTOR_DELETE_BATCH", "500"))
+    SHARE_EXPIRED_RETENTION_DAYS: int = int(os.getenv("SHARE_EXPIRED_RETENTION_DAYS", "7"))
+    # Pre-serialized share responses (bounded LRU) and how long clients / CDNs may cache them
+    SHARE_CACHE_MAX_ENTRIES: int = int(os.getenv("SHARE_CACHE_MAX_ENTRIES", "10000"))
+    SHARE_CACHE_MAX_AGE: int = int(os.getenv("SHARE_CACHE_MAX_AGE", "300"))
+    # Share view counters are buffered in memory and flushed in batches; unique viewers use HyperLogLog
+    SHARE_VIEWS_FLUSH_SECONDS: float = float(os.getenv("SHARE_VIEWS_FLUSH_SECONDS", "30"))
+    SHARE_VIEWS_MAX_PENDING: int = int(os.getenv("SHARE_VIEWS_MAX_PENDING", "10000"))
+    SHARE_HLL_PRECISION: int = int(os.getenv("SHARE_HLL_PRECISION", "10"))  # 2^p registers (bytes) per share
+    # Server-rendered share card images (SVG, PNG when cairosvg is installed), cached by content hash
+    SHARE_IMAGE_WORKERS: int = int(os.getenv("SHARE_IMAGE_WORKERS", "2"))
+    SHARE_IMAGE_CACHE_BYTES: int = int(os.getenv("SHARE_IMAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+    SHARE_IMAGE_DISK_BYTES: int = int(os.getenv("SHARE_IMAGE_DISK_BYTES", str(512 * 1024 * 1024)))
+    SHARE_IMAGE_MAX_NODES: int = int(os.getenv("SHARE_IMAGE_MAX_NODES", "300"))
+
+    # Ephemeral records (QR login sessions, expired shares, idempotency keys) are reclaimed by deadline in small batches
+    TTL_SWEEP_INTERVAL: float = float(os.getenv("TTL_SWEEP_INTERVAL", "1.0"))
+    TTL_SWEEP_BATCH: int = int(os.getenv("TTL_SWEEP_BATCH", "256"))
+    QR_SESSION_TTL_SECONDS: int = int(os.getenv("QR_SESSION_TTL_SECONDS", "300"))
+    QR_SESSION_MAX_ENTRIES: int = int(os.getenv("QR_SESSION_MAX_ENTRIES", "100000"))
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_MAX_KEYS: int = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+    # Validated JWTs are cached until their exp (tokens without exp: JWT_CACHE_TTL_SECONDS); rejected ones briefly
+    JWT_CACHE_MAX_ENTRIES: int = int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000"))
+    JWT_CACHE_TTL_SECONDS: int = int(os.getenv("JWT_CACHE_TTL_SECONDS", "3600"))
+    JWT_REJECTED_TTL_SECONDS: int = int(os.getenv("JWT_REJECTED_TTL_SECONDS", "60"))
+    JWT_REJECTED_MAX_ENTRIES: int = int(os.getenv("JWT_REJECTED_MAX_ENTRIES", "10000"))
+
+    # NDJSON library import
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+    IMPORT_MAX_LINE_BYTES: int = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
+    IMPORT_AI_CONCURRENCY: int = int(os.getenv("IMPORT_AI_CONCURRENCY", "4"))
+
+    # Review ladder (days after creation); occurrences are computed on demand, only completed ones are stored
+    REVIEW_LADDER_DAYS: str = os.getenv("REVIEW_LADDER_DAYS", "1,3,7,14,30")
+
+    # Spaced repetition scheduling (fsrs / sm2); changing these reschedules reviewed items at startup
+    SCHEDULER_ALGORITHM: str = os.getenv("SCHEDULER_ALGORITHM", "fsrs")
+    FSRS_DESIRED_RETENTION: float = float(os.getenv("FSRS_DESIRED_RETENTION", "0.9"))
+    FSRS_WEIGHTS: str = os.getenv("FSRS_WEIGHTS", "")  # 17 comma-separated weights; empty uses FSRS v4.5 defaults
+    SCHEDULER_INTERVAL_MODIFIER: float = float(os.getenv("SCHEDULER_INTERVAL_MODIFIER", "1.0"))
+    SCHEDULER_MAX_INTERVAL_DAYS: int = int(os.getenv("SCHEDULER_MAX_INTERVAL_DAYS", "36500"))
+
+    # Largest batch accepted by POST /api/review_schedules/complete_batch
+    REVIEW_BATCH_MAX_RESULTS: int = int(os.getenv("REVIEW_BATCH_MAX_RESULTS", "1000"))
+
+    # Append-only review event log ($STORE_DATA_DIR/review_log), sharded by user
+    REVIEW_LOG_SHARDS: int = int(os.getenv("REVIEW_LOG_SHARDS", "16"))
+
+    # Review sessions (GET /api/review_sessions/today)
+    REVIEW_SESSION_MAX_ITEMS: int = int(os.getenv("REVIEW_SESSION_MAX_ITEMS", "50"))
+    REVIEW_SESSION_GZIP_MIN_BYTES: int = int(os.getenv("REVIEW_SESSION_GZIP_MIN_BYTES", "1024"))
+
+    # Review reminders: sink is "wechat" (subscribe messages), "file" (NDJSON) or empty to disable
+    REMINDER_SINK: str = os.getenv("REMINDER_SINK", "")
+    REMINDER_FILE_PATH: str = os.getenv("REMINDER_FILE_PATH", "reminders.ndjson")
+    REMINDER_TICK_SECONDS: float = float(os.getenv("REMINDER_TICK_SECONDS", "30"))
+    REMINDER_COOLDOWN_SECONDS: float = float(os.getenv("REMINDER_COOLDOWN_SECONDS", str(6 * 3600)))
+    REMINDER_DIGEST_MAX_ITEMS: int = int(os.getenv("REMINDER_DIGEST_MAX_ITEMS", "5"))
+    WECHAT_REMINDER_TEMPLATE_ID: str = os.getenv("WECHAT_REMINDER_TEMPLATE_ID", "")
+    WECHAT_REMINDER_PAGE: str = os.getenv("WECHAT_REMINDER_PAGE", "pages/review/index")
+    WECHAT_REMINDER_FIELDS: str = os.getenv("WECHAT_REMINDER_FIELDS", "thing1,number2,time3")
+
     # Frontend
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "https://membuddy.ravey.site")
 
@@ -1,10 +1,26 @@
+import threading
+
 from supabase import create_client, Client
 from config import settings
 
+_anon_client = None
+_anon_lock = threading.Lock()
 
-def get_anon_supabase() -> Client:
+
+def require_supabase_config():
     url = settings.SUPABASE_URL
     key = settings.SUPABASE_KEY
     if not url or url == "your-supabase-url-here" or not key or key == "your-supabase-key-here":
         raise RuntimeError("缺少 SUPABASE_URL/SUPABASE_ANON_KEY 环境变量，后端无法连接 Supabase")
-    return create_client(url, key)
+    return url, key
+
+
+def get_anon_supabase() -> Client:
+    """进程内只创建一次匿名客户端（不携带用户 JWT，可安全共享）"""
+    global _anon_client
+    if _anon_client is None:
+        with _anon_lock:
+            if _anon_client is None:
+                url, key = require_supabase_config()
+                _anon_client = create_client(url, key)
+    return _anon_client
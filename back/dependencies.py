@@ -1,39 +1,69 @@
 from fastapi import HTTPException, Depends, status, Header
-from supabase import Client, create_client
+import hashlib
 import jwt
 import logging
+import time
 from config import settings
 from database import get_anon_supabase
+from supabase_pool import AuthedSupabase, get_pool
+from ttl_store import TTLStore, register
 
 logger = logging.getLogger(__name__)
 
+# token digest -> verified claims until the token's exp; token digest -> 401 detail for recently rejected tokens
+_valid_tokens = register(TTLStore(
+    "jwt_valid", ttl_seconds=settings.JWT_CACHE_TTL_SECONDS, max_entries=settings.JWT_CACHE_MAX_ENTRIES,
+))
+_rejected_tokens = register(TTLStore(
+    "jwt_rejected", ttl_seconds=settings.JWT_REJECTED_TTL_SECONDS, max_entries=settings.JWT_REJECTED_MAX_ENTRIES,
+))
+
+def _reject(digest: bytes, detail: str):
+    _rejected_tokens.set(digest, detail)
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
 async def get_current_user(authorization: str = Header(...)):
     if not authorization or not authorization.startswith("Bearer "):
         logger.warning("Authorization header missing or invalid")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization header missing or invalid")
     
     token = authorization.split(" ")[1]
+    # Repeat requests with the same token cost one hash and a dict lookup instead of HS256 verification
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+    claims = _valid_tokens.get(digest)
+    if claims is None:
+        rejected = _rejected_tokens.get(digest)
+        if rejected is not None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=rejected)
+        claims = _verify(digest, token)
+    # A fresh dict per request, so handlers cannot modify the cached claims
+    return {**claims, "token": token}
+
+def _verify(digest: bytes, token: str) -> dict:
     try:
         payload = jwt.decode(token, settings.SUPABASE_JWT_SECRET, algorithms=["HS256"])
         user_id = payload.get("sub")
         if user_id is None:
             logger.warning("Invalid token: 'sub' claim missing")
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token: 'sub' claim missing")
+            _reject(digest, "Invalid token: 'sub' claim missing")
         
-        user_info = {"id": user_id, "email": payload.get("email"), "full_name": payload.get("full_name", ""), "token": token}
-        logger.info(f"User authenticated: {user_id}")
-        return user_info
+        claims = {"id": user_id, "email": payload.get("email"), "full_name": payload.get("full_name", "")}
+        exp = payload.get("exp")
+        _valid_tokens.set(digest, claims, ttl_seconds=exp - time.time() if exp is not None else None)
+        logger.debug(f"User authenticated: {user_id}")
+        return claims
     except jwt.ExpiredSignatureError:
         logger.warning("Token has expired")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired")
+        _reject(digest, "Token has expired")
     except jwt.InvalidTokenError as e:
         logger.warning(f"Invalid token: {e}")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        _reject(digest, "Invalid token")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error during token validation: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal server error")
 
-def get_supabase_authed(current_user: dict = Depends(get_current_user)) -> Client:
-    supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
-    supabase.postgrest.auth(current_user['token'])
-    return supabase
\ No newline at end of file
+def get_supabase_authed(current_user: dict = Depends(get_current_user)) -> AuthedSupabase:
+    # Shared connection pool; the user's JWT is attached per request instead of building a new client
+    return get_pool().for_token(current_user['token'])
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""Local Embeddings
+基于哈希字符 n-gram 的本地轻量向量，用于相似条目发现与重复提醒（纯 CPU，无需网络）
+"""
+
+import logging
+import threading
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZES = (2, 3)
+
+
+def embed_text(text: str, dim: int) -> np.ndarray:
+    """将文本映射为 L2 归一化的 float32 向量（带符号的特征哈希）"""
+    text = " ".join((text or "").lower().split())
+    grams = [text[i:i + n] for n in NGRAM_SIZES for i in range(len(text) - n + 1)] or ([text] if text else [])
+    vec = np.zeros(dim, dtype=np.float32)
+    if not grams:
+        return vec
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint32, count=len(grams))
+    signs = np.where(hashes >> 31, -1.0, 1.0)
+    vec += np.bincount((hashes % dim).astype(np.intp), weights=signs, minlength=dim)
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec /= norm
+    return vec
+
+
+def item_text(item) -> str:
+    return f"{item.get('title') or ''}\n{item.get('content') or ''}"
+
+
+class _UserVectors:
+    """单个用户的向量矩阵，按行连续存放，删除时用末行填补"""
+
+    __slots__ = ("matrix", "ids", "rows")
+
+    def __init__(self, dim: int):
+        self.matrix = np.zeros((16, dim), dtype=np.float32)
+        self.ids: List[str] = []
+        self.rows = {}
+
+    def upsert(self, item_id: str, vec: np.ndarray) -> None:
+        row = self.rows.get(item_id)
+        if row is None:
+            row = len(self.ids)
+            if row == self.matrix.shape[0]:
+                grown = np.zeros((row * 2, self.matrix.shape[1]), dtype=np.float32)
+                grown[:row] = self.matrix
+                self.matrix = grown
+            self.ids.append(item_id)
+            self.rows[item_id] = row
+        self.matrix[row] = vec
+
+    def remove(self, item_id: str) -> None:
+        row = self.rows.pop(item_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+        self.ids.pop()
+
+
+class SimilarityIndex:
+    """按用户划分的向量索引，余弦 top-k 用一次矩阵乘法完成"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        return embed_text(text, self.dim)
+
+    def add(self, item) -> None:
+        vec = self.embed(item_text(item))
+        with self._lock:
+            vectors = self._users.get(item["user_id"])
+            if vectors is None:
+                vectors = self._users[item["user_id"]] = _UserVectors(self.dim)
+            vectors.upsert(item["id"], vec)
+
+    def remove(self, item) -> None:
+        with self._lock:
+            vectors = self._users.get(item["user_id"])
+            if vectors is None:
+                return
+            vectors.remove(item["id"])
+            if not vectors.ids:
+                del self._users[item["user_id"]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+    def snapshot_state(self) -> dict:
+        # 快照在持有存储写锁时调用，这里不再加锁
+        return {"dim": self.dim, "users": self._users}
+
+    def restore_state(self, state: dict) -> bool:
+        """恢复快照中的向量；维度与配置不同时不恢复并返回 False，由调用方按条目重建"""
+        with self._lock:
+            if state["dim"] != self.dim:
+                logger.warning(f"Embedding dimension changed (snapshot {state['dim']}, configured {self.dim}); rebuilding the index")
+                self._users = {}
+                return False
+            self._users = state["users"]
+            return True
+
+    def search(self, user_id: str, vec: np.ndarray, k: int = 5, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """返回 [(item_id, 余弦相似度)]，按相似度降序"""
+        with self._lock:
+            vectors = self._users.get(user_id)
+            if vectors is None or not vectors.ids:
+                return []
+            n = len(vectors.ids)
+            scores = vectors.matrix[:n] @ vec
+            ids = list(vectors.ids)
+            if exclude in vectors.rows:
+                scores[vectors.rows[exclude]] = -np.inf
+        k = min(k, n)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def similar_to(self, item, k: int = 5) -> List[Tuple[str, float]]:
+        return self.search(item["user_id"], self.embed(item_text(item)), k=k, exclude=item["id"])
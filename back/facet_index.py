@@ -0,0 +1,126 @@
+"""Facet Index
+按用户增量维护记忆条目的分面计数（标签、分类、难度、收藏）与倒排集合
+"""
+
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+FACET_FIELDS = ("category", "difficulty", "tags", "starred")
+
+
+def _facet_values(item) -> Iterable[Tuple[str, object]]:
+    """展开条目的所有 (分面, 取值) 对"""
+    yield "category", item.get("category")
+    yield "difficulty", item.get("difficulty")
+    yield "starred", bool(item.get("starred"))
+    for tag in set(item.get("tags") or ()):
+        yield "tags", tag
+
+
+class FacetIndex:
+    """分面索引
+
+    每次写入时调用 add/remove，计数与过滤均不再需要扫描全部条目。
+    读取在索引锁内进行并返回副本，调用方遍历结果时不受并发写入影响。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: Dict[str, Set[str]] = defaultdict(set)
+        self._postings: Dict[Tuple[str, str, object], Set[str]] = defaultdict(set)
+        self._counts: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+
+    def add(self, item) -> None:
+        user_id, item_id = item["user_id"], item["id"]
+        values = list(_facet_values(item))
+        with self._lock:
+            self._items[user_id].add(item_id)
+            for field, value in values:
+                self._postings[(user_id, field, value)].add(item_id)
+                self._counts[(user_id, field)][value] += 1
+
+    def remove(self, item) -> None:
+        user_id, item_id = item["user_id"], item["id"]
+        values = list(_facet_values(item))
+        with self._lock:
+            self._remove(user_id, item_id, values)
+
+    def _remove(self, user_id: str, item_id: str, values) -> None:
+        ids = self._items.get(user_id)
+        if not ids or item_id not in ids:
+            return
+        ids.discard(item_id)
+        if not ids:
+            del self._items[user_id]
+        for field, value in values:
+            key = (user_id, field, value)
+            posting = self._postings.get(key)
+            if posting is not None:
+                posting.discard(item_id)
+                if not posting:
+                    del self._postings[key]
+            counter = self._counts.get((user_id, field))
+            if counter is not None:
+                counter[value] -= 1
+                if counter[value] <= 0:
+                    del counter[value]
+                if not counter:
+                    del self._counts[(user_id, field)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._postings.clear()
+            self._counts.clear()
+
+    def snapshot_state(self) -> dict:
+        return {"items": self._items, "postings": self._postings, "counts": self._counts}
+
+    def restore_state(self, state: dict) -> None:
+        with self._lock:
+            self._items, self._postings, self._counts = state["items"], state["postings"], state["counts"]
+
+    def item_ids(self, user_id: str) -> Set[str]:
+        """用户的全部条目 ID（副本）"""
+        with self._lock:
+            return set(self._items.get(user_id, ()))
+
+    def counts(self, user_id: str) -> dict:
+        """返回用户的分面计数，耗时只与不同取值的数量有关"""
+        def field_counts(field):
+            return {k: v for k, v in self._counts.get((user_id, field), {}).items() if k is not None}
+
+        with self._lock:
+            return {
+                "total": len(self._items.get(user_id, ())),
+                "categories": field_counts("category"),
+                "difficulties": field_counts("difficulty"),
+                "tags": field_counts("tags"),
+                "starred": self._counts.get((user_id, "starred"), {}).get(True, 0),
+            }
+
+    def filter(self, user_id: str, category: Optional[str] = None, difficulty: Optional[str] = None,
+               tags: Optional[Iterable[str]] = None, starred: Optional[bool] = None) -> Set[str]:
+        """按分面取交集，从最小的集合开始求交"""
+        wanted = []
+        if category is not None:
+            wanted.append(("category", category))
+        if difficulty is not None:
+            wanted.append(("difficulty", difficulty))
+        if starred is not None:
+            wanted.append(("starred", bool(starred)))
+        for tag in tags or ():
+            wanted.append(("tags", tag))
+        if not wanted:
+            return self.item_ids(user_id)
+
+        with self._lock:
+            postings = [self._postings.get((user_id, field, value), set()) for field, value in wanted]
+            postings.sort(key=len)
+            result = set(postings[0])
+            for posting in postings[1:]:
+                if not result:
+                    break
+                result &= posting
+            return result
@@ -0,0 +1,91 @@
+"""HTTP Conditional Requests
+ETag 生成与 If-None-Match / If-Match 判断，以及按 Accept-Encoding 压缩的响应
+"""
+
+import gzip
+import hashlib
+from typing import Iterable, Optional
+
+import pydantic_core
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """由版本号等已知会随内容变化的值直接拼出强 ETag，无需序列化响应体"""
+    return '"' + "-".join(str(p) for p in parts) + '"'
+
+
+def hash_etag(*parts) -> str:
+    """没有版本号时对内容求摘要"""
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+def _tags(header: Optional[str]):
+    return [t.strip() for t in header.split(",") if t.strip()] if header else []
+
+
+def gzip_etag(etag: str) -> str:
+    """gzip 表示的 ETag：与未压缩表示区分开，缓存不会把两者混用"""
+    return etag[:-1] + '-gzip"'
+
+
+def matched_etag(request: Request, etag: str) -> Optional[str]:
+    """If-None-Match 命中（弱比较，gzip 表示也算）时返回命中的 ETag，304 响应原样带回"""
+    tags = _tags(request.headers.get("if-none-match"))
+    if "*" in tags:
+        return etag
+    opaque = [t[2:] if t.startswith("W/") else t for t in tags]
+    for candidate in (etag, gzip_etag(etag)):
+        if candidate in opaque:
+            return candidate
+    return None
+
+
+def none_match(request: Request, etag: str) -> bool:
+    """If-None-Match 命中（弱比较）时返回 True，应返回 304"""
+    return matched_etag(request, etag) is not None
+
+
+def match_failed(request: Request, etag: Optional[str]) -> bool:
+    """If-Match 不满足（强比较）时返回 True，应返回 412；没有该请求头时总是满足"""
+    header = request.headers.get("if-match")
+    if header is None:
+        return False
+    tags = _tags(header)
+    if etag is None:
+        return True
+    return "*" not in tags and etag not in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def accepts_gzip(request: Request) -> bool:
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def encoded_response(request: Request, body: bytes, media_type: str, min_bytes: int, headers: Optional[dict] = None) -> Response:
+    """已序列化的响应体；客户端接受 gzip 且超过 min_bytes 时压缩后返回"""
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if len(body) >= min_bytes and accepts_gzip(request):
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+        if "ETag" in headers:
+            headers["ETag"] = gzip_etag(headers["ETag"])
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def records_response(records: Iterable, headers: Optional[dict] = None) -> Response:
+    """把字段与响应模型一致的存储记录直接编码为 JSON；时间只在这里格式化一次，不再经过模型校验"""
+    body = pydantic_core.to_json([record.to_dict() for record in records])
+    return Response(content=body, media_type="application/json", headers=headers)
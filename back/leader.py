@@ -0,0 +1,52 @@
+"""Worker Leader Election
+共享存储的多个 worker 中选出一个运行后台任务
+
+- 持有数据目录下 leader.lock 文件锁（flock，非阻塞）的 worker 为 leader；
+  锁随进程退出由内核释放，其他 worker 在下一次检查时接任
+- 后台回收、提醒发送与启动时的重新排期只在 leader 上运行，避免多个 worker 重复扫描与写入
+- 未使用共享存储（单 worker）或平台不支持 fcntl 时总是 leader
+"""
+
+import os
+import threading
+from typing import Optional
+
+import mock_store
+from config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows：不支持多 worker 选主
+    fcntl = None
+
+
+class LeaderLock:
+    """进程内共用一个实例：flock 按打开的文件区分，同一进程重复打开同一文件也会互斥"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def is_leader(self) -> bool:
+        if not mock_store.is_shared() or fcntl is None or not self.path:
+            return True
+        with self._lock:
+            if self._file is None:
+                lock_file = open(self.path, "a")
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False
+                self._file = lock_file
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+leader = LeaderLock(os.path.join(settings.STORE_DATA_DIR, "leader.lock") if settings.STORE_DATA_DIR else None)
@@ -0,0 +1,145 @@
+"""Learning Stats Index
+按用户按天增量维护的学习统计（新增条目数、复习次数、掌握度分布）
+
+- 每个用户保存一段连续日期的 int32 数组（UTC 日序号为下标，按需向两端扩展），
+  写入条目时由 mock_store 的索引钩子增量更新，统计接口的耗时只与天数有关
+- 新增条目计入创建当天，删除时从当天扣除；每次复习（复习计划完成）计入它自己的复习日，
+  批量提交中同一条目的多次复习合并为一次条目写入，但仍分别计数；删除条目不会抹去已发生的复习
+- 掌握度按 10 分一档统计当前条目的分布
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+from records import to_epoch_us
+from scheduler import DAY_US
+
+MASTERY_BUCKETS = 11  # 0-9, 10-19, ..., 90-99, 100
+
+
+def _day(value) -> Optional[int]:
+    us = to_epoch_us(value)
+    return None if us is None else us // DAY_US
+
+
+def _bucket(mastery) -> int:
+    return min(max(int(mastery or 0), 0), 100) // 10
+
+
+class _UserDays:
+    """一个用户从 start 日开始的逐日计数"""
+
+    __slots__ = ("start", "created", "reviews", "mastery")
+
+    def __init__(self, day: int):
+        self.start = day
+        self.created = np.zeros(32, dtype=np.int32)
+        self.reviews = np.zeros(32, dtype=np.int32)
+        self.mastery = np.zeros(MASTERY_BUCKETS, dtype=np.int64)
+
+    def _slot(self, day: int) -> int:
+        if day < self.start:
+            shift = max(self.start - day, len(self.created))
+            self.created = np.concatenate((np.zeros(shift, dtype=np.int32), self.created))
+            self.reviews = np.concatenate((np.zeros(shift, dtype=np.int32), self.reviews))
+            self.start -= shift
+        offset = day - self.start
+        if offset >= len(self.created):
+            grow = max(offset + 1 - len(self.created), len(self.created))
+            self.created = np.concatenate((self.created, np.zeros(grow, dtype=np.int32)))
+            self.reviews = np.concatenate((self.reviews, np.zeros(grow, dtype=np.int32)))
+        return offset
+
+    def window(self, column: np.ndarray, first: int, days: int) -> np.ndarray:
+        """[first, first + days) 日的计数，范围外补 0"""
+        out = np.zeros(days, dtype=np.int32)
+        lo, hi = max(first, self.start), min(first + days, self.start + len(column))
+        if lo < hi:
+            out[lo - first:hi - first] = column[lo - self.start:hi - self.start]
+        return out
+
+
+class LearningStats:
+    """学习统计索引"""
+
+    def __init__(self):
+        self._users: Dict[str, _UserDays] = {}
+
+    def _days(self, user_id: str, day: int) -> _UserDays:
+        days = self._users.get(user_id)
+        if days is None:
+            days = self._users[user_id] = _UserDays(day)
+        return days
+
+    def add(self, item) -> None:
+        day = _day(item["created_at"])
+        days = self._days(item["user_id"], day)
+        slot = days._slot(day)  # 可能替换数组，须先于下标赋值求值
+        days.created[slot] += 1
+        days.mastery[_bucket(item["mastery"])] += 1
+
+    def remove(self, item) -> None:
+        days = self._users.get(item["user_id"])
+        if days is None:
+            return
+        slot = days._slot(_day(item["created_at"]))
+        days.created[slot] -= 1
+        days.mastery[_bucket(item["mastery"])] -= 1
+
+    def update(self, item, changes: dict) -> None:
+        """在条目应用 changes 之前调用，item 仍是旧值"""
+        days = self._users.get(item["user_id"])
+        if days is None:
+            return
+        if "mastery" in changes:
+            days.mastery[_bucket(item["mastery"])] -= 1
+            days.mastery[_bucket(changes["mastery"])] += 1
+
+    def review(self, user_id: str, reviewed_at) -> None:
+        """记一次复习"""
+        day = _day(reviewed_at)
+        days = self._days(user_id, day)
+        slot = days._slot(day)
+        days.reviews[slot] += 1
+
+    def clear(self) -> None:
+        self._users.clear()
+
+    def snapshot_state(self) -> dict:
+        return {"users": self._users}
+
+    def restore_state(self, state: dict) -> None:
+        self._users = state["users"]
+
+    def summary(self, user_id: str, today: int, days: int) -> dict:
+        """截至 today（UTC 日序号）的 days 天热力图、掌握度分布与连续复习天数"""
+        first = today - days + 1
+        user = self._users.get(user_id)
+        if user is None:
+            empty = np.zeros(days, dtype=np.int32)
+            return {"first_day": first, "created": empty, "reviews": empty,
+                    "mastery": np.zeros(MASTERY_BUCKETS, dtype=np.int64), "current_streak": 0, "longest_streak": 0,
+                    "total_reviews": 0}
+
+        # 连续复习天数在该用户的全部历史上计算
+        history = user.window(user.reviews, user.start, today + 1 - user.start) if today >= user.start else np.zeros(0, dtype=np.int32)
+        active = history > 0
+        longest = current = 0
+        if active.any():
+            # 每段连续活跃日的长度 = 相邻非活跃日下标之差 - 1
+            breaks = np.flatnonzero(np.concatenate(([True], ~active, [True])))
+            longest = int(np.max(np.diff(breaks)) - 1)
+            # 今天还没有复习时，连续天数截至昨天
+            end = len(active) - (0 if active[-1] else 1)
+            inactive = np.flatnonzero(~active[:end])
+            current = end - (inactive[-1] + 1 if len(inactive) else 0)
+        return {
+            "first_day": first,
+            "created": user.window(user.created, first, days),
+            "reviews": user.window(user.reviews, first, days),
+            "mastery": user.mastery.copy(),
+            "current_streak": int(current),
+            "longest_streak": longest,
+            "total_reviews": int(user.reviews.sum()),
+        }
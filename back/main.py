@@ -1,12 +1,22 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import logging
 import traceback
 from datetime import datetime
 
 # 导入路由模块
-from routers import auth, memory_items, reviews, ai_generation, sharing
+from routers import auth, memory_items, reviews, review_sessions, stats, ai_generation, sharing
+import mock_store
+from review_log import review_log, log_directory
+from compactor import compactor
+from leader import leader
+from reminders import dispatcher as reminder_dispatcher
+from share_views import share_views
+from share_image import share_images, image_directory
+import supabase_pool
+import ttl_store
 
 # --- 日志配置 ---
 logging.basicConfig(
@@ -41,11 +51,79 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- 存储持久化（WAL + 快照） ---
+@app.on_event("startup")
+def open_store():
+    mock_store.open_store()
+    review_log.open(log_directory())
+    share_images.open(image_directory())
+    # Apply changed scheduler settings to every reviewed item (no-op when nothing changed);
+    # with several workers only the leader does it, the others replay its writes
+    if leader.is_leader():
+        rescheduled = mock_store.reschedule()
+        if rescheduled:
+            logger.info(f"Rescheduled {rescheduled} memory items with the current scheduler settings")
+
+# --- 多 worker 共享存储：请求开始时追上其他 worker 已提交的变更 ---
+@app.middleware("http")
+async def sync_shared_store(request: Request, call_next):
+    if mock_store.is_shared():
+        await run_in_threadpool(mock_store.sync)
+    return await call_next(request)
+
+# --- 后台回收孤立/过期行（只在 leader worker 上运行，在存储关闭前停止） ---
+@app.on_event("startup")
+async def start_compactor():
+    compactor.start()
+
+@app.on_event("shutdown")
+async def stop_compactor():
+    await compactor.stop()
+
+# --- 复习提醒（配置了 REMINDER_SINK 时启用，在存储关闭前停止） ---
+@app.on_event("startup")
+async def start_reminders():
+    if reminder_dispatcher is not None:
+        reminder_dispatcher.start()
+
+@app.on_event("shutdown")
+async def stop_reminders():
+    if reminder_dispatcher is not None:
+        await reminder_dispatcher.stop()
+
+# --- 分享浏览计数（每个 worker 写入自己累计的计数，在存储关闭前写入剩余计数） ---
+@app.on_event("startup")
+async def start_share_views():
+    share_views.start()
+
+@app.on_event("shutdown")
+async def stop_share_views():
+    await share_views.stop()
+
+@app.on_event("shutdown")
+def close_store():
+    leader.release()
+    mock_store.close_store()
+    review_log.close()
+    share_images.close()
+
+@app.on_event("shutdown")
+def close_supabase_pool():
+    supabase_pool.close_pool()
+
 # --- 健康检查 ---
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+# --- 运行指标 ---
+@app.get("/metrics")
+def metrics():
+    return {
+        "supabase_pool": supabase_pool.pool_metrics(),
+        "ttl": {**mock_store.expiry_metrics(), **{store.name: store.metrics() for store in ttl_store.registry}},
+    }
+
 # --- 微信公众号授权回调处理 ---
 @app.get("/auth/wechat/callback")
 def wechat_callback(code: str = None, state: str = None):
@@ -80,6 +158,8 @@ def wechat_callback(code: str = None, state: str = None):
 app.include_router(auth.router)
 app.include_router(memory_items.router)
 app.include_router(reviews.router)
+app.include_router(review_sessions.router)
+app.include_router(stats.router)
 app.include_router(ai_generation.router)
 app.include_router(sharing.router)
 
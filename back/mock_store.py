@@ -1,16 +1,347 @@
+import hashlib
+import hmac
+import os
+import threading
 import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from itertools import islice
+
+from config import settings
+from embeddings import SimilarityIndex
+from facet_index import FacetIndex
+from learning_stats import LearningStats
+from aids_codec import codec
+from persistence import Journal, SQLiteJournal
+from records import MemoryItemRecord, QRSessionRecord, ReviewScheduleRecord, ShareRecord, clear_shared_ids, forget_id, pack_uuid, share_id, to_epoch_us
+from scheduler import DAY_US, DEFAULT_PARAMS, ScheduleColumns, convert_state, scheduled_interval
+from ttl_store import ExpiryHeap, now_us
 
 users = {}
 memory_items = {}
 review_schedules = {}
 shares = {}
 qr_sessions = {}
+# user_id -> {"user_id", "reminded_until"}: when the user's last reminder digest was sent
+reminders = {}
+# share_id -> {"share_id", "user_id", "views", "viewers"}: flushed view counts (see share_views)
+share_views = {}
+# "user_id:Idempotency-Key" -> {"key", "share_id", "created_at"}: kept in the store so a retry reaching any worker finds it
+idempotency_keys = {}
+
+TABLES = {
+    "users": users,
+    "memory_items": memory_items,
+    "review_schedules": review_schedules,
+    "shares": shares,
+    "qr_sessions": qr_sessions,
+    "reminders": reminders,
+    "share_views": share_views,
+    "idempotency_keys": idempotency_keys,
+}
+# Tables whose rows used to be dicts of ISO strings; older journals and snapshots are converted on load
+_RECORD_TYPES = {"shares": ShareRecord, "qr_sessions": QRSessionRecord}
+
+def _as_record(table: str, value):
+    record_type = _RECORD_TYPES.get(table)
+    return record_type(**value) if record_type is not None and isinstance(value, dict) else value
+
+facets = FacetIndex()
+learning_stats = LearningStats()
+similar_items = SimilarityIndex(dim=settings.EMBEDDING_DIM)
+schedule_columns = ScheduleColumns()
+_SCHEDULING_FIELDS = {"review_date", "next_review_date", "stability", "sr_algorithm", "sr_params"}
+# memory_item_id -> {schedule_id} / {share_id}, used for cascading deletes
+schedules_by_item = defaultdict(set)
+shares_by_item = defaultdict(set)
+_LINKS = {"review_schedules": schedules_by_item, "shares": shares_by_item}
+# user id / WeChat openid / unionid -> email (the users table's key); rebuilt from the rows on restore
+_USER_KEYS = {"id": {}, "wechat_openid": {}, "wechat_unionid": {}}
+
+# Ephemeral tables: key -> deadline (epoch us). Expired shares stay readable (410) for the retention period.
+_SHARE_RETENTION_US = settings.SHARE_EXPIRED_RETENTION_DAYS * DAY_US
+_QR_SESSION_TTL_US = settings.QR_SESSION_TTL_SECONDS * 1_000_000
+_IDEMPOTENCY_TTL_US = settings.IDEMPOTENCY_TTL_SECONDS * 1_000_000
+_DEADLINES = {
+    "shares": lambda r: None if r._expires_at is None else r._expires_at + _SHARE_RETENTION_US,
+    "qr_sessions": lambda r: r._created_at + _QR_SESSION_TTL_US,
+    "idempotency_keys": lambda r: r["created_at"] + _IDEMPOTENCY_TTL_US,
+}
+_MAX_ROWS = {"qr_sessions": settings.QR_SESSION_MAX_ENTRIES, "idempotency_keys": settings.IDEMPOTENCY_MAX_KEYS}
+expiry = {table: ExpiryHeap() for table in _DEADLINES}
+expiry_counters = {table: Counter() for table in _DEADLINES}
+
+# All mutations go through _apply so that indexes and the journal see every write
+_write_lock = threading.RLock()
+_journal = None
+# Called as fn(table, key, record) after every write (record is None after a delete),
+# and as fn(None, None, None) after a bulk restore
+_listeners = []
+
+def add_listener(fn):
+    _listeners.append(fn)
+
+def remove_listener(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+def _index_user(email: str, user: dict):
+    share_id(user["id"])
+    for field, index in _USER_KEYS.items():
+        value = user.get(field)
+        if value:
+            index[value] = email
+
+def _unindex_user(email: str, user: dict):
+    for field, index in _USER_KEYS.items():
+        value = user.get(field)
+        if value and index.get(value) == email:
+            del index[value]
+
+def _unindex(table: str, key: str, record: dict, changes):
+    if table == "users":
+        _unindex_user(key, record)
+        if key not in users:
+            # Deleted (a replaced row is still present here): stop sharing its id
+            forget_id(record["id"])
+    elif table == "memory_items":
+        facets.remove(record)
+        if changes is None:
+            learning_stats.remove(record)
+            similar_items.remove(record)
+            schedule_columns.remove(key)
+        else:
+            learning_stats.update(record, changes)
+    elif table in expiry and changes is None:
+        expiry[table].discard(key)
+    if table in _LINKS and changes is None:
+        links = _LINKS[table]
+        item_id = record["memory_item_id"]
+        linked = links.get(item_id)
+        if linked is not None:
+            linked.discard(key)
+            if not linked:
+                del links[item_id]
+
+def _index(table: str, key: str, record: dict, changes):
+    if table == "users":
+        _index_user(key, record)
+    elif table == "memory_items":
+        facets.add(record)
+        if changes is None:
+            learning_stats.add(record)
+        if changes is None or "title" in changes or "content" in changes:
+            similar_items.add(record)
+        if changes is None or not _SCHEDULING_FIELDS.isdisjoint(changes):
+            schedule_columns.upsert(
+                key, record["user_id"], to_epoch_us(record["review_date"]),
+                record["stability"], to_epoch_us(record["next_review_date"]), record["sr_algorithm"], record["sr_params"],
+            )
+    elif table == "review_schedules":
+        # One review per completed occurrence, counted on the day it was done
+        if (changes is None or "completed_at" in changes) and record["completed_at"] is not None:
+            learning_stats.review(record["user_id"], record["completed_at"])
+    elif table in expiry:
+        expiry[table].set(key, _DEADLINES[table](record))
+    if table in _LINKS and changes is None:
+        _LINKS[table][record["memory_item_id"]].add(key)
+
+@contextmanager
+def _transaction():
+    """Hold the write lock; with a shared backend also the cross-process write lock, caught up to the latest change."""
+    with _write_lock:
+        if _journal is None or not _journal.shared:
+            yield
+            return
+        with _journal.transaction(_replay, _restore):
+            yield
+
+def transaction():
+    """Hold the write transaction across several reads and writes, so checks made inside still hold for the writes."""
+    return _transaction()
+
+def _apply(op: str, table: str, key: str, value=None, journal: bool = True):
+    rows = TABLES[table]
+    with _transaction() if journal else _write_lock:
+        record = rows.get(key)
+        if op == "put":
+            if record is not None:
+                _unindex(table, key, record, None)
+            rows[key] = record = _as_record(table, value)
+            _index(table, key, record, None)
+        elif op == "update":
+            if record is None:
+                return None
+            _unindex(table, key, record, value)
+            record.update(value)
+            _index(table, key, record, value)
+        elif op == "delete":
+            if record is None:
+                return None
+            del rows[key]
+            _unindex(table, key, record, None)
+        else:
+            raise ValueError(f"Unknown store operation: {op}")
+        for listener in _listeners:
+            listener(table, key, rows.get(key))
+        if journal and _journal is not None:
+            _journal.append(op, table, key, value)
+            if _journal.should_snapshot():
+                _journal.snapshot(_state)
+        return record
+
+def _state():
+    return {
+        "tables": TABLES,
+        "facets": facets.snapshot_state(),
+        "learning_stats": learning_stats.snapshot_state(),
+        "similar_items": similar_items.snapshot_state(),
+        "schedule_columns": schedule_columns.snapshot_state(),
+        "links": {name: links for name, links in _LINKS.items()},
+    }
+
+def _restore(state: dict):
+    if state is None:
+        for rows in TABLES.values():
+            rows.clear()
+        facets.clear()
+        learning_stats.clear()
+        similar_items.clear()
+        schedule_columns.clear()
+        for links in _LINKS.values():
+            links.clear()
+        for heap in expiry.values():
+            heap.clear()
+        for index in _USER_KEYS.values():
+            index.clear()
+        clear_shared_ids()
+    else:
+        for index in _USER_KEYS.values():
+            index.clear()
+        clear_shared_ids()
+        for name, rows in TABLES.items():
+            rows.clear()
+            rows.update((key, _as_record(name, row)) for key, row in state["tables"].get(name, {}).items())
+            if name == "users":
+                # Indexed before the other tables are converted so their user ids are shared
+                for email, user in users.items():
+                    _index_user(email, user)
+        facets.restore_state(state["facets"])
+        if "learning_stats" in state:
+            learning_stats.restore_state(state["learning_stats"])
+        else:
+            # Snapshot from before the stats index: rebuild item counts (review history starts now)
+            learning_stats.clear()
+            for item in memory_items.values():
+                learning_stats.add(item)
+        if not similar_items.restore_state(state["similar_items"]):
+            # Snapshot taken with another EMBEDDING_DIM: re-embed the items
+            for item in memory_items.values():
+                similar_items.add(item)
+        schedule_columns.restore_state(state["schedule_columns"])
+        for name, links in _LINKS.items():
+            links.clear()
+            links.update(state["links"][name])
+        # Deadlines are derived from the rows, so they are rebuilt rather than snapshotted
+        for table, heap in expiry.items():
+            heap.clear()
+            for key, record in TABLES[table].items():
+                heap.set(key, _DEADLINES[table](record))
+    for listener in _listeners:
+        listener(None, None, None)
+
+def _replay(records):
+    for _, op, table, key, value in records:
+        _apply(op, table, key, value, journal=False)
+
+def _make_journal(directory: str, backend: str):
+    if backend == "sqlite":
+        return SQLiteJournal(
+            os.path.join(directory, "store.sqlite3"),
+            fsync=settings.STORE_FSYNC,
+            snapshot_every=settings.STORE_SNAPSHOT_EVERY,
+        )
+    if backend == "wal":
+        return Journal(
+            directory,
+            fsync=settings.STORE_FSYNC,
+            fsync_interval=settings.STORE_FSYNC_INTERVAL,
+            snapshot_every=settings.STORE_SNAPSHOT_EVERY,
+        )
+    raise ValueError(f"Unknown store backend: {backend}")
+
+def open_store(directory: str = None, backend: str = None):
+    """Load the snapshot, replay the log tail and start journaling writes."""
+    global _journal
+    directory = directory or settings.STORE_DATA_DIR
+    if not directory or _journal is not None:
+        return None
+    journal = _make_journal(directory, backend or settings.STORE_BACKEND)
+    with _write_lock:
+        state, tail = journal.recover()
+        if state is not None:
+            _restore(state)
+        _replay(tail)
+        journal.open()
+        _journal = journal
+    return journal
+
+def is_shared() -> bool:
+    return _journal is not None and _journal.shared
+
+def sync():
+    """Apply changes committed by other worker processes (shared backend only)."""
+    if not is_shared():
+        return False
+    with _write_lock:
+        return _journal.catch_up(_replay, _restore)
+
+def close_store():
+    global _journal
+    with _write_lock:
+        if _journal is not None:
+            _journal.close()
+            _journal = None
+
+_PASSWORD_ITERATIONS = 100_000
+
+def _hash_password(password: str) -> str:
+    """PBKDF2-SHA256 with a random salt; the journal and snapshots only ever see the hash."""
+    if not password:
+        return ""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, _PASSWORD_ITERATIONS)
+    return f"pbkdf2_sha256${_PASSWORD_ITERATIONS}${salt.hex()}${digest.hex()}"
+
+def check_password(user: dict, password: str) -> bool:
+    stored = user.get("password") or ""
+    if not stored.startswith("pbkdf2_sha256$"):
+        # Empty (WeChat accounts) or written before passwords were hashed
+        return hmac.compare_digest(stored.encode(), (password or "").encode())
+    _, iterations, salt, digest = stored.split("$")
+    candidate = hashlib.pbkdf2_hmac("sha256", (password or "").encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(candidate.hex(), digest)
 
 def create_user(email: str, full_name: str, password: str):
-    u = {"id": str(uuid.uuid4()), "email": email, "full_name": full_name or "", "password": password}
-    users[email] = u
-    return u
+    u = {"id": str(uuid.uuid4()), "email": email, "full_name": full_name or "", "password": _hash_password(password)}
+    return _apply("put", "users", email, u)
+
+def update_user(email: str, changes: dict):
+    if "password" in changes:
+        changes = {**changes, "password": _hash_password(changes["password"])}
+    return _apply("update", "users", email, changes)
+
+def get_user_by_id(user_id: str):
+    email = _USER_KEYS["id"].get(user_id)
+    return users.get(email) if email is not None else None
+
+def find_wechat_user(openid: str, unionid: str = None):
+    """The user bound to this openid, or else to this unionid (same WeChat account in another app)."""
+    email = _USER_KEYS["wechat_openid"].get(openid)
+    if email is None and unionid:
+        email = _USER_KEYS["wechat_unionid"].get(unionid)
+    return users.get(email) if email is not None else None
 
 def get_or_create_user(email: str, password: str, full_name: str = ""):
     u = users.get(email)
@@ -18,69 +349,414 @@ def get_or_create_user(email: str, password: str, full_name: str = ""):
         u = create_user(email, full_name, password)
     return u
 
-def create_memory_item(user_id: str, payload: dict):
+def create_memory_item(user_id: str, payload: dict, keep_progress: bool = False, schedules=None):
+    """Create an item; its review schedule follows REVIEW_LADDER_DAYS and is computed on demand.
+
+    The ladder is stored on the item, so later changes to REVIEW_LADDER_DAYS only affect new items.
+    keep_progress restores review progress and created_at from the payload (used by imports);
+    schedules is a list of {"review_date", "completed"} stored explicitly instead of the ladder
+    (an empty list means the item has no scheduled reviews).
+    """
     item_id = str(uuid.uuid4())
-    now = datetime.utcnow().isoformat()
-    item = {
-        "id": item_id,
-        "user_id": user_id,
-        "title": payload.get("title") or (payload.get("content", "")[:50] or ""),
-        "content": payload.get("content", ""),
-        "category": payload.get("category", "其他"),
-        "tags": payload.get("tags", []),
-        "type": payload.get("type", "general"),
-        "difficulty": payload.get("difficulty", "medium"),
-        "mastery": payload.get("mastery", 0),
-        "review_count": 0,
-        "review_date": None,
-        "next_review_date": None,
-        "starred": payload.get("starred", False),
-        "created_at": now,
-        "updated_at": now,
-        "memory_aids": payload.get("memory_aids"),
-    }
-    memory_items[item_id] = item
-    create_default_schedule(item_id, user_id)
+    now = to_epoch_us(datetime.utcnow())
+    progress = payload if keep_progress else {}
+    item = MemoryItemRecord(
+        id=item_id,
+        user_id=user_id,
+        title=payload.get("title") or (payload.get("content", "")[:50] or ""),
+        content=payload.get("content", ""),
+        category=payload.get("category", "其他"),
+        tags=payload.get("tags", []),
+        type=payload.get("type", "general"),
+        difficulty=payload.get("difficulty", "medium"),
+        mastery=payload.get("mastery", 0),
+        review_count=progress.get("review_count") or 0,
+        review_date=progress.get("review_date"),
+        next_review_date=progress.get("next_review_date"),
+        starred=payload.get("starred", False),
+        created_at=progress.get("created_at") or now,
+        updated_at=now,
+        memory_aids=payload.get("memory_aids"),
+        version=1,
+        review_ladder=REVIEW_LADDER if schedules is None else (),
+    )
+    with _transaction():
+        _apply("put", "memory_items", item_id, item)
+        if schedules is not None:
+            create_schedules(item_id, user_id, schedules)
     return item
 
-def create_default_schedule(item_id: str, user_id: str):
-    days = [1, 3, 7, 14, 30]
-    for d in days:
+def import_memory_items(user_id: str, rows):
+    """Insert a batch of (payload, schedules) pairs under a single write-lock acquisition."""
+    with _transaction():
+        return [create_memory_item(user_id, payload, keep_progress=True, schedules=schedules) for payload, schedules in rows]
+
+class VersionConflict(Exception):
+    """The stored version no longer matches the version the caller read."""
+
+def update_memory_item(item_id: str, changes: dict, expected_version: int = None):
+    """Apply changes and bump the item's version; with expected_version this is a compare-and-set."""
+    if changes.get("memory_aids") is not None:
+        # Compress once here so the journaled change is the compact blob too
+        changes = {**changes, "memory_aids": codec.encode(changes["memory_aids"])}
+    if expected_version is not None:
+        # Reject stale writes before taking the write lock; the check is repeated under it for the CAS
+        record = memory_items.get(item_id)
+        if record is not None and expected_version != (record["version"] or 0):
+            raise VersionConflict(item_id)
+    with _transaction():
+        record = memory_items.get(item_id)
+        if record is None:
+            return None
+        version = record["version"] or 0
+        if expected_version is not None and expected_version != version:
+            raise VersionConflict(item_id)
+        return _apply("update", "memory_items", item_id, {**changes, "version": version + 1})
+
+def delete_memory_item(item_id: str):
+    """Delete an item together with its review schedules and shares."""
+    with _transaction():
+        for schedule_id in list(schedules_by_item.get(item_id, ())):
+            _apply("delete", "review_schedules", schedule_id)
+        for share_id in list(shares_by_item.get(item_id, ())):
+            _apply("delete", "share_views", share_id)
+            _apply("delete", "shares", share_id)
+        return _apply("delete", "memory_items", item_id)
+
+def delete_review_schedule(schedule_id: str):
+    return _apply("delete", "review_schedules", schedule_id)
+
+def delete_share(share_id: str):
+    with _transaction():
+        _apply("delete", "share_views", share_id)
+        return _apply("delete", "shares", share_id)
+
+def user_shares(user_id: str):
+    """A user's shares, reached through their items instead of scanning every share."""
+    result = []
+    for item_id in facets.item_ids(user_id):
+        for share_id in shares_by_item.get(item_id, ()):
+            share = shares.get(share_id)
+            if share is not None and share["user_id"] == user_id:
+                result.append(share)
+    return result
+
+def merge_rows(table: str, updates: dict, merge):
+    """Read-modify-write many rows in one transaction: row = merge(current_row, update); None skips the row."""
+    rows = TABLES[table]
+    with _transaction():
+        for key, update in updates.items():
+            row = merge(rows.get(key), update)
+            if row is not None:
+                _apply("put", table, key, row)
+
+def expire_due(limit: int, now: int = None) -> Counter:
+    """Delete up to `limit` rows per ephemeral table whose deadline has passed; returns the count per table."""
+    now = now_us() if now is None else now
+    deleted = Counter()
+    with _transaction():
+        for table, heap in expiry.items():
+            # Popped under the write lock, so a concurrent renewal cannot be deleted by mistake
+            keys = heap.pop_due(now, limit)
+            for key in keys:
+                _apply("delete", table, key)
+            if keys:
+                expiry_counters[table]["expired"] += len(keys)
+                deleted[table] = len(keys)
+    return deleted
+
+def key_slices(table: str, size: int):
+    """Yield the table's keys in lists of at most `size` without copying the whole key set at once.
+
+    Each slice is taken under the write lock. Rows added or removed between slices may be skipped or seen twice,
+    so callers re-check rows before acting on them.
+    """
+    rows = TABLES[table]
+    iterator = None
+    position = 0
+    while True:
+        with _write_lock:
+            try:
+                if iterator is None:
+                    iterator = iter(rows)
+                keys = list(islice(iterator, size))
+            except RuntimeError:
+                # The table changed size since the last slice: resume at the same position in a fresh iterator
+                iterator = iter(rows)
+                keys = list(islice(iterator, position, position + size))
+        if not keys:
+            return
+        position += len(keys)
+        yield keys
+
+def _make_room(table: str):
+    """Keep an ephemeral table under its row limit by deleting the rows closest to expiry."""
+    over = len(TABLES[table]) + 1 - _MAX_ROWS[table]
+    if over > 0:
+        for key in expiry[table].pop_soonest(over):
+            _apply("delete", table, key)
+        expiry_counters[table]["evicted"] += over
+
+def _live(table: str, key: str):
+    """None once the row's deadline has passed, even before the background sweep deletes it."""
+    deadline = expiry[table].deadline(key)
+    if deadline is not None and deadline <= now_us():
+        return None
+    return TABLES[table].get(key)
+
+def expiry_metrics() -> dict:
+    return {
+        table: {"rows": len(TABLES[table]), "tracked": len(heap), "max_rows": _MAX_ROWS.get(table), **expiry_counters[table]}
+        for table, heap in expiry.items()
+    }
+
+def delete_where(table: str, keys, predicate) -> int:
+    """Delete the given rows for which predicate(row) still holds, in one transaction; returns the count."""
+    rows = TABLES[table]
+    deleted = 0
+    with _transaction():
+        for key in keys:
+            record = rows.get(key)
+            if record is not None and predicate(record):
+                _apply("delete", table, key)
+                deleted += 1
+    return deleted
+
+# --- Review schedules ---
+# Pending reviews are not stored: they follow the item's ladder (REVIEW_LADDER_DAYS when it was created)
+# from its created_at. Only completed occurrences are persisted, under a deterministic id derived from
+# the item id, so a completed occurrence replaces the computed one. Items with explicit schedule rows
+# (imports, rows written before schedules became lazy) have an empty ladder and use their stored rows only.
+# Once no scheduled occurrence is pending, the item keeps a trailing occurrence at the scheduler's
+# next_review_date, so it stays in review sessions and can be completed like any other occurrence.
+REVIEW_LADDER = tuple(int(d) for d in settings.REVIEW_LADDER_DAYS.split(","))
+# Upper bound on ladder length, so an occurrence id can be mapped back to its item
+MAX_LADDER_STEPS = 64
+if len(REVIEW_LADDER) > MAX_LADDER_STEPS:
+    raise ValueError(f"REVIEW_LADDER_DAYS has more than {MAX_LADDER_STEPS} steps")
+
+def occurrence_id(item_id: str, step: int) -> str:
+    # XOR the step into the item id: reversible, so no id -> item index is needed
+    return str(uuid.UUID(int=uuid.UUID(item_id).int ^ (step + 1)))
+
+def _occurrence_step(schedule_id: str, item_id: str, steps: int):
+    diff = uuid.UUID(schedule_id).int ^ uuid.UUID(item_id).int
+    return diff - 1 if 1 <= diff <= steps else None
+
+# Trailing occurrence n of an item has id item_id + (n + 1) * _TRAILING_STEP (mod 2**128): completed ones are
+# stored, so the pending one maps back to its item through its predecessor (or the item id for the first)
+_TRAILING_STEP = 1 << 64
+_UUID_MASK = (1 << 128) - 1
+
+def _trailing_id(item_id: str, n: int) -> str:
+    return str(uuid.UUID(int=(uuid.UUID(item_id).int + (n + 1) * _TRAILING_STEP) & _UUID_MASK))
+
+def _trailing_occurrence(item):
+    """The pending occurrence at next_review_date after every scheduled one is done (None before the first review)."""
+    if item["next_review_date"] is None:
+        return None
+    item_id = item["id"]
+    n = 0
+    while _trailing_id(item_id, n) in review_schedules:
+        n += 1
+    return ReviewScheduleRecord(
+        id=_trailing_id(item_id, n),
+        memory_item_id=item_id,
+        user_id=item["user_id"],
+        review_date=item["next_review_date"],
+        completed=False,
+        created_at=item["review_date"] or item["created_at"],
+    )
+
+def _item_ladder(item):
+    # Items created before the ladder was stored on the item follow the configured one
+    ladder = item["review_ladder"]
+    return REVIEW_LADDER if ladder is None else ladder
+
+def item_review_schedules(item):
+    """Stored (completed or explicit) rows plus the ladder occurrences still pending, or the trailing one."""
+    item_id = item["id"]
+    ladder = _item_ladder(item)
+    stored = [review_schedules[sid] for sid in schedules_by_item.get(item_id, ()) if sid in review_schedules]
+    if not ladder or any(_occurrence_step(s["id"], item_id, len(ladder)) is None for s in stored):
+        if all(s["completed"] for s in stored):
+            trailing = _trailing_occurrence(item)
+            if trailing is not None:
+                return stored + [trailing]
+        return stored
+    done = {s["id"] for s in stored}
+    created_at = item["created_at"]
+    pending = []
+    for step, days in enumerate(ladder):
+        sid = occurrence_id(item_id, step)
+        if sid not in done:
+            pending.append(ReviewScheduleRecord(
+                id=sid,
+                memory_item_id=item_id,
+                user_id=item["user_id"],
+                review_date=created_at + timedelta(days=days),
+                completed=False,
+                created_at=created_at,
+            ))
+    if not pending:
+        trailing = _trailing_occurrence(item)
+        if trailing is not None:
+            pending.append(trailing)
+    return stored + pending
+
+def user_review_schedules(user_id: str, memory_item_id: str = None):
+    """A user's schedules, reached through their items instead of scanning every schedule."""
+    item_ids = [memory_item_id] if memory_item_id else facets.item_ids(user_id)
+    result = []
+    for item_id in item_ids:
+        item = memory_items.get(item_id)
+        if item is not None and item["user_id"] == user_id:
+            result.extend(item_review_schedules(item))
+    return result
+
+def get_review_schedule(schedule_id: str):
+    """A stored row, or the computed occurrence with this id."""
+    s = review_schedules.get(schedule_id)
+    if s is not None:
+        return s
+    sid = uuid.UUID(schedule_id).int
+    item = None
+    for step in range(MAX_LADDER_STEPS):
+        item = memory_items.get(str(uuid.UUID(int=sid ^ (step + 1))))
+        if item is not None:
+            break
+    else:
+        # A trailing occurrence: the previous one is stored, or the first follows the item id
+        previous = str(uuid.UUID(int=(sid - _TRAILING_STEP) & _UUID_MASK))
+        item = memory_items.get(previous)
+        if item is None and previous in review_schedules:
+            item = memory_items.get(review_schedules[previous]["memory_item_id"])
+    if item is None:
+        return None
+    return next((s for s in item_review_schedules(item) if s["id"] == schedule_id), None)
+
+def complete_review_schedule(schedule, completed_at: datetime = None):
+    """Mark a schedule completed at completed_at (now by default); a computed occurrence is persisted at this point."""
+    changes = {"completed": True, "completed_at": completed_at or datetime.utcnow()}
+    with _transaction():
+        if schedule["id"] in review_schedules:
+            return _apply("update", "review_schedules", schedule["id"], changes)
+        schedule.update(changes)
+        return _apply("put", "review_schedules", schedule["id"], schedule)
+
+def complete_reviews(completions, item_changes: dict):
+    """Complete (schedule, reviewed_at) pairs and apply one update per item, all in one transaction.
+
+    Each completion is logged with its own time, so learning stats count every review on its own day.
+    """
+    with _transaction():
+        for schedule, reviewed_at in completions:
+            complete_review_schedule(schedule, reviewed_at)
+        return {item_id: update_memory_item(item_id, changes) for item_id, changes in item_changes.items()}
+
+def next_due(item):
+    """Earliest pending review of an item; after the ladder is done, the trailing occurrence at next_review_date."""
+    pending = [s["review_date"] for s in item_review_schedules(item) if not s["completed"]]
+    return min(pending) if pending else None
+
+def mark_reminded(user_id: str, when: datetime):
+    return _apply("put", "reminders", user_id, {"user_id": user_id, "reminded_until": when})
+
+def reschedule(params=DEFAULT_PARAMS, user_id: str = None) -> int:
+    """Recompute next_review_date of items scheduled with another algorithm or other parameters.
+
+    State produced by another algorithm (SCHEDULER_ALGORITHM was switched) is converted first;
+    untagged state from before the tags existed is taken to come from the current algorithm and parameters
+    and is only tagged. Items already scheduled with these parameters are left alone, including dates set by hand,
+    so this is a no-op when nothing changed. The computation is vectorized over schedule_columns; writes go through
+    update_memory_item so version and updated_at change. Returns the number of items whose date changed.
+    """
+    fingerprint = params.fingerprint()
+    changed = 0
+    with _transaction():
+        updated_at = datetime.utcnow()
+        for item_id in schedule_columns.mismatched(params.algorithm, user_id):
+            item = memory_items[item_id]
+            changes = {"sr_algorithm": params.algorithm, "updated_at": updated_at}
+            if item["sr_algorithm"] is None:
+                if item["sr_params"] is None:
+                    changes["sr_params"] = fingerprint
+            else:
+                changes["stability"], changes["sr_difficulty"] = convert_state(
+                    item["stability"], item["sr_difficulty"], item["sr_algorithm"], params.algorithm,
+                )
+                changes["sr_params"] = fingerprint
+                due_us = to_epoch_us(item["review_date"]) + int(scheduled_interval(changes["stability"], params)) * DAY_US
+                if due_us != to_epoch_us(item["next_review_date"]):
+                    changes["next_review_date"] = due_us
+                    changed += 1
+            update_memory_item(item_id, changes)
+        item_ids, due = schedule_columns.recompute(params, user_id)
+        for item_id, due_us in zip(item_ids, due.tolist()):
+            changes = {"sr_params": fingerprint, "updated_at": updated_at}
+            if due_us != to_epoch_us(memory_items[item_id]["next_review_date"]):
+                changes["next_review_date"] = due_us
+                changed += 1
+            update_memory_item(item_id, changes)
+    return changed
+
+def create_schedules(item_id: str, user_id: str, schedules):
+    created_at = to_epoch_us(datetime.utcnow())
+    packed_item_id = pack_uuid(item_id)
+    for entry in schedules:
         sid = str(uuid.uuid4())
-        rs = {
-            "id": sid,
-            "memory_item_id": item_id,
-            "user_id": user_id,
-            "review_date": (datetime.utcnow() + timedelta(days=d)).isoformat(),
-            "completed": False,
-            "created_at": datetime.utcnow().isoformat(),
-        }
-        review_schedules[sid] = rs
+        rs = ReviewScheduleRecord(
+            id=sid,
+            memory_item_id=packed_item_id,
+            user_id=user_id,
+            review_date=entry["review_date"],
+            completed=bool(entry.get("completed")),
+            created_at=created_at,
+        )
+        _apply("put", "review_schedules", sid, rs)
     return True
 
+def update_review_schedule(schedule_id: str, changes: dict):
+    return _apply("update", "review_schedules", schedule_id, changes)
+
+def create_share(share: dict, idempotency_key: str = None):
+    """Insert a share; with an idempotency key, a retry returns the share the first request created.
+
+    The key is checked and recorded in the same transaction, so concurrent retries on different workers
+    cannot both create a share.
+    """
+    if idempotency_key is None:
+        return _apply("put", "shares", share["id"], ShareRecord(**share))
+    key = f"{share['user_id']}:{idempotency_key}"
+    with _transaction():
+        previous = _live("idempotency_keys", key)
+        if previous is not None and previous["share_id"] in shares:
+            return shares[previous["share_id"]]
+        created = _apply("put", "shares", share["id"], ShareRecord(**share))
+        if previous is None:
+            _make_room("idempotency_keys")
+        _apply("put", "idempotency_keys", key, {"key": key, "share_id": share["id"], "created_at": now_us()})
+        return created
+
 def create_qr_session():
     sid = str(uuid.uuid4())
-    qr_sessions[sid] = {
-        "id": sid,
-        "status": "pending",
-        "created_at": datetime.utcnow().isoformat(),
-        "confirmed_at": None,
-        "user_id": None,
-        "access_token": None,
-    }
-    return qr_sessions[sid]
+    with _transaction():
+        _make_room("qr_sessions")
+        return _apply("put", "qr_sessions", sid, QRSessionRecord(
+            id=sid,
+            status="pending",
+            created_at=datetime.utcnow(),
+        ))
 
-def confirm_qr_session(login_id: str, user_id: str, access_token: str):
-    sess = qr_sessions.get(login_id)
-    if not sess:
-        return None
-    sess.update({
+def confirm_qr_session(login_id: str, user_id: str, email: str, full_name: str = ""):
+    """Record who confirmed; the web client's token is minted when it polls, never stored."""
+    return _apply("update", "qr_sessions", login_id, {
         "status": "confirmed",
-        "confirmed_at": datetime.utcnow().isoformat(),
+        "confirmed_at": datetime.utcnow(),
         "user_id": user_id,
-        "access_token": access_token,
+        "email": email,
+        "full_name": full_name,
     })
-    return sess
 
 def get_qr_session(login_id: str):
-    return qr_sessions.get(login_id)
\ No newline at end of file
+    return _live("qr_sessions", login_id)
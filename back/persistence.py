@@ -0,0 +1,396 @@
+"""Store Persistence
+内存存储的追加写日志（WAL）与二进制快照
+
+- 每次变更以 [长度][crc32][pickle] 的帧格式追加到当前日志段
+- 快照在写锁内序列化为一致的副本，写文件与 fsync 在后台线程中完成，完成后删除已被覆盖的日志段
+  （不 fork：多线程进程中 fork 出的子进程可能卡在 fork 时被其他线程持有的锁上，例如 logging 的锁）
+- 启动时先加载快照，再重放序号更大的日志尾部
+
+SQLiteJournal 是多进程共享的后端（STORE_BACKEND=sqlite），供 uvicorn --workers N 使用：
+各 worker 仍在内存中保存完整副本，变更通过 SQLite（WAL 模式）中的全局有序日志同步。
+
+一致性模型:
+  - 写入可线性化：每次写入在 SQLite 写锁（BEGIN IMMEDIATE）内先追上全部已提交变更，
+    再在本地应用并追加日志，所有 worker 看到同一个全局顺序
+  - 请求开始时追上其他 worker 已提交的变更：请求能看到在它开始之前提交的所有写入，
+    本 worker 的写入立即可见（读己之写），同一 worker 内读取单调
+  - 路由中“先读后写”的多步操作不是跨 worker 的原子事务（与单进程多线程时相同）
+  - 跨容器共享要求同一台主机上的共享卷；SQLite 不能放在 NFS 等网络文件系统上
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+_HEADER = struct.Struct("<II")
+_SNAPSHOT_FILE = "snapshot.bin"
+_SEGMENT_PREFIX = "wal-"
+_SEGMENT_SUFFIX = ".log"
+
+Record = Tuple[int, str, str, str, Any]
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """存储日志
+
+    fsync 策略:
+      always   每条记录写入后立即 fsync
+      interval 每条记录 flush 到操作系统，最多每 fsync_interval 秒 fsync 一次
+      never    只 flush，由操作系统决定落盘时机
+    """
+
+    shared = False
+
+    def __init__(self, directory: str, fsync: str = "interval", fsync_interval: float = 1.0,
+                 snapshot_every: int = 100000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._file = None
+        self._dirty = False
+        self._since_snapshot = 0
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._snapshot_ok = False
+        self._pending_snapshot_seq = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._syncer: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+
+    # --- 文件布局 ---
+    def _segment_path(self, start_seq: int) -> str:
+        return os.path.join(self.directory, f"{_SEGMENT_PREFIX}{start_seq:020d}{_SEGMENT_SUFFIX}")
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                start = int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+                segments.append((start, os.path.join(self.directory, name)))
+        segments.sort()
+        return segments
+
+    # --- 恢复 ---
+    def load_snapshot(self) -> Tuple[int, Optional[dict]]:
+        path = os.path.join(self.directory, _SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return 0, None
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+        return snapshot["seq"], snapshot["state"]
+
+    def _read_segment(self, path: str, repair: bool = True) -> Iterator[Record]:
+        with open(path, "rb") as f:
+            good = 0
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                good = f.tell()
+                yield pickle.loads(payload)
+            torn = f.seek(0, os.SEEK_END) != good
+        if torn and repair:
+            # 崩溃时写了一半的尾部记录，截断后继续追加
+            logger.warning(f"Truncating torn WAL tail in {path} at offset {good}")
+            with open(path, "r+b") as f:
+                f.truncate(good)
+
+    def recover(self, repair: bool = True) -> Tuple[Optional[dict], Iterator[Record]]:
+        """返回 (快照状态, 需要重放的日志记录迭代器)
+
+        迭代器耗尽后日志才可写入；调用方应在重放完成后调用 open()。
+        repair=False 时不截断残缺的尾部记录，供只读工具在服务运行时读取。
+        """
+        self.snapshot_seq, state = self.load_snapshot()
+        self.seq = self.snapshot_seq
+
+        def tail():
+            for _, path in self._segments():
+                for record in self._read_segment(path, repair):
+                    if record[0] > self.snapshot_seq:
+                        self.seq = record[0]
+                        yield record
+
+        return state, tail()
+
+    def open(self) -> None:
+        segments = self._segments()
+        path = segments[-1][1] if segments else self._segment_path(self.seq + 1)
+        self._file = open(path, "ab")
+        if self.fsync == "interval":
+            self._syncer = threading.Thread(target=self._sync_loop, name="wal-fsync", daemon=True)
+            self._syncer.start()
+
+    # --- 写入 ---
+    def append(self, op: str, table: str, key: str, value: Any = None) -> int:
+        """追加一条记录，调用方负责串行化（mock_store 的写锁）"""
+        self.seq += 1
+        payload = pickle.dumps((self.seq, op, table, key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+        self._file.flush()
+        if self.fsync == "always":
+            os.fsync(self._file.fileno())
+        elif self.fsync == "interval":
+            with self._lock:
+                self._dirty = True
+        self._since_snapshot += 1
+        return self.seq
+
+    def _sync_loop(self) -> None:
+        while not self._stop.wait(self.fsync_interval):
+            self.sync()
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._file is None or not self._dirty:
+                return
+            self._dirty = False
+        try:
+            os.fsync(self._file.fileno())
+        except (OSError, ValueError):
+            pass
+
+    # --- 快照 ---
+    def should_snapshot(self) -> bool:
+        self._reap_snapshot()
+        return self._since_snapshot >= self.snapshot_every and self._snapshot_thread is None
+
+    def snapshot(self, get_state: Callable[[], dict]) -> None:
+        """写出当前状态的快照并轮换日志段
+
+        调用方须持有写锁，保证 get_state() 与 self.seq 一致。
+        状态在写锁内序列化（此后的写入不会影响快照内容），写文件与 fsync 在后台线程中进行。
+        """
+        seq = self.seq
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = open(self._segment_path(seq + 1), "ab")
+        self._since_snapshot = 0
+
+        data = pickle.dumps({"seq": seq, "state": get_state()}, protocol=pickle.HIGHEST_PROTOCOL)
+        self._snapshot_ok = False
+        self._pending_snapshot_seq = seq
+        self._snapshot_thread = threading.Thread(target=self._write_snapshot, args=(data,), name="wal-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def _write_snapshot(self, data: bytes) -> None:
+        path = os.path.join(self.directory, _SNAPSHOT_FILE)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            _fsync_dir(self.directory)
+            self._snapshot_ok = True
+        except Exception as e:
+            logger.error(f"Failed to write store snapshot: {e}")
+
+    def _reap_snapshot(self, block: bool = False) -> None:
+        """写锁内调用：快照写完后删除已被覆盖的日志段"""
+        thread = self._snapshot_thread
+        if thread is None or (thread.is_alive() and not block):
+            return
+        thread.join()
+        self._snapshot_thread = None
+        if self._snapshot_ok:
+            self._snapshot_done(self._pending_snapshot_seq)
+        else:
+            logger.error("Snapshot write failed; keeping WAL segments")
+
+    def _snapshot_done(self, seq: int) -> None:
+        self.snapshot_seq = seq
+        for start, path in self._segments():
+            if start <= seq:
+                os.remove(path)
+        logger.info(f"Store snapshot written at seq {seq}")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._syncer is not None:
+            self._syncer.join()
+        self._reap_snapshot(block=True)
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+_SQLITE_SYNCHRONOUS = {"always": "FULL", "interval": "NORMAL", "never": "OFF"}
+
+
+class SQLiteJournal:
+    """多进程共享的变更日志（SQLite WAL 模式）
+
+    与 Journal 接口相同，另外提供 transaction() 与 catch_up()，由 mock_store 在写入与
+    请求开始时调用。快照保存在同一个数据库中；写出新快照时删除上一个快照之前的变更，
+    落后超过一个快照间隔的 worker 会重新加载最新快照。
+    """
+
+    shared = True
+
+    def __init__(self, path: str, fsync: str = "interval", snapshot_every: int = 100000, busy_timeout: float = 30.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._depth = 0
+        self._version = None
+        # 连接由 mock_store 的写锁串行化使用；事务由本类显式管理
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={_SQLITE_SYNCHRONOUS[fsync]}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY, op TEXT, tbl TEXT, key TEXT, value BLOB)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS snapshots (seq INTEGER PRIMARY KEY, state BLOB)")
+
+    # --- 读取 ---
+    def load_snapshot(self) -> Tuple[int, Optional[dict]]:
+        row = self._conn.execute("SELECT seq, state FROM snapshots ORDER BY seq DESC LIMIT 1").fetchone()
+        return (0, None) if row is None else (row[0], pickle.loads(row[1]))
+
+    def _latest_snapshot_seq(self) -> int:
+        row = self._conn.execute("SELECT MAX(seq) FROM snapshots").fetchone()
+        return row[0] or 0
+
+    def _changes_since(self, seq: int) -> Iterator[Record]:
+        rows = self._conn.execute("SELECT seq, op, tbl, key, value FROM changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        for seq, op, table, key, value in rows:
+            self.seq = seq
+            yield seq, op, table, key, pickle.loads(value)
+
+    def recover(self, repair: bool = True) -> Tuple[Optional[dict], Iterator[Record]]:
+        self.snapshot_seq, state = self.load_snapshot()
+        self.seq = self.snapshot_seq
+        return state, self._changes_since(self.seq)
+
+    def open(self) -> None:
+        self._version = self._data_version()
+
+    def _data_version(self) -> int:
+        # 其他连接提交后才会变化，本连接自己的提交不影响
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def catch_up(self, replay: Callable[[Iterable[Record]], None], restore: Callable[[Optional[dict]], None]) -> bool:
+        """应用其他进程提交的变更；没有新提交时只执行一次 PRAGMA"""
+        version = self._data_version()
+        if version == self._version:
+            return False
+        self._version = version
+        self.snapshot_seq = self._latest_snapshot_seq()
+        if self.snapshot_seq > self.seq and self._conn.execute("SELECT 1 FROM changes WHERE seq = ?", (self.seq + 1,)).fetchone() is None:
+            # 需要的变更已被快照覆盖并删除，改为加载快照
+            logger.info(f"Worker fell behind the change log (seq {self.seq}); reloading snapshot {self.snapshot_seq}")
+            self.seq, state = self.load_snapshot()
+            restore(state)
+        replay(self._changes_since(self.seq))
+        return True
+
+    # --- 写入 ---
+    @contextmanager
+    def transaction(self, replay: Callable[[Iterable[Record]], None], restore: Callable[[Optional[dict]], None]):
+        """持有跨进程写锁并追上最新变更；可重入，只有最外层提交"""
+        if self._depth:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._depth = 1
+        start = None
+        try:
+            self.catch_up(replay, restore)
+            start = self.seq
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            # 本事务已写入变更时本地副本可能已部分应用，按日志重建；
+            # 未写入任何变更（如版本冲突）时只需回滚，避免重新加载整个快照
+            if self.seq != start:
+                self._resync(replay, restore)
+            raise
+        else:
+            self._conn.execute("COMMIT")
+        finally:
+            self._depth = 0
+
+    def _resync(self, replay, restore) -> None:
+        self.seq, state = self.load_snapshot()
+        self.snapshot_seq = self.seq
+        restore(state)
+        replay(self._changes_since(self.seq))
+        self._version = self._data_version()
+
+    def append(self, op: str, table: str, key: str, value: Any = None) -> int:
+        """在 transaction() 内调用"""
+        if not self._depth:
+            raise RuntimeError("SQLiteJournal.append must be called inside transaction()")
+        self.seq += 1
+        self._conn.execute(
+            "INSERT INTO changes (seq, op, tbl, key, value) VALUES (?, ?, ?, ?, ?)",
+            (self.seq, op, table, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)),
+        )
+        return self.seq
+
+    def sync(self) -> None:
+        pass
+
+    # --- 快照 ---
+    def should_snapshot(self) -> bool:
+        return self.seq - self.snapshot_seq >= self.snapshot_every
+
+    def snapshot(self, get_state: Callable[[], dict]) -> None:
+        """在写事务内同步写出快照（SQLite 连接只在持有写锁时使用）"""
+        previous = self.snapshot_seq
+        state = pickle.dumps(get_state(), protocol=pickle.HIGHEST_PROTOCOL)
+        self._conn.execute("INSERT OR REPLACE INTO snapshots (seq, state) VALUES (?, ?)", (self.seq, state))
+        self._conn.execute("DELETE FROM snapshots WHERE seq < ?", (self.seq,))
+        # 保留上一个快照之后的变更，落后不超过一个间隔的 worker 仍可增量追上
+        self._conn.execute("DELETE FROM changes WHERE seq <= ?", (previous,))
+        self.snapshot_seq = self.seq
+        logger.info(f"Store snapshot written at seq {self.seq}")
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
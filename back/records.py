@@ -0,0 +1,255 @@
+"""Compact Records
+记忆条目与复习计划的紧凑内存表示
+
+- __slots__ 记录，不再为每行维护一个 dict
+- UUID 以 16 字节存放，已登记用户的 ID 对象在记录之间共享（登记随 users 表维护，见 share_id）
+- 时间戳以 UTC 纪元微秒整数存放，读取时还原为 datetime
+- 分类、类型、难度、标签等枚举类字段做字符串驻留
+- memory_aids 以压缩 blob 存放，读取该字段时才解压（见 aids_codec）
+- stability / sr_difficulty / last_interval / reps / sr_algorithm / sr_params 为间隔重复调度状态（见 scheduler）
+- 分享与扫码登录会话同样以记录保存，时间字段不再是 ISO 字符串，只在序列化响应时格式化
+
+记录保留 dict 风格的读写接口（record["field"]、get、update），路由与索引代码无需关心底层表示。
+"""
+
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from aids_codec import codec
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# 用户 ID -> 共享的 16 字节对象；mock_store 随 users 表登记、删除与重建，大小不超过用户数
+_shared_ids = {}
+_ladders = {}
+
+
+def to_epoch_us(value) -> Optional[int]:
+    """datetime / ISO 字符串 / 整数 -> UTC 纪元微秒"""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_epoch_us(value: Optional[int]) -> Optional[datetime]:
+    # 位置参数构造 timedelta 比关键字参数快约 40%
+    return None if value is None else _EPOCH + timedelta(0, 0, value)
+
+
+def pack_uuid(value):
+    """UUID 字符串 -> 16 字节；非 UUID 的 ID 原样保留"""
+    if value is None or isinstance(value, bytes):
+        return value
+    if isinstance(value, uuid.UUID):
+        return value.bytes
+    try:
+        return uuid.UUID(value).bytes
+    except ValueError:
+        return sys.intern(value)
+
+
+def pack_shared_uuid(value):
+    """同 pack_uuid，但已登记的 ID 复用同一个对象（用户 ID 在每条记录中重复出现）；未登记的 ID 不驻留"""
+    packed = pack_uuid(value)
+    return packed if packed is None else _shared_ids.get(packed, packed)
+
+
+def share_id(value) -> None:
+    packed = pack_uuid(value)
+    _shared_ids.setdefault(packed, packed)
+
+
+def forget_id(value) -> None:
+    _shared_ids.pop(pack_uuid(value), None)
+
+
+def clear_shared_ids() -> None:
+    _shared_ids.clear()
+
+
+def unpack_uuid(value) -> Optional[str]:
+    # 直接格式化十六进制，比 str(uuid.UUID(bytes=value)) 快约 3 倍
+    if isinstance(value, bytes):
+        h = value.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+    return value
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _intern_tags(value):
+    return tuple(sys.intern(t) for t in value) if value is not None else None
+
+
+def _intern_ladder(value):
+    return _ladders.setdefault(tuple(value), tuple(value)) if value is not None else None
+
+
+class _Packed:
+    """把公开字段映射到编码后的 slot"""
+
+    def __init__(self, slot: str, encode, decode):
+        self.slot = slot
+        self.encode = encode
+        self.decode = decode
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return self.decode(getattr(obj, self.slot))
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, self.encode(value))
+
+
+def _uuid_field(slot, shared=False):
+    return _Packed(slot, pack_shared_uuid if shared else pack_uuid, unpack_uuid)
+
+
+def _time_field(slot):
+    return _Packed(slot, to_epoch_us, from_epoch_us)
+
+
+def _interned_field(slot):
+    return _Packed(slot, _intern, lambda v: v)
+
+
+class Record:
+    """带 dict 风格接口的 slots 记录基类"""
+
+    __slots__ = ()
+    FIELDS = ()
+    COMPUTED = ()
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS and key not in self.COMPUTED:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def keys(self):
+        return self.FIELDS
+
+    def get(self, key, default=None):
+        if key not in self.FIELDS and key not in self.COMPUTED:
+            return default
+        return getattr(self, key)
+
+    def update(self, changes: dict) -> None:
+        for key, value in changes.items():
+            self[key] = value
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def sort_key(cls, field: str):
+        """按字段排序的 key；时间字段直接比较纪元微秒整数，不构造 datetime"""
+        packed = getattr(cls, field)
+        slot = packed.slot if isinstance(packed, _Packed) and packed.decode is from_epoch_us else field
+        return lambda record: getattr(record, slot)
+
+    # pickle 时只保存 slot 值的元组，比默认的 (None, {slot: value}) 更紧凑
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        # 旧快照中的记录可能缺少后来新增的 slot，补为 None
+        state = tuple(state) + (None,) * (len(self.__slots__) - len(state))
+        for slot, value in zip(self.__slots__, state):
+            object.__setattr__(self, slot, value)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class MemoryItemRecord(Record):
+    __slots__ = (
+        "_id", "_user_id", "title", "content", "_category", "_tags", "_type", "_difficulty",
+        "mastery", "review_count", "_review_date", "_next_review_date", "starred",
+        "_created_at", "_updated_at", "_memory_aids", "version",
+        "stability", "sr_difficulty", "last_interval", "reps", "_sr_algorithm", "_review_ladder", "sr_params",
+    )
+    FIELDS = (
+        "id", "user_id", "title", "content", "category", "tags", "type", "difficulty",
+        "mastery", "review_count", "review_date", "next_review_date", "starred",
+        "created_at", "updated_at", "memory_aids", "version",
+        "stability", "sr_difficulty", "last_interval", "reps", "sr_algorithm", "review_ladder", "sr_params",
+    )
+    COMPUTED = ("memory_aids_count",)
+
+    id = _uuid_field("_id")
+    user_id = _uuid_field("_user_id", shared=True)
+    category = _interned_field("_category")
+    tags = _Packed("_tags", _intern_tags, lambda v: v)
+    type = _interned_field("_type")
+    difficulty = _interned_field("_difficulty")
+    sr_algorithm = _interned_field("_sr_algorithm")
+    # 创建时的复习阶梯（天），同一阶梯在所有条目间共享一个元组
+    review_ladder = _Packed("_review_ladder", _intern_ladder, lambda v: v)
+    review_date = _time_field("_review_date")
+    next_review_date = _time_field("_next_review_date")
+    created_at = _time_field("_created_at")
+    updated_at = _time_field("_updated_at")
+    memory_aids = _Packed("_memory_aids", codec.encode, codec.decode)
+
+    @property
+    def memory_aids_count(self) -> int:
+        return codec.count(self._memory_aids)
+
+
+class ReviewScheduleRecord(Record):
+    __slots__ = ("_id", "_memory_item_id", "_user_id", "_review_date", "completed", "_created_at", "_completed_at")
+    FIELDS = ("id", "memory_item_id", "user_id", "review_date", "completed", "created_at", "completed_at")
+
+    id = _uuid_field("_id")
+    memory_item_id = _uuid_field("_memory_item_id")
+    user_id = _uuid_field("_user_id", shared=True)
+    review_date = _time_field("_review_date")
+    created_at = _time_field("_created_at")
+    # 实际复习时间；导入的已完成计划与旧记录为 None
+    completed_at = _time_field("_completed_at")
+
+
+class ShareRecord(Record):
+    __slots__ = ("_id", "_memory_item_id", "_user_id", "_share_type", "content_id", "share_content", "_expires_at", "_created_at")
+    FIELDS = ("id", "memory_item_id", "user_id", "share_type", "content_id", "share_content", "expires_at", "created_at")
+
+    id = _uuid_field("_id")
+    memory_item_id = _uuid_field("_memory_item_id")
+    user_id = _uuid_field("_user_id", shared=True)
+    share_type = _interned_field("_share_type")
+    expires_at = _time_field("_expires_at")
+    created_at = _time_field("_created_at")
+
+
+class QRSessionRecord(Record):
+    # access_token 只为读取旧日志与快照保留，不再写入；令牌在网页端轮询时签发
+    __slots__ = ("id", "_status", "_created_at", "_confirmed_at", "user_id", "access_token", "email", "full_name")
+    FIELDS = ("id", "status", "created_at", "confirmed_at", "user_id", "access_token", "email", "full_name")
+
+    status = _interned_field("_status")
+    created_at = _time_field("_created_at")
+    confirmed_at = _time_field("_confirmed_at")
@@ -0,0 +1,330 @@
+"""Review Reminder Dispatcher
+复习提醒：按到期时间排序的最小堆 + 每用户合并摘要 + 可替换的推送通道
+
+- 每个条目在堆中只有一项（最早未完成复习的时间），写入时由 mock_store 的监听回调增量更新，
+  出队时只看堆顶，不扫描全部计划；过期堆项按惰性删除处理
+- 同一轮到期的多个条目按用户合并为一条摘要；距上次提醒不足冷却时间的用户顺延到冷却结束
+- 每个用户上次提醒的时间写入 reminders 表；重启时从存储一次性重建堆，已提醒过的到期不会重发
+- 推送通道：微信订阅消息（生产）、NDJSON 文件与内存队列（本地与测试）
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import requests
+
+import mock_store
+from config import settings
+from leader import LeaderLock, leader
+from records import from_epoch_us, to_epoch_us
+
+logger = logging.getLogger(__name__)
+
+
+class Reminder(NamedTuple):
+    user_id: str
+    due_count: int
+    item_ids: List[str]
+    titles: List[str]
+    earliest_due: datetime
+
+    def to_dict(self) -> dict:
+        return {**self._asdict(), "earliest_due": self.earliest_due.isoformat()}
+
+
+# --- 推送通道 ---
+class QueueSink:
+    """放入内存队列（测试与进程内消费者使用）"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def send(self, reminder: Reminder) -> None:
+        self.queue.put(reminder)
+
+
+class FileSink:
+    """追加写入 NDJSON 文件，供本地调试或外部进程消费"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, reminder: Reminder) -> None:
+        line = json.dumps(reminder.to_dict(), ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _wechat_openid(user_id: str) -> Optional[str]:
+    user = mock_store.get_user_by_id(user_id)
+    return user.get("wechat_openid") if user is not None else None
+
+
+class WechatSubscribeSink:
+    """微信小程序订阅消息（subscribeMessage.send）"""
+
+    TOKEN_URL = "https://api.weixin.qq.com/cgi-bin/token"
+    SEND_URL = "https://api.weixin.qq.com/cgi-bin/message/subscribe/send"
+
+    def __init__(self, app_id: str, app_secret: str, template_id: str, page: str, fields: str,
+                 openid_lookup: Callable[[str], Optional[str]] = _wechat_openid):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.template_id = template_id
+        self.page = page
+        # 模板中 标题、数量、时间 三个字段的键名，如 thing1,number2,time3
+        self.fields = [f.strip() for f in fields.split(",")]
+        self.openid_lookup = openid_lookup
+        self._session = requests.Session()
+        self._token = None
+        self._token_expires = 0.0
+
+    def _access_token(self) -> str:
+        if self._token is None or time.time() >= self._token_expires:
+            data = self._session.get(self.TOKEN_URL, params={
+                "grant_type": "client_credential", "appid": self.app_id, "secret": self.app_secret,
+            }, timeout=10).json()
+            if "access_token" not in data:
+                raise RuntimeError(f"WeChat token error: {data}")
+            self._token = data["access_token"]
+            self._token_expires = time.time() + data.get("expires_in", 7200) - 300
+        return self._token
+
+    def send(self, reminder: Reminder) -> None:
+        openid = self.openid_lookup(reminder.user_id)
+        if not openid:
+            return
+        title_key, count_key, time_key = self.fields
+        body = {
+            "touser": openid,
+            "template_id": self.template_id,
+            "page": self.page,
+            "data": {
+                title_key: {"value": (reminder.titles[0] if reminder.titles else "记忆条目")[:20]},
+                count_key: {"value": reminder.due_count},
+                time_key: {"value": reminder.earliest_due.strftime("%Y-%m-%d %H:%M")},
+            },
+        }
+        data = self._session.post(self.SEND_URL, params={"access_token": self._access_token()}, json=body, timeout=10).json()
+        if data.get("errcode") == 40001:
+            # access_token 被其他进程刷新后失效，重新获取一次
+            self._token = None
+            data = self._session.post(self.SEND_URL, params={"access_token": self._access_token()}, json=body, timeout=10).json()
+        if data.get("errcode") == 43101:
+            # 用户未订阅或订阅次数已用完，不重试
+            logger.info(f"User {reminder.user_id} has no reminder subscription left")
+        elif data.get("errcode"):
+            raise RuntimeError(f"WeChat subscribe message error: {data}")
+
+
+def make_sink(kind: str):
+    if kind == "wechat":
+        return WechatSubscribeSink(
+            settings.WECHAT_MINI_APP_ID, settings.WECHAT_MINI_APP_SECRET,
+            settings.WECHAT_REMINDER_TEMPLATE_ID, settings.WECHAT_REMINDER_PAGE, settings.WECHAT_REMINDER_FIELDS,
+        )
+    if kind == "file":
+        return FileSink(settings.REMINDER_FILE_PATH)
+    if kind:
+        raise ValueError(f"Unknown reminder sink: {kind}")
+    return None
+
+
+# --- 到期队列 ---
+class ReminderQueue:
+    """每个条目一项的最小堆，按触发时间（纪元微秒）排序；更新时旧堆项留在堆中，出队时丢弃"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[int, str]] = []
+        # item_id -> (触发时间, user_id, 实际到期时间)
+        self._entries: Dict[str, Tuple[int, str, int]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set(self, item_id: str, user_id: str, due_us: Optional[int], fire_us: Optional[int] = None) -> None:
+        with self._lock:
+            if due_us is None:
+                self._entries.pop(item_id, None)
+                return
+            fire_us = due_us if fire_us is None else fire_us
+            if self._entries.get(item_id, (None,))[0] == fire_us:
+                return
+            self._entries[item_id] = (fire_us, user_id, due_us)
+            heapq.heappush(self._heap, (fire_us, item_id))
+            # 过期堆项过多时整体重建，堆大小保持在条目数的常数倍以内
+            if len(self._heap) > 2 * len(self._entries) + 1024:
+                self._heap = [(fire, item) for item, (fire, _, _) in self._entries.items()]
+                heapq.heapify(self._heap)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+            self._entries.clear()
+
+    def next_fire(self) -> Optional[int]:
+        with self._lock:
+            while self._heap and self._entries.get(self._heap[0][1], (None,))[0] != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now_us: int) -> Dict[str, List[Tuple[int, str]]]:
+        """取出触发时间不晚于 now_us 的条目，按用户分组为 [(到期时间, item_id)]"""
+        due = defaultdict(list)
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now_us:
+                fire_us, item_id = heapq.heappop(self._heap)
+                entry = self._entries.get(item_id)
+                if entry is None or entry[0] != fire_us:
+                    continue
+                del self._entries[item_id]
+                due[entry[1]].append((entry[2], item_id))
+        return due
+
+
+class ReminderDispatcher:
+    """后台提醒任务，在应用的事件循环中运行"""
+
+    def __init__(self, sink, tick_seconds: float = 30.0, cooldown_seconds: float = 6 * 3600,
+                 digest_max_items: int = 5, leader: Optional[LeaderLock] = None):
+        self.sink = sink
+        self.tick = tick_seconds
+        self.cooldown_us = int(cooldown_seconds * 1_000_000)
+        self.digest_max_items = digest_max_items
+        self.leader = leader
+        self.queue = ReminderQueue()
+        self.sent = 0
+        self.failed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # --- 与存储同步 ---
+    def _reminded_until(self, user_id: str) -> Optional[int]:
+        row = mock_store.reminders.get(user_id)
+        return to_epoch_us(row["reminded_until"]) if row else None
+
+    def _track(self, item) -> None:
+        due = to_epoch_us(mock_store.next_due(item))
+        reminded = self._reminded_until(item["user_id"])
+        if due is not None and reminded is not None and due <= reminded:
+            due = None  # 这次到期已在上次摘要中提醒过
+        self.queue.set(item["id"], item["user_id"], due)
+
+    def rebuild(self) -> None:
+        """启动或整体恢复存储后，从条目表重建到期堆（唯一一次全量遍历）"""
+        self.queue.clear()
+        for item in list(mock_store.memory_items.values()):
+            self._track(item)
+
+    def on_change(self, table, key, record) -> None:
+        try:
+            if table is None:
+                self.rebuild()
+            elif table == "memory_items":
+                if record is None:
+                    self.queue.set(key, None, None)
+                else:
+                    self._track(record)
+            elif table == "review_schedules" and record is not None:
+                item = mock_store.memory_items.get(record["memory_item_id"])
+                if item is not None:
+                    self._track(item)
+        except Exception:
+            # 提醒只是附带功能，不能让存储写入失败
+            logger.exception("Failed to update reminder queue")
+
+    # --- 发送 ---
+    def dispatch(self, now: Optional[datetime] = None) -> int:
+        """发送所有已到期的摘要，返回发送条数"""
+        now_us = to_epoch_us(now or datetime.utcnow())
+        sent = 0
+        for user_id, due in self.queue.pop_due(now_us).items():
+            reminded = self._reminded_until(user_id)
+            if reminded is not None:
+                # 另一个 worker 发送过的到期（换主之后）不再重发
+                due = [(due_us, item_id) for due_us, item_id in due if due_us > reminded]
+                if not due:
+                    continue
+            if reminded is not None and now_us < reminded + self.cooldown_us:
+                # 冷却期内：顺延到冷却结束，届时与之后到期的条目合并发送
+                for due_us, item_id in due:
+                    self.queue.set(item_id, user_id, due_us, fire_us=reminded + self.cooldown_us)
+                continue
+            due.sort()
+            items = [mock_store.memory_items.get(item_id) for _, item_id in due[:self.digest_max_items]]
+            reminder = Reminder(
+                user_id=user_id,
+                due_count=len(due),
+                item_ids=[item_id for _, item_id in due[:self.digest_max_items]],
+                titles=[(i["title"] or i["content"][:20]) if i else "" for i in items],
+                earliest_due=from_epoch_us(due[0][0]),
+            )
+            try:
+                self.sink.send(reminder)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Failed to send reminder to {user_id}: {e}")
+                for due_us, item_id in due:
+                    self.queue.set(item_id, user_id, due_us, fire_us=now_us + self.cooldown_us)
+                continue
+            mock_store.mark_reminded(user_id, from_epoch_us(now_us))
+            sent += 1
+        self.sent += sent
+        return sent
+
+    def _tick(self) -> None:
+        # 共享存储的多个 worker 中只有 leader 发送提醒
+        if self.leader is not None and not self.leader.is_leader():
+            return
+        # 其他 worker 的写入经 sync 重放，同样会触发 on_change
+        mock_store.sync()
+        self.dispatch()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self._tick)
+            except Exception:
+                logger.exception("Reminder dispatch failed")
+            await asyncio.sleep(self.tick)
+
+    def start(self) -> None:
+        if self._task is None:
+            mock_store.add_listener(self.on_change)
+            self.rebuild()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            mock_store.remove_listener(self.on_change)
+
+
+def _make_dispatcher() -> Optional[ReminderDispatcher]:
+    sink = make_sink(settings.REMINDER_SINK)
+    if sink is None:
+        return None
+    return ReminderDispatcher(
+        sink,
+        tick_seconds=settings.REMINDER_TICK_SECONDS,
+        cooldown_seconds=settings.REMINDER_COOLDOWN_SECONDS,
+        digest_max_items=settings.REMINDER_DIGEST_MAX_ITEMS,
+        leader=leader,
+    )
+
+
+dispatcher = _make_dispatcher()
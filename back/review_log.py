@@ -0,0 +1,238 @@
+"""Review Event Log
+只追加的复习事件日志与列式分析
+
+complete_review 会覆盖条目上的 mastery / difficulty / review_date；每次复习另外追加一条事件，
+保留完整的学习历史。
+
+- 事件是定长二进制记录（EVENT_DTYPE，50 字节），按用户 ID 哈希写入 REVIEW_LOG_SHARDS 个分片文件，
+  以 O_APPEND 追加，多个 worker 可以同时写同一个分片
+- 内存中按用户保存 NumPy 列（时间、间隔天数、稳定性、评分、掌握度、条目 ID），
+  查询前只读取该用户分片文件中新增的尾部，因此能看到其他 worker 写入的事件
+- 未配置 STORE_DATA_DIR 时只保存在内存中
+- retention_stats 用幂函数遗忘曲线 R(t) = (1 + F·t/S)^-0.5（与 FSRS 相同的形式）
+  对每个用户的“间隔天数 -> 是否记住”做加权最小二乘拟合，得到个人的记忆稳定性 S 与保持率
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from config import settings
+from records import to_epoch_us
+from scheduler import AGAIN, FSRS_DECAY, FSRS_FACTOR
+
+EVENT_DTYPE = np.dtype([
+    ("user", "V16"),
+    ("item", "V16"),
+    ("at", "<i8"),          # 复习时间，UTC 纪元微秒
+    ("elapsed", "<f4"),     # 距该条目上一次复习的天数，首次复习为 0
+    ("stability", "<f4"),   # 复习前的稳定性（天），首次复习为 NaN
+    ("rating", "u1"),       # 1~4
+    ("mastery", "u1"),      # 0~100
+])
+
+_COLUMNS = ("item", "at", "elapsed", "stability", "rating", "mastery")
+_SHARD_PREFIX = "reviews-"
+_SHARD_SUFFIX = ".bin"
+
+# 遗忘曲线分箱的间隔天数边界
+CURVE_BINS = np.array([0, 1, 2, 4, 7, 14, 30, 60, 120, 365, np.inf])
+PREDICT_DAYS = (1, 7, 30, 90)
+
+
+class ReviewEvent(NamedTuple):
+    user_id: str
+    item_id: str
+    reviewed_at: datetime
+    elapsed_days: float
+    stability: Optional[float]
+    rating: int
+    mastery: int
+
+
+def _key16(value: str) -> bytes:
+    try:
+        return uuid.UUID(value).bytes
+    except ValueError:
+        return hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+
+
+class _UserColumns:
+    """一个用户的事件列，按 2 倍扩容"""
+
+    def __init__(self):
+        self.size = 0
+        self.data = np.zeros(16, dtype=EVENT_DTYPE)
+
+    def extend(self, rows: np.ndarray) -> None:
+        end = self.size + len(rows)
+        if end > len(self.data):
+            grown = np.zeros(max(end, 2 * len(self.data)), dtype=EVENT_DTYPE)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:end] = rows
+        self.size = end
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class ReviewLog:
+    """按用户分片的列式事件日志"""
+
+    def __init__(self, shards: int = 16):
+        self.shards = shards
+        self.directory: Optional[str] = None
+        self._lock = threading.Lock()
+        self._users: Dict[bytes, _UserColumns] = {}
+        self._offsets = [0] * shards
+
+    def _shard(self, user_key: bytes) -> int:
+        return int.from_bytes(user_key[:4], "little") % self.shards
+
+    def _path(self, shard: int) -> str:
+        return os.path.join(self.directory, f"{_SHARD_PREFIX}{shard:02d}{_SHARD_SUFFIX}")
+
+    def open(self, directory: Optional[str]) -> None:
+        """加载全部分片；directory 为空时只保存在内存中"""
+        with self._lock:
+            self._users.clear()
+            self._offsets = [0] * self.shards
+            self.directory = directory or None
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                for shard in range(self.shards):
+                    self._read_tail(shard)
+
+    def close(self) -> None:
+        with self._lock:
+            self.directory = None
+            self._users.clear()
+            self._offsets = [0] * self.shards
+
+    def _add(self, rows: np.ndarray) -> None:
+        if len(rows) == 0:
+            return
+        order = np.argsort(rows["user"], kind="stable")
+        rows = rows[order]
+        keys = rows["user"]
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        for start, end in zip(starts, np.append(starts[1:], len(rows))):
+            key = bytes(keys[start])
+            columns = self._users.get(key)
+            if columns is None:
+                columns = self._users[key] = _UserColumns()
+            columns.extend(rows[start:end])
+
+    def _read_tail(self, shard: int) -> None:
+        """读入分片文件中尚未加载的完整记录（末尾写了一半的记录留到下次）"""
+        path = self._path(shard)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        count = (size - self._offsets[shard]) // EVENT_DTYPE.itemsize
+        if count <= 0:
+            return
+        rows = np.fromfile(path, dtype=EVENT_DTYPE, count=count, offset=self._offsets[shard])
+        self._offsets[shard] += count * EVENT_DTYPE.itemsize
+        self._add(rows)
+
+    def append(self, events: List[ReviewEvent]) -> None:
+        if not events:
+            return
+        rows = np.zeros(len(events), dtype=EVENT_DTYPE)
+        rows["user"] = [_key16(e.user_id) for e in events]
+        rows["item"] = [_key16(e.item_id) for e in events]
+        rows["at"] = [to_epoch_us(e.reviewed_at) for e in events]
+        rows["elapsed"] = [e.elapsed_days for e in events]
+        rows["stability"] = [np.nan if e.stability is None else e.stability for e in events]
+        rows["rating"] = [e.rating for e in events]
+        rows["mastery"] = [max(0, min(100, e.mastery)) for e in events]
+        with self._lock:
+            if not self.directory:
+                self._add(rows)
+                return
+            shards = np.array([self._shard(bytes(k)) for k in rows["user"]])
+            for shard in np.unique(shards):
+                # 一次 write 写入整批记录；O_APPEND 保证多个进程的追加不会互相覆盖
+                fd = os.open(self._path(shard), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, rows[shards == shard].tobytes())
+                finally:
+                    os.close(fd)
+                self._read_tail(shard)
+
+    def columns(self, user_id: str) -> np.ndarray:
+        """一个用户的全部事件（结构化数组视图，按写入顺序）"""
+        key = _key16(user_id)
+        with self._lock:
+            if self.directory:
+                self._read_tail(self._shard(key))
+            columns = self._users.get(key)
+            return columns.view() if columns is not None else np.zeros(0, dtype=EVENT_DTYPE)
+
+    def __len__(self):
+        return sum(c.size for c in self._users.values())
+
+
+# --- 分析 ---
+def forgetting_curve(elapsed_days, stability):
+    return (1 + FSRS_FACTOR * np.asarray(elapsed_days, dtype=np.float64) / stability) ** FSRS_DECAY
+
+
+def retention_stats(events: np.ndarray, since: Optional[datetime] = None) -> dict:
+    """拟合个人遗忘曲线；只使用间隔天数大于 0 的复习（首次复习没有可衡量的遗忘）"""
+    if since is not None:
+        events = events[events["at"] >= to_epoch_us(since)]
+    total = len(events)
+    events = events[events["elapsed"] > 0]
+    elapsed = events["elapsed"].astype(np.float64)
+    recalled = (events["rating"] > AGAIN).astype(np.float64)
+
+    bins = np.searchsorted(CURVE_BINS, elapsed, side="right") - 1
+    counts = np.bincount(bins, minlength=len(CURVE_BINS) - 1)
+    hits = np.bincount(bins, weights=recalled, minlength=len(CURVE_BINS) - 1)
+    sums = np.bincount(bins, weights=elapsed, minlength=len(CURVE_BINS) - 1)
+    used = counts > 0
+    mean_elapsed = sums[used] / counts[used]
+    # 拉普拉斯平滑，避免 0% / 100% 的分箱
+    rate = (hits[used] + 1) / (counts[used] + 2)
+
+    # R^(1/decay) - 1 = F·t/S，对 t 做过原点、按样本数加权的最小二乘
+    stability = None
+    if used.any():
+        y = rate ** (1 / FSRS_DECAY) - 1
+        w = counts[used]
+        slope = np.sum(w * mean_elapsed * y) / np.sum(w * mean_elapsed ** 2)
+        if slope > 0:
+            stability = float(FSRS_FACTOR / slope)
+
+    return {
+        "reviews": total,
+        "measured_reviews": int(len(events)),
+        "recall_rate": float(recalled.mean()) if len(events) else None,
+        "stability_days": stability,
+        "curve": [
+            {
+                "elapsed_days": float(t), "reviews": int(n), "recall_rate": float(h / n),
+                "predicted": float(forgetting_curve(t, stability)) if stability else None,
+            }
+            for t, n, h in zip(mean_elapsed, counts[used], hits[used])
+        ],
+        "predicted_retention": {
+            str(days): float(forgetting_curve(days, stability)) for days in PREDICT_DAYS
+        } if stability else {},
+    }
+
+
+review_log = ReviewLog(shards=settings.REVIEW_LOG_SHARDS)
+
+
+def log_directory() -> Optional[str]:
+    return os.path.join(settings.STORE_DATA_DIR, "review_log") if settings.STORE_DATA_DIR else None
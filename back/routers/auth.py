@@ -9,7 +9,7 @@ from datetime import datetime
 from config import settings
 import schemas
 from dependencies import get_current_user
-from mock_store import users, get_or_create_user, create_user, create_qr_session, get_qr_session, confirm_qr_session
+from mock_store import users, check_password, get_or_create_user, create_user, update_user, get_user_by_id, find_wechat_user, create_qr_session, get_qr_session, confirm_qr_session
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +28,7 @@ def login(user: schemas.UserLogin):
     u = users.get(user.email)
     if not u:
         u = get_or_create_user(user.email, user.password)
-    if u.get("password") != user.password:
+    if not check_password(u, user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     payload = {"sub": u["id"], "email": u["email"], "full_name": u["full_name"], "exp": datetime.utcnow().timestamp() + 86400}
     access_token = jwt.encode(payload, settings.SUPABASE_JWT_SECRET, algorithm="HS256")
@@ -40,12 +40,11 @@ def forgot_password(payload: schemas.ForgotPasswordPayload):
 
 @router.post("/reset-password", status_code=status.HTTP_200_OK)
 def reset_password(payload: schemas.ResetPasswordPayload, current_user: dict = Depends(get_current_user)):
-    uid = current_user["id"]
-    for u in users.values():
-        if u["id"] == uid:
-            u["password"] = payload.password
-            return {"message": "Password reset successfully."}
-    raise HTTPException(status_code=404, detail="User not found")
+    u = get_user_by_id(current_user["id"])
+    if u is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    update_user(u["email"], {"password": payload.password})
+    return {"message": "Password reset successfully."}
 
 # 微信认证路由
 @router.post("/wechat/mini")
@@ -87,24 +86,22 @@ def wechat_mini_login(request: schemas.WechatMiniLoginRequest):
         if request.user_info:
             user_nickname = request.user_info.nickname
             user_avatar = request.user_info.avatar_url
-        u = None
-        for x in users.values():
-            if x.get("wechat_openid") == openid or (unionid and x.get("wechat_unionid") == unionid):
-                u = x
-                break
+        u = find_wechat_user(openid, unionid)
         if u:
-            u["wechat_openid"] = openid
-            u["wechat_unionid"] = unionid
+            changes = {"wechat_openid": openid, "wechat_unionid": unionid}
             if user_nickname:
-                u["wechat_nickname"] = user_nickname
+                changes["wechat_nickname"] = user_nickname
             if user_avatar:
-                u["wechat_avatar"] = user_avatar
+                changes["wechat_avatar"] = user_avatar
+            update_user(u["email"], changes)
         else:
             u = create_user(f"wechat_{openid}@membuddy.local", user_nickname or "微信用户", "")
-            u["wechat_openid"] = openid
-            u["wechat_unionid"] = unionid
-            u["wechat_nickname"] = user_nickname
-            u["wechat_avatar"] = user_avatar
+            update_user(u["email"], {
+                "wechat_openid": openid,
+                "wechat_unionid": unionid,
+                "wechat_nickname": user_nickname,
+                "wechat_avatar": user_avatar,
+            })
         user_id = u["id"]
         email = u["email"]
         full_name = u["full_name"]
@@ -244,25 +241,21 @@ def wechat_web_login(request: schemas.WechatWebLoginRequest):
         avatar_url = userinfo_data.get("headimgurl")
         
         # 4. 查找或创建用户
-        u = None
-        for x in users.values():
-            if x.get("wechat_openid") == openid or (unionid and x.get("wechat_unionid") == unionid):
-                u = x
-                break
+        u = find_wechat_user(openid, unionid)
+        wechat_profile = {
+            "wechat_openid": openid,
+            "wechat_unionid": unionid,
+            "wechat_nickname": nickname,
+            "wechat_avatar": avatar_url,
+        }
         if u:
-            u["wechat_openid"] = openid
-            u["wechat_unionid"] = unionid
-            u["wechat_nickname"] = nickname
-            u["wechat_avatar"] = avatar_url
+            update_user(u["email"], wechat_profile)
             user_id = u["id"]
             email = u.get("email", f"wechat_{openid}@membuddy.local")
             full_name = u.get("full_name") or nickname
         else:
             u = create_user(f"wechat_{openid}@membuddy.local", nickname, "")
-            u["wechat_openid"] = openid
-            u["wechat_unionid"] = unionid
-            u["wechat_nickname"] = nickname
-            u["wechat_avatar"] = avatar_url
+            update_user(u["email"], wechat_profile)
             user_id = u["id"]
             email = u["email"]
             full_name = u["full_name"]
@@ -306,7 +299,9 @@ def qr_login_status(login_id: str):
         raise HTTPException(status_code=404, detail="login session not found")
     payload = {"login_id": login_id, "status": sess["status"]}
     if sess["status"] == "confirmed":
-        payload.update({"access_token": sess["access_token"], "token_type": "bearer"})
+        # 令牌不落盘，按确认信息签发，有效期从确认时算起
+        claims = {"sub": sess["user_id"], "email": sess["email"], "full_name": sess["full_name"] or "", "exp": sess["confirmed_at"].timestamp() + 86400}
+        payload.update({"access_token": jwt.encode(claims, settings.SUPABASE_JWT_SECRET, algorithm="HS256"), "token_type": "bearer"})
     return payload
 
 @router.post("/qr/confirm")
@@ -314,7 +309,5 @@ def qr_login_confirm(login_id: str, current_user: dict = Depends(get_current_use
     sess = get_qr_session(login_id)
     if not sess:
         raise HTTPException(status_code=404, detail="login session not found")
-    # 颁发网页端使用的访问令牌
-    access_token = jwt.encode({"sub": current_user["id"], "email": current_user.get("email"), "full_name": current_user.get("full_name", ""), "exp": datetime.utcnow().timestamp() + 86400}, settings.SUPABASE_JWT_SECRET, algorithm="HS256")
-    confirm_qr_session(login_id, current_user["id"], access_token)
+    confirm_qr_session(login_id, current_user["id"], current_user.get("email"), current_user.get("full_name", ""))
     return {"ok": True}
\ No newline at end of file
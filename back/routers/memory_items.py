@@ -1,4 +1,6 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, status
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 import logging
 import asyncio
 import json
@@ -8,21 +10,222 @@ from datetime import datetime, timedelta
 
 import schemas
 from dependencies import get_current_user
+from config import settings
+from embeddings import item_text
+from http_cache import make_etag, none_match, match_failed, not_modified
 from ai_manager import AIManager
-from mock_store import memory_items as store_items, create_memory_item
+from mock_store import (
+    memory_items as store_items, facets, similar_items, create_memory_item,
+    update_memory_item as update_stored_item, delete_memory_item as delete_stored_item,
+    import_memory_items as import_stored_items, user_review_schedules, VersionConflict,
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/memory_items", tags=["memory_items"])
 
-@router.get("", response_model=List[schemas.MemoryItem])
-def get_memory_items(skip: int = 0, limit: int = 100, current_user: dict = Depends(get_current_user)):
-    items = [i for i in store_items.values() if i["user_id"] == current_user["id"]]
+SUMMARY_FIELDS = tuple(f for f in schemas.MemoryItemSummary.model_fields if f != "memory_aids_count")
+SELECTABLE_FIELDS = set(schemas.MemoryItem.model_fields) | {"memory_aids_count"}
+EXPORT_FIELDS = tuple(f for f in schemas.MemoryItem.model_fields if f != "user_id")
+EXPORT_CHUNK_BYTES = 64 * 1024
+MAX_IMPORT_ERRORS = 100
+
+def _summary(item) -> schemas.MemoryItemSummary:
+    return schemas.MemoryItemSummary(
+        **{f: item[f] for f in SUMMARY_FIELDS},
+        memory_aids_count=item["memory_aids_count"],
+    )
+
+def _project_value(item, field):
+    value = item[field]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+def _item_etag(item) -> str:
+    # Every write to an item goes through mock_store.update_memory_item, which bumps the version,
+    # so the ETag needs no serialization or hashing
+    return make_etag("item", item["version"] or 0)
+
+def _aids_etag(item) -> str:
+    return make_etag("aids", item["version"] or 0)
+
+def _owned_item(item_id, current_user: dict):
+    i = store_items.get(str(item_id))
+    if not i or i["user_id"] != current_user["id"]:
+        raise HTTPException(status_code=404, detail="Memory item not found")
+    return i
+
+def _parse_fields(fields: str) -> List[str]:
+    selected = ["id"] + [f.strip() for f in fields.split(",") if f.strip() and f.strip() != "id"]
+    unknown = [f for f in selected if f not in SELECTABLE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+@router.get("", response_model=List[schemas.MemoryItemSummary])
+def get_memory_items(
+    skip: int = 0,
+    limit: int = 100,
+    category: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    tag: Optional[List[str]] = Query(None),
+    starred: Optional[bool] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,memory_aids"),
+    current_user: dict = Depends(get_current_user),
+):
+    # Facet filters are answered from the index; only the matching items are sorted
+    item_ids = facets.filter(current_user["id"], category=category, difficulty=difficulty, tags=tag, starred=starred)
+    items = [store_items[i] for i in item_ids if i in store_items]
     items.sort(key=lambda x: x["created_at"], reverse=True)
-    return [schemas.MemoryItem.model_validate(i) for i in items[skip:skip+limit]]
+    page = items[skip:skip+limit]
+    if fields is None:
+        # memory_aids are only loaded by the detail and /aids endpoints
+        return [_summary(i) for i in page]
+    selected = _parse_fields(fields)
+    rows = [{f: _project_value(i, f) for f in selected} for i in page]
+    return Response(content=json.dumps(rows, ensure_ascii=False), media_type="application/json")
+
+@router.get("/facets", response_model=schemas.FacetCounts)
+def get_memory_item_facets(current_user: dict = Depends(get_current_user)):
+    return schemas.FacetCounts(**facets.counts(current_user["id"]))
+
+def _similar_response(hits):
+    return [
+        schemas.SimilarItem(id=item_id, title=store_items[item_id].get("title"), score=round(score, 4))
+        for item_id, score in hits if item_id in store_items
+    ]
+
+@router.post("/duplicates", response_model=schemas.DuplicateCheckResponse)
+def check_duplicates(request: schemas.DuplicateCheckRequest, current_user: dict = Depends(get_current_user)):
+    # Mirror the title default used by create_memory_item so identical submissions score 1.0
+    vec = similar_items.embed(item_text({"title": request.title or request.content[:50], "content": request.content}))
+    matches = _similar_response(similar_items.search(current_user["id"], vec, k=request.limit))
+    threshold = settings.DUPLICATE_SIMILARITY_THRESHOLD
+    return schemas.DuplicateCheckResponse(is_duplicate=any(m.score >= threshold for m in matches), matches=matches)
+
+def _export_line(item, user_id) -> str:
+    row = {f: _project_value(item, f) for f in EXPORT_FIELDS}
+    schedules = sorted(user_review_schedules(user_id, item["id"]), key=lambda s: s["review_date"])
+    row["review_schedules"] = [{"review_date": s["review_date"].isoformat(), "completed": s["completed"]} for s in schedules]
+    return json.dumps(row, ensure_ascii=False) + "\n"
+
+@router.get("/export")
+def export_memory_items(current_user: dict = Depends(get_current_user)):
+    user_id = current_user["id"]
+    item_ids = list(facets.item_ids(user_id))
+
+    # One item is serialized at a time; lines are grouped into ~64KB chunks
+    def rows():
+        chunk = []
+        size = 0
+        for item_id in item_ids:
+            i = store_items.get(item_id)
+            if i is None or i["user_id"] != user_id:
+                continue
+            line = _export_line(i, user_id).encode("utf-8")
+            chunk.append(line)
+            size += len(line)
+            if size >= EXPORT_CHUNK_BYTES:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+        if chunk:
+            yield b"".join(chunk)
+
+    return StreamingResponse(
+        rows(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="membuddy-export.ndjson"'},
+    )
+
+async def _ndjson_lines(chunks):
+    """Yield (line_number, line) from a byte stream without buffering more than one line."""
+    limit = settings.IMPORT_MAX_LINE_BYTES
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        # A single chunk can carry several complete lines; every one of them is held to the limit.
+        for line in lines:
+            line_no += 1
+            if len(line) > limit:
+                raise HTTPException(status_code=413, detail=f"Line {line_no} exceeds {limit} bytes")
+            if line.strip():
+                yield line_no, line
+        if len(buffer) > limit:
+            raise HTTPException(status_code=413, detail=f"Line {line_no + 1} exceeds {limit} bytes")
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+def _aids_payload(aids: dict) -> dict:
+    return {
+        "mindMap": aids.get("mindMap", None),
+        "mnemonics": aids.get("mnemonics", []),
+        "sensoryAssociations": aids.get("sensoryAssociations", []),
+    }
+
+async def _import_batch(user_id: str, batch, generate_aids: bool, result: schemas.ImportResult):
+    rows = []
+    missing = []
+    for line_no, row in batch:
+        payload = row.model_dump(exclude={"review_schedules"})
+        if payload["memory_aids"] is not None:
+            payload["memory_aids"] = _aids_payload(payload["memory_aids"])
+        elif generate_aids:
+            missing.append(payload)
+        schedules = [s.model_dump() for s in row.review_schedules] if row.review_schedules is not None else None
+        rows.append((payload, schedules))
+
+    # Items that already carry aids skip AI generation entirely
+    if missing:
+        ai_manager = AIManager()
+        semaphore = asyncio.Semaphore(settings.IMPORT_AI_CONCURRENCY)
+
+        async def generate(payload):
+            async with semaphore:
+                aids = await asyncio.to_thread(ai_manager.generate_memory_aids, payload["content"])
+            if aids:
+                payload["memory_aids"] = _aids_payload(aids)
+                result.aids_generated += 1
+
+        outcomes = await asyncio.gather(*(generate(p) for p in missing), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                logger.error(f"Failed to generate memory aids during import: {outcome}")
+
+    await asyncio.to_thread(import_stored_items, user_id, rows)
+    result.imported += len(rows)
+
+@router.post("/import", response_model=schemas.ImportResult)
+async def import_memory_items(
+    request: Request,
+    generate_aids: bool = Query(True, description="Generate aids for lines that have none; lines with aids never call the AI"),
+    current_user: dict = Depends(get_current_user),
+):
+    user_id = current_user["id"]
+    result = schemas.ImportResult()
+    batch = []
+    async for line_no, line in _ndjson_lines(request.stream()):
+        try:
+            batch.append((line_no, schemas.MemoryItemImport.model_validate_json(line)))
+        except ValidationError as e:
+            result.failed += 1
+            if len(result.errors) < MAX_IMPORT_ERRORS:
+                result.errors.append(schemas.ImportLineError(line=line_no, error=str(e.errors(include_url=False)[0]["msg"])))
+            continue
+        if len(batch) >= settings.IMPORT_BATCH_SIZE:
+            await _import_batch(user_id, batch, generate_aids, result)
+            batch = []
+    if batch:
+        await _import_batch(user_id, batch, generate_aids, result)
+    logger.info(f"Imported {result.imported} memory items for user {user_id} ({result.failed} failed)")
+    return result
 
 @router.post("", response_model=schemas.MemoryItem, status_code=status.HTTP_201_CREATED)
-async def create_memory_item_endpoint(item: schemas.MemoryItemCreate, current_user: dict = Depends(get_current_user)):
+async def create_memory_item_endpoint(item: schemas.MemoryItemCreate, response: Response, current_user: dict = Depends(get_current_user)):
     user_id = current_user['id']
     logger.info(f"Creating memory item for user {user_id}")
     
@@ -33,84 +236,98 @@ async def create_memory_item_endpoint(item: schemas.MemoryItemCreate, current_us
         new_item = create_memory_item(user_id, item_dict)
         new_item_id = new_item['id']
 
-        # 2. Concurrently generate aids and review schedule
+        # 2. Generate aids (review schedules are computed on demand from the review ladder)
         ai_manager = AIManager()
         
-        # Create tasks properly - generate_memory_aids is sync, so wrap it in asyncio.to_thread
-        aids_task = asyncio.to_thread(ai_manager.generate_memory_aids, item.content)
-        schedule_task = asyncio.to_thread(ai_manager.generate_review_schedule_from_ebbinghaus)
-        
-        results = await asyncio.gather(aids_task, schedule_task, return_exceptions=True)
-        aids_result, schedule_result = results
+        # generate_memory_aids is sync, so wrap it in asyncio.to_thread
+        try:
+            aids_result = await asyncio.to_thread(ai_manager.generate_memory_aids, item.content)
+        except Exception as e:
+            aids_result = e
 
         # Handle memory aids generation
         if isinstance(aids_result, Exception):
             logger.error(f"Failed to generate memory aids: {aids_result}")
         elif aids_result:
             try:
-                store_items[new_item_id]["memory_aids"] = {
+                update_stored_item(new_item_id, {"memory_aids": {
                     "mindMap": aids_result.get("mindMap", None),
                     "mnemonics": aids_result.get("mnemonics", []),
                     "sensoryAssociations": aids_result.get("sensoryAssociations", []),
-                }
+                }})
             except Exception as e:
                 logger.error(f"Failed to save memory aids: {e}")
 
-        # Handle review schedule generation
-        if isinstance(schedule_result, Exception):
-            logger.error(f"Failed to generate review schedule: {schedule_result}")
-        elif schedule_result:
-            try:
-                pass
-            except Exception as e:
-                logger.error(f"Failed to save review schedule: {e}")
-
-        return get_memory_item(item_id=uuid.UUID(new_item_id), current_user=current_user)
+        i = store_items[new_item_id]
+        response.headers["ETag"] = _item_etag(i)
+        return schemas.MemoryItem.model_validate(i)
     
     except Exception as e:
         logger.error(f"Error creating memory item: {e}")
         raise HTTPException(status_code=500, detail="Failed to create memory item")
 
 @router.get("/{item_id}", response_model=schemas.MemoryItem)
-def get_memory_item(item_id: uuid.UUID, current_user: dict = Depends(get_current_user)):
+def get_memory_item(item_id: uuid.UUID, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    i = _owned_item(item_id, current_user)
+    etag = _item_etag(i)
+    if none_match(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return schemas.MemoryItem.model_validate(i)
+
+@router.get("/{item_id}/aids", response_model=Optional[schemas.MemoryAids])
+def get_memory_item_aids(item_id: uuid.UUID, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    i = _owned_item(item_id, current_user)
+    etag = _aids_etag(i)
+    if none_match(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return i["memory_aids"]
+
+@router.get("/{item_id}/similar", response_model=List[schemas.SimilarItem])
+def get_similar_memory_items(item_id: uuid.UUID, limit: int = Query(5, ge=1, le=50), current_user: dict = Depends(get_current_user)):
     i = store_items.get(str(item_id))
     if not i or i["user_id"] != current_user["id"]:
         raise HTTPException(status_code=404, detail="Memory item not found")
-    return schemas.MemoryItem.model_validate(i)
+    return _similar_response(similar_items.similar_to(i, k=limit))
 
 @router.put("/{item_id}", response_model=schemas.MemoryItem)
-def update_memory_item(item_id: uuid.UUID, item_update: schemas.MemoryItemUpdate, current_user: dict = Depends(get_current_user)):
-    update_data = item_update.model_dump(exclude_unset=True, exclude={'memory_aids'})
-    
-    # Manually serialize datetime objects to ISO 8601 strings
-    if 'next_review_date' in update_data and isinstance(update_data['next_review_date'], datetime):
-        update_data['next_review_date'] = update_data['next_review_date'].isoformat()
-    if 'review_date' in update_data and isinstance(update_data['review_date'], datetime):
-        update_data['review_date'] = update_data['review_date'].isoformat()
+def update_memory_item(item_id: uuid.UUID, item_update: schemas.MemoryItemUpdate, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    i = _owned_item(item_id, current_user)
+    # Read the version once: the If-Match check and the compare-and-set below must use the same value
+    version = i["version"] or 0
+    if match_failed(request, make_etag("item", version)):
+        raise HTTPException(status_code=412, detail="Memory item has been modified")
 
-    if update_data:
-        i = store_items.get(str(item_id))
-        if not i or i["user_id"] != current_user["id"]:
-            raise HTTPException(status_code=404, detail="Memory item not found")
-        for k, v in update_data.items():
-            i[k] = v
-        i["updated_at"] = datetime.utcnow().isoformat()
+    # Datetimes are stored as-is (epoch microseconds in the record); no ISO round trip
+    update_data = item_update.model_dump(exclude_unset=True, exclude={'memory_aids'})
 
     if item_update.memory_aids:
         aids_dict = item_update.memory_aids.model_dump()
-        i = store_items.get(str(item_id))
-        i["memory_aids"] = {
+        update_data["memory_aids"] = {
             "mindMap": aids_dict.get("mindMap", None),
             "mnemonics": aids_dict.get("mnemonics", []),
             "sensoryAssociations": aids_dict.get("sensoryAssociations", []),
         }
 
-    return get_memory_item(item_id=item_id, current_user=current_user)
+    if update_data:
+        update_data["updated_at"] = datetime.utcnow()
+        # With If-Match the version check and the write happen atomically in the store
+        expected = version if "if-match" in request.headers else None
+        try:
+            i = update_stored_item(str(item_id), update_data, expected_version=expected)
+        except VersionConflict:
+            raise HTTPException(status_code=412, detail="Memory item has been modified")
+        if i is None:
+            raise HTTPException(status_code=404, detail="Memory item not found")
+
+    response.headers["ETag"] = _item_etag(i)
+    return schemas.MemoryItem.model_validate(i)
 
 @router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_memory_item(item_id: uuid.UUID, current_user: dict = Depends(get_current_user)):
     i = store_items.get(str(item_id))
     if not i or i["user_id"] != current_user["id"]:
         raise HTTPException(status_code=404, detail="Memory item not found")
-    del store_items[str(item_id)]
+    delete_stored_item(str(item_id))
     return None
\ No newline at end of file
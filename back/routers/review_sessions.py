@@ -0,0 +1,85 @@
+from fastapi import APIRouter, Depends, Query, Request
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+import schemas
+from config import settings
+from dependencies import get_current_user
+from http_cache import encoded_response, hash_etag, matched_etag, not_modified
+from mock_store import memory_items as store_items, user_review_schedules
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/review_sessions", tags=["review_sessions"])
+
+def _due_entries(user_id: str, until: datetime):
+    """One entry per item: its earliest pending schedule due before `until`, plus how many are pending."""
+    earliest = {}
+    overdue = {}
+    for s in user_review_schedules(user_id):
+        if s["completed"] or s["review_date"] > until:
+            continue
+        item_id = s["memory_item_id"]
+        overdue[item_id] = overdue.get(item_id, 0) + 1
+        if item_id not in earliest or s["review_date"] < earliest[item_id]["review_date"]:
+            earliest[item_id] = s
+    entries = [(s, store_items[item_id], overdue[item_id]) for item_id, s in earliest.items() if item_id in store_items]
+    entries.sort(key=lambda e: e[0]["review_date"])
+    return entries
+
+def _interleave(entries):
+    """Round-robin across categories, keeping each category's due order."""
+    queues = OrderedDict()
+    for entry in entries:
+        queues.setdefault(entry[1]["category"], deque()).append(entry)
+    result = []
+    while queues:
+        for category in list(queues):
+            queue = queues[category]
+            result.append(queue.popleft())
+            if not queue:
+                del queues[category]
+    return result
+
+@router.get("/today", response_model=schemas.ReviewSession)
+def get_today_session(
+    request: Request,
+    limit: int = Query(settings.REVIEW_SESSION_MAX_ITEMS, ge=1, le=500),
+    interleave: bool = Query(False, description="Alternate categories instead of strict due order"),
+    tz_offset: int = Query(0, ge=-840, le=840, description="Client UTC offset in minutes; the session covers the rest of the client's day"),
+    current_user: dict = Depends(get_current_user),
+):
+    # Due schedules joined with their items and aids in one pass, so the client needs no per-item requests
+    now = datetime.utcnow()
+    local = now + timedelta(minutes=tz_offset)
+    until = datetime(local.year, local.month, local.day) + timedelta(days=1) - timedelta(minutes=tz_offset)
+    entries = _due_entries(current_user["id"], until)
+    due_total = len(entries)
+    if interleave:
+        entries = _interleave(entries)
+    entries = entries[:limit]
+
+    # The session changes when a schedule is completed or an item (including its aids) is edited
+    etag = hash_etag(until, interleave, due_total, *((s["id"], i["version"]) for s, i, _ in entries))
+    matched = matched_etag(request, etag)
+    if matched:
+        return not_modified(matched)
+
+    session = schemas.ReviewSession(
+        generated_at=now,
+        due_until=until,
+        due_total=due_total,
+        entries=[
+            schemas.ReviewSessionEntry(
+                schedule=schemas.ReviewSchedule.model_validate(s),
+                item=schemas.MemoryItem.model_validate(i),
+                overdue_reviews=n,
+            )
+            for s, i, n in entries
+        ],
+    )
+    return encoded_response(
+        request, session.model_dump_json().encode("utf-8"), "application/json",
+        settings.REVIEW_SESSION_GZIP_MIN_BYTES, headers={"ETag": etag},
+    )
@@ -1,46 +1,128 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 import logging
 import uuid
+from collections import ChainMap
 from typing import List, Optional
 from datetime import datetime, timedelta
 
 import schemas
+from config import settings
 from dependencies import get_current_user
-from mock_store import review_schedules as store_schedules, memory_items as store_items
+from http_cache import hash_etag, none_match, not_modified, records_response
+from records import ReviewScheduleRecord, from_epoch_us, to_epoch_us
+from review_log import ReviewEvent, review_log
+from scheduler import DEFAULT_PARAMS, elapsed_days, rating_from_review, review
+from mock_store import (
+    memory_items as store_items, user_review_schedules, get_review_schedule, complete_reviews, transaction,
+)
 
 router = APIRouter(prefix="/api/review_schedules", tags=["reviews"])
 
+_by_review_date = ReviewScheduleRecord.sort_key("review_date")
+
 @router.get("", response_model=List[schemas.ReviewSchedule])
-def get_review_schedules(memory_item_id: Optional[uuid.UUID] = None, current_user: dict = Depends(get_current_user)):
-    res = [s for s in store_schedules.values() if s["user_id"] == current_user["id"]]
-    if memory_item_id:
-        res = [s for s in res if s["memory_item_id"] == str(memory_item_id)]
-    res.sort(key=lambda x: x["review_date"])
-    return [schemas.ReviewSchedule.model_validate({**s, "created_at": datetime.fromisoformat(s["created_at"]), "review_date": datetime.fromisoformat(s["review_date"])}) for s in res]
+def get_review_schedules(request: Request, memory_item_id: Optional[uuid.UUID] = None, current_user: dict = Depends(get_current_user)):
+    res = user_review_schedules(current_user["id"], str(memory_item_id) if memory_item_id else None)
+    # Timestamps are epoch integers in the records: sorting and hashing never build datetimes or parse strings
+    res.sort(key=_by_review_date)
+    # Hash only the mutable fields; validation and JSON encoding are skipped on 304
+    etag = hash_etag(*((s._id, s._review_date, s.completed) for s in res))
+    if none_match(request, etag):
+        return not_modified(etag)
+    # Records already hold the schema's fields and types; format them once, straight to JSON
+    return records_response(res, headers={"ETag": etag})
+
+def _review_changes(item, mastery: int, difficulty: str, reviewed_at: datetime):
+    """Item changes and the logged event for one review; `item` may also be a ChainMap over an earlier review in the same batch"""
+    rating = rating_from_review(mastery, difficulty)
+    elapsed = elapsed_days(to_epoch_us(item["review_date"]), to_epoch_us(reviewed_at))
+    state = review(
+        DEFAULT_PARAMS, item["stability"], item["sr_difficulty"], item["reps"],
+        rating=rating, elapsed_days=elapsed, label=item["difficulty"], algorithm=item["sr_algorithm"],
+    )
+    event = ReviewEvent(item["user_id"], item["id"], reviewed_at, elapsed, item["stability"], rating, mastery)
+    return event, {
+        "mastery": mastery,
+        "difficulty": difficulty,
+        "review_count": int(item["review_count"] or 0) + 1,
+        "review_date": reviewed_at,
+        "next_review_date": reviewed_at + timedelta(days=state.interval_days),
+        "stability": state.stability,
+        "sr_difficulty": state.sr_difficulty,
+        "last_interval": state.last_interval,
+        "reps": state.reps,
+        "sr_algorithm": state.algorithm,
+        "sr_params": DEFAULT_PARAMS.fingerprint(),
+        "updated_at": datetime.utcnow()
+    }
+
+@router.post("/complete_batch", response_model=schemas.ReviewBatchResponse)
+def complete_review_batch(batch: schemas.ReviewBatchRequest, current_user: dict = Depends(get_current_user)):
+    # Replays results recorded offline: every accepted result is applied in one store transaction,
+    # with a single update per item after folding its results in reviewed_at order
+    if len(batch.results) > settings.REVIEW_BATCH_MAX_RESULTS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.REVIEW_BATCH_MAX_RESULTS} results per batch")
+    now = datetime.utcnow()
+    statuses = {}
+    seen = set()
+    accepted = []
+    item_changes = {}
+    events = []
+    # Checked and applied in one transaction: a concurrent batch cannot complete the same occurrence twice
+    with transaction():
+        for index, result in enumerate(batch.results):
+            schedule_id = str(result.schedule_id)
+            if schedule_id in seen:
+                statuses[index] = schemas.ReviewResultStatus(schedule_id=result.schedule_id, status="duplicate")
+                continue
+            s = get_review_schedule(schedule_id)
+            if not s or s["user_id"] != current_user["id"] or s["memory_item_id"] not in store_items:
+                status = "not_found"
+            elif s["completed"]:
+                # A replayed batch is idempotent
+                status = "already_completed"
+            else:
+                reviewed_at = min(from_epoch_us(to_epoch_us(result.reviewed_at)) if result.reviewed_at else now, now)
+                accepted.append((reviewed_at, index, s, result))
+                status = None
+            seen.add(schedule_id)
+            if status:
+                statuses[index] = schemas.ReviewResultStatus(schedule_id=result.schedule_id, status=status, memory_item_id=s and s["memory_item_id"])
+
+        accepted.sort(key=lambda a: (a[0], a[1]))
+        for reviewed_at, index, s, result in accepted:
+            item_id = s["memory_item_id"]
+            item = ChainMap(item_changes.setdefault(item_id, {}), store_items[item_id])
+            event, changes = _review_changes(item, result.mastery, result.difficulty, reviewed_at)
+            item_changes[item_id].update(changes)
+            events.append(event)
+        complete_reviews([(s, reviewed_at) for reviewed_at, index, s, result in accepted], item_changes)
+    review_log.append(events)
+
+    for reviewed_at, index, s, result in accepted:
+        item_id = s["memory_item_id"]
+        statuses[index] = schemas.ReviewResultStatus(
+            schedule_id=result.schedule_id, status="completed", memory_item_id=item_id,
+            next_review_date=item_changes[item_id]["next_review_date"],
+        )
+    return schemas.ReviewBatchResponse(
+        completed=len(accepted),
+        results=[statuses[index] for index in range(len(batch.results))],
+    )
 
 @router.post("/{schedule_id}/complete", response_model=schemas.MemoryItem)
 def complete_review(schedule_id: uuid.UUID, review_data: schemas.ReviewCompletionRequest, current_user: dict = Depends(get_current_user)):
-    s = store_schedules.get(str(schedule_id))
-    if not s or s["user_id"] != current_user["id"]:
-        raise HTTPException(status_code=404, detail="Review schedule not found.")
-    s["completed"] = True
-    memory_item_id = s['memory_item_id']
-    i = store_items.get(memory_item_id)
-    if not i or i["user_id"] != current_user["id"]:
-        raise HTTPException(status_code=404, detail="Memory item not found")
-    new_review_count = int(i.get('review_count', 0)) + 1
-    if review_data.mastery >= 90:
-        next_review_delta = timedelta(days=30)
-    elif review_data.mastery >= 70:
-        next_review_delta = timedelta(days=14)
-    else:
-        next_review_delta = timedelta(days=3)
-    i.update({
-        "mastery": review_data.mastery,
-        "difficulty": review_data.difficulty,
-        "review_count": new_review_count,
-        "review_date": datetime.utcnow().isoformat(),
-        "next_review_date": (datetime.utcnow() + next_review_delta).isoformat(),
-        "updated_at": datetime.utcnow().isoformat()
-    })
+    # Validate before writing, and complete the schedule and update the item in one transaction
+    with transaction():
+        s = get_review_schedule(str(schedule_id))
+        if not s or s["user_id"] != current_user["id"]:
+            raise HTTPException(status_code=404, detail="Review schedule not found.")
+        memory_item_id = s['memory_item_id']
+        i = store_items.get(memory_item_id)
+        if not i or i["user_id"] != current_user["id"]:
+            raise HTTPException(status_code=404, detail="Memory item not found")
+        reviewed_at = datetime.utcnow()
+        event, changes = _review_changes(i, review_data.mastery, review_data.difficulty, reviewed_at)
+        complete_reviews([(s, reviewed_at)], {memory_item_id: changes})
+    review_log.append([event])
     return schemas.MemoryItem.model_validate(i)
@@ -1,19 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
 import logging
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 
 import schemas
 from dependencies import get_current_user
 from config import settings
-from mock_store import shares as store_shares, memory_items as store_items
+from http_cache import none_match
+from mock_store import memory_items as store_items, create_share as store_share
+from share_cache import share_content as share_content_for, share_payloads
+from share_image import MEDIA_TYPES, share_images
+from share_views import share_views
 import json
 
 router = APIRouter(prefix="/api/share", tags=["sharing"])
 
 @router.post("", response_model=schemas.ShareResponse)
-def create_share(share_request: schemas.ShareCreate, current_user: dict = Depends(get_current_user)):
+def create_share(
+    share_request: schemas.ShareCreate,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, max_length=128),
+):
     i = store_items.get(str(share_request.memory_item_id))
     if not i or i["user_id"] != current_user["id"]:
         raise HTTPException(status_code=404, detail="Memory item not found")
@@ -21,27 +29,8 @@ def create_share(share_request: schemas.ShareCreate, current_user: dict = Depend
     # Generate a unique share ID
     share_id = str(uuid.uuid4())
     
-    # Prepare share content based on type
-    share_content = {}
-    if share_request.share_type == "mindmap":
-        mm = (i.get("memory_aids") or {}).get("mindMap") or {}
-        share_content = {"title": i.get("title", ""), "content": mm, "type": "mindmap"}
-    elif share_request.share_type == "mnemonic":
-        mns = (i.get("memory_aids") or {}).get("mnemonics") or []
-        mn = None
-        if share_request.content_id:
-            mn = next((m for m in mns if m.get("id") == share_request.content_id), None)
-        if not mn and mns:
-            mn = mns[0]
-        share_content = {"title": f"{i.get('title','')} - {mn.get('title','')}" if mn else i.get('title',''), "content": mn or {}, "type": "mnemonic"}
-    elif share_request.share_type == "sensory":
-        sens = (i.get("memory_aids") or {}).get("sensoryAssociations") or []
-        s = None
-        if share_request.content_id:
-            s = next((x for x in sens if x.get("id") == share_request.content_id), None)
-        if not s and sens:
-            s = sens[0]
-        share_content = {"title": f"{i.get('title','')} - {s.get('title','')}" if s else i.get('title',''), "content": s or {}, "type": "sensory"}
+    # Snapshot of the shared content; views render from the item's current aids (see share_cache)
+    share_content = share_content_for(i, share_request.share_type, share_request.content_id)
     
     # Store share data in database
     share_data = {
@@ -51,37 +40,82 @@ def create_share(share_request: schemas.ShareCreate, current_user: dict = Depend
         "share_type": share_request.share_type,
         "content_id": share_request.content_id,
         "share_content": json.dumps(share_content),
-        "expires_at": share_request.expires_at.isoformat() if share_request.expires_at else None,
-        "created_at": datetime.utcnow().isoformat()
+        "expires_at": share_request.expires_at,
+        "created_at": datetime.utcnow()
     }
     
-    store_shares[share_id] = share_data
+    # A retried request with the same Idempotency-Key gets the original share instead of a new one
+    share = store_share(share_data, idempotency_key=idempotency_key or None)
+    share_id = share["id"]
+    # Render the payload now so the first (often burst) views are served from the cache
+    share_payloads.get(share_id)
     
     # Generate share URL
-    share_url = f"{settings.FRONTEND_URL}/share/{share_request.share_type}/{share_id}"
+    share_url = f"{settings.FRONTEND_URL}/share/{share['share_type']}/{share_id}"
     
     return schemas.ShareResponse(share_id=share_id, share_url=share_url)
 
-@router.get("/{share_id}", response_model=schemas.ShareData)
-def get_share(share_id: str):
-    share_data = store_shares.get(share_id)
-    if not share_data:
+@router.get("/top", response_model=List[schemas.ShareViewStats])
+def top_shares(limit: int = Query(10, ge=1, le=100), current_user: dict = Depends(get_current_user)):
+    # The owner's most viewed shares, including views not yet flushed to the store
+    result = []
+    for share, stats in share_views.top(current_user["id"], limit):
+        result.append(schemas.ShareViewStats(
+            share_id=share["id"],
+            memory_item_id=share["memory_item_id"],
+            share_type=share["share_type"],
+            title=json.loads(share["share_content"]).get("title", ""),
+            views=stats["views"],
+            unique_viewers=stats["unique_viewers"],
+            created_at=share["created_at"],
+            expires_at=share["expires_at"],
+        ))
+    return result
+
+def _viewer(request: Request) -> bytes:
+    # Behind a proxy the first X-Forwarded-For hop is the client; only a hash of this ends up in the counters
+    forwarded = request.headers.get("x-forwarded-for")
+    host = forwarded.split(",")[0].strip() if forwarded else (request.client.host if request.client else "")
+    return f"{host}|{request.headers.get('user-agent', '')}".encode("utf-8")
+
+def _live_share(share_id: str):
+    """The cached payload and the Cache-Control max-age for a share that exists and has not expired."""
+    payload = share_payloads.get(share_id)
+    if payload is None:
         raise HTTPException(status_code=404, detail="Share not found")
     
-    # Check if share has expired
-    if share_data.get('expires_at'):
-        expires_at = datetime.fromisoformat(share_data['expires_at'])
-        if datetime.utcnow() > expires_at:
-            raise HTTPException(status_code=410, detail="Share has expired")
-    
-    # Parse share content
-    share_content = json.loads(share_data['share_content'])
-    
-    return schemas.ShareData(
-        id=share_data['id'],
-        title=share_content.get('title', ''),
-        content=share_content.get('content', {}),
-        share_type=share_data['share_type'],
-        created_at=datetime.fromisoformat(share_data['created_at']),
-        expires_at=datetime.fromisoformat(share_data['expires_at']) if share_data.get('expires_at') else None
-    )
+    # Check if share has expired (timestamps are stored natively, nothing to parse)
+    expires_at = payload.expires_at
+    now = datetime.utcnow()
+    if expires_at is not None and now > expires_at:
+        raise HTTPException(status_code=410, detail="Share has expired")
+
+    # Public and cacheable by CDNs, but never beyond the share's own expiry
+    max_age = settings.SHARE_CACHE_MAX_AGE
+    if expires_at is not None:
+        max_age = min(max_age, int((expires_at - now).total_seconds()))
+    return payload, max_age
+
+@router.get("/{share_id}", response_model=schemas.ShareData)
+def get_share(share_id: str, request: Request):
+    payload, max_age = _live_share(share_id)
+    headers = {"ETag": payload.etag, "Cache-Control": f"public, max-age={max_age}"}
+    # Counted in memory only; flushed to the store in batches (views served by a CDN are not seen here)
+    share_views.record(share_id, _viewer(request))
+    if none_match(request, payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+@router.get("/{share_id}/image")
+async def get_share_image(share_id: str, request: Request, format: str = Query("svg", pattern="^(png|svg)$")):
+    # Card image for link previews; rendered once per share content in the process pool, then served from cache
+    payload, max_age = _live_share(share_id)
+    if format == "png" and not share_images.png_available:
+        raise HTTPException(status_code=501, detail="PNG rendering is not available on this server, use format=svg")
+    key = share_images.key(payload.etag, format)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if none_match(request, etag):
+        return Response(status_code=304, headers=headers)
+    image = await share_images.get(key, payload.body, format)
+    return Response(content=image, media_type=MEDIA_TYPES[format], headers=headers)
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, Query
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import schemas
+from dependencies import get_current_user
+from learning_stats import MASTERY_BUCKETS
+from mock_store import facets, learning_stats
+from review_log import retention_stats, review_log
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/stats", tags=["stats"])
+
+@router.get("/retention", response_model=schemas.RetentionStats)
+def get_retention(
+    days: Optional[int] = Query(None, ge=1, le=3650, description="Only use reviews from the last N days"),
+    current_user: dict = Depends(get_current_user),
+):
+    # Computed from the user's review event columns; no per-item or per-event Python loop
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    return retention_stats(review_log.columns(current_user["id"]), since)
+
+@router.get("/summary", response_model=schemas.StatsSummary)
+def get_summary(
+    days: int = Query(365, ge=1, le=3650, description="Heatmap length in days, ending today (UTC)"),
+    current_user: dict = Depends(get_current_user),
+):
+    # Read from the per-day counters maintained on every write: O(days), independent of the item count
+    today = (datetime.utcnow().date() - date(1970, 1, 1)).days
+    summary = learning_stats.summary(current_user["id"], today, days)
+    start = date(1970, 1, 1) + timedelta(days=summary["first_day"])
+    labels = [f"{10 * b}-{10 * b + 9}" for b in range(MASTERY_BUCKETS - 1)] + ["100"]
+    return schemas.StatsSummary(
+        start_date=start,
+        end_date=start + timedelta(days=days - 1),
+        items_created=summary["created"].tolist(),
+        reviews=summary["reviews"].tolist(),
+        total_items=facets.counts(current_user["id"])["total"],
+        total_reviews=summary["total_reviews"],
+        active_days=int((summary["reviews"] > 0).sum()),
+        current_streak=summary["current_streak"],
+        longest_streak=summary["longest_streak"],
+        mastery_distribution=dict(zip(labels, summary["mastery"].tolist())),
+    )
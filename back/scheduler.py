@@ -0,0 +1,320 @@
+"""Spaced Repetition Scheduler
+间隔重复调度引擎：SM-2 与 FSRS（v4.5 参数）
+
+每个条目保存调度状态:
+  stability     记忆稳定性（天）。SM-2 中为未经间隔系数调整的原始间隔，FSRS 中为 S
+  sr_difficulty 算法内部难度。SM-2 中为易度因子 EF，FSRS 中为 D（1~10）
+  last_interval 上一次复习时距前一次复习的实际天数
+  reps          连续成功复习次数（失败时清零）
+  sr_algorithm  产生上述状态的算法（sm2 / fsrs）；与当前配置不同时先用 convert_state 换算再使用
+  sr_params     计算 next_review_date 所用参数的指纹（SchedulerParams.fingerprint）；只有指纹不同的条目才重算
+
+单次复习用 review() 更新状态；参数（目标记忆保持率、间隔系数、最大间隔）变化时，
+ScheduleColumns 以 NumPy 列存储整体重算所有条目的下次复习时间，不逐条循环。
+"""
+
+import hashlib
+import math
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+
+SM2 = "sm2"
+FSRS = "fsrs"
+ALGORITHMS = (SM2, FSRS)
+
+DAY_US = 86_400_000_000
+
+# FSRS v4.5 默认权重
+FSRS_DEFAULT_WEIGHTS = (
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+)
+FSRS_DECAY = -0.5
+FSRS_FACTOR = 0.9 ** (1 / FSRS_DECAY) - 1  # = 19/81，使 R(S, S) = 90%
+
+# 条目的难度标签作为初始难度的先验
+SM2_INITIAL_EASE = {"easy": 2.7, "medium": 2.5, "hard": 2.2}
+FSRS_DIFFICULTY_SHIFT = {"easy": -1.0, "medium": 0.0, "hard": 1.0}
+
+AGAIN, HARD, GOOD, EASY = 1, 2, 3, 4
+
+
+class SchedulerParams(NamedTuple):
+    algorithm: str = FSRS
+    desired_retention: float = 0.9
+    interval_modifier: float = 1.0
+    max_interval_days: int = 36500
+    weights: Tuple[float, ...] = FSRS_DEFAULT_WEIGHTS
+
+    @classmethod
+    def from_settings(cls) -> "SchedulerParams":
+        weights = tuple(float(w) for w in settings.FSRS_WEIGHTS.split(",")) if settings.FSRS_WEIGHTS else FSRS_DEFAULT_WEIGHTS
+        params = cls(
+            algorithm=settings.SCHEDULER_ALGORITHM,
+            desired_retention=settings.FSRS_DESIRED_RETENTION,
+            interval_modifier=settings.SCHEDULER_INTERVAL_MODIFIER,
+            max_interval_days=settings.SCHEDULER_MAX_INTERVAL_DAYS,
+            weights=weights,
+        )
+        params.validate()
+        return params
+
+    def fingerprint(self) -> int:
+        """参数的 63 位指纹（非零；0 表示未标记）"""
+        digest = hashlib.blake2b(repr(tuple(self)).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") >> 1 or 1
+
+    def validate(self) -> None:
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown scheduling algorithm: {self.algorithm}")
+        if not 0 < self.desired_retention < 1:
+            raise ValueError("desired_retention must be between 0 and 1")
+        if len(self.weights) != len(FSRS_DEFAULT_WEIGHTS):
+            raise ValueError(f"FSRS needs {len(FSRS_DEFAULT_WEIGHTS)} weights")
+
+
+class SchedulingState(NamedTuple):
+    stability: float
+    sr_difficulty: float
+    last_interval: float
+    reps: int
+    interval_days: int
+    algorithm: str
+
+
+def rating_from_review(mastery: int, difficulty: Optional[str] = None) -> int:
+    """把复习请求中的掌握度（0~100）与难度感受映射为 1~4 评分"""
+    if mastery < 60:
+        return AGAIN
+    rating = EASY if mastery >= 90 else GOOD if mastery >= 70 else HARD
+    if difficulty == "hard":
+        rating = max(HARD, rating - 1)
+    elif difficulty == "easy":
+        rating = min(EASY, rating + 1)
+    return rating
+
+
+# --- 间隔计算（标量与数组通用） ---
+def scheduled_interval(stability, params: SchedulerParams):
+    """由稳定性计算下次复习间隔（天，整数，至少 1 天）"""
+    stability = np.asarray(stability, dtype=np.float64)
+    if params.algorithm == FSRS:
+        days = stability / FSRS_FACTOR * (params.desired_retention ** (1 / FSRS_DECAY) - 1)
+    else:
+        days = stability * params.interval_modifier
+    return np.clip(np.rint(days), 1, params.max_interval_days).astype(np.int64)
+
+
+def retrievability(elapsed_days, stability):
+    return (1 + FSRS_FACTOR * np.asarray(elapsed_days) / np.maximum(stability, 1e-6)) ** FSRS_DECAY
+
+
+# --- 单次复习 ---
+def _sm2(stability, ease, reps, rating, label):
+    quality = rating + 1  # 1~4 -> SM-2 的 2~5
+    if ease is None:
+        ease = SM2_INITIAL_EASE.get(label, 2.5)
+    ease = max(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if rating == AGAIN:
+        return 1.0, ease, 0
+    if reps == 0:
+        interval = 1.0
+    elif reps == 1:
+        interval = 6.0
+    else:
+        interval = max(1.0, round((stability or 1.0) * ease))
+    return interval, ease, reps + 1
+
+
+def _fsrs(stability, difficulty, reps, rating, elapsed_days, label, w):
+    def initial_difficulty(g):
+        return w[4] - (g - 3) * w[5]
+
+    if stability is None or difficulty is None:
+        stability = w[rating - 1]
+        difficulty = initial_difficulty(rating) + FSRS_DIFFICULTY_SHIFT.get(label, 0.0)
+        return stability, min(10.0, max(1.0, difficulty)), (0 if rating == AGAIN else 1)
+
+    r = float(retrievability(elapsed_days, stability))
+    next_difficulty = difficulty - w[6] * (rating - 3)
+    next_difficulty = w[7] * initial_difficulty(3) + (1 - w[7]) * next_difficulty
+    next_difficulty = min(10.0, max(1.0, next_difficulty))
+    if rating == AGAIN:
+        next_stability = w[11] * difficulty ** -w[12] * ((stability + 1) ** w[13] - 1) * math.exp(w[14] * (1 - r))
+        return min(next_stability, stability), next_difficulty, 0
+    hard_penalty = w[15] if rating == HARD else 1.0
+    easy_bonus = w[16] if rating == EASY else 1.0
+    next_stability = stability * (
+        math.exp(w[8]) * (11 - difficulty) * stability ** -w[9] * (math.exp(w[10] * (1 - r)) - 1) * hard_penalty * easy_bonus + 1
+    )
+    return next_stability, next_difficulty, reps + 1
+
+
+def convert_state(stability: Optional[float], sr_difficulty: Optional[float], from_algorithm: str,
+                  to_algorithm: str) -> Tuple[Optional[float], Optional[float]]:
+    """把 from_algorithm 产生的状态换算为 to_algorithm 的状态
+
+    两种算法的稳定性都近似于“回忆率约 90% 时的间隔（天）”，原样保留；难度在 EF（1.3 起，越大越容易）
+    与 D（1~10，越大越难）之间线性换算，EF 2.5 对应 D 5。
+    """
+    if from_algorithm == to_algorithm or sr_difficulty is None:
+        return stability, sr_difficulty
+    if to_algorithm == FSRS:
+        return stability, min(10.0, max(1.0, 11.0 - (sr_difficulty - 1.3) * 5))
+    return stability, max(1.3, 1.3 + (11.0 - sr_difficulty) / 5)
+
+
+def review(params: SchedulerParams, stability: Optional[float], sr_difficulty: Optional[float], reps: Optional[int],
+           rating: int, elapsed_days: float, label: Optional[str] = None, algorithm: Optional[str] = None) -> SchedulingState:
+    """一次复习后的新状态；stability/sr_difficulty 为 None 表示首次复习
+
+    algorithm 为产生已有状态的算法，与 params.algorithm 不同时先换算（None 视为当前算法）。
+    """
+    if algorithm is not None and algorithm != params.algorithm:
+        stability, sr_difficulty = convert_state(stability, sr_difficulty, algorithm, params.algorithm)
+    reps = reps or 0
+    if params.algorithm == SM2:
+        stability, sr_difficulty, reps = _sm2(stability, sr_difficulty, reps, rating, label)
+    else:
+        stability, sr_difficulty, reps = _fsrs(stability, sr_difficulty, reps, rating, elapsed_days, label, params.weights)
+    # 间隔只由稳定性决定，与 ScheduleColumns.recompute 的整体重算结果一致
+    interval = int(scheduled_interval(stability, params))
+    return SchedulingState(stability, sr_difficulty, max(0.0, elapsed_days), reps, interval, params.algorithm)
+
+
+class ScheduleColumns:
+    """调度状态的列存储镜像，用于整体重算下次复习时间
+
+    由 mock_store 在每次写入条目时维护；未复习过的条目不在其中。
+    """
+
+    _GROW = 1024
+    _COLUMNS = ("user", "last_review", "stability", "due", "algorithm", "params")
+    # 算法在 algorithm 列中的编码；-1 为未标记（早于算法标记写入的状态）
+    _ALGORITHM_CODES = {SM2: 0, FSRS: 1}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._user_codes: Dict[str, int] = {}
+        self.user = np.zeros(self._GROW, dtype=np.int32)
+        self.last_review = np.zeros(self._GROW, dtype=np.int64)
+        self.stability = np.zeros(self._GROW, dtype=np.float64)
+        self.due = np.zeros(self._GROW, dtype=np.int64)
+        self.algorithm = np.zeros(self._GROW, dtype=np.int8)
+        # 参数指纹；0 为未标记，视为按当前参数计算
+        self.params = np.zeros(self._GROW, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _grow(self) -> None:
+        size = len(self.user) * 2
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def upsert(self, item_id: str, user_id: str, last_review_us: Optional[int], stability: Optional[float], due_us: Optional[int],
+               algorithm: Optional[str] = None, params: Optional[int] = None) -> None:
+        if last_review_us is None or stability is None:
+            self.remove(item_id)
+            return
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None:
+                row = len(self._ids)
+                if row == len(self.user):
+                    self._grow()
+                self._ids.append(item_id)
+                self._rows[item_id] = row
+            self.user[row] = self._user_codes.setdefault(user_id, len(self._user_codes))
+            self.last_review[row] = last_review_us
+            self.stability[row] = stability
+            self.due[row] = due_us if due_us is not None else -1
+            self.algorithm[row] = self._ALGORITHM_CODES.get(algorithm, -1)
+            self.params[row] = params or 0
+
+    def remove(self, item_id: str) -> None:
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+                for name in self._COLUMNS:
+                    column = getattr(self, name)
+                    column[row] = column[last]
+            self._ids.pop()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+            self._rows.clear()
+            self._user_codes.clear()
+
+    def snapshot_state(self) -> dict:
+        n = len(self._ids)
+        return {
+            "ids": self._ids, "user_codes": self._user_codes,
+            "columns": {name: getattr(self, name)[:n] for name in self._COLUMNS},
+        }
+
+    def restore_state(self, state: dict) -> None:
+        with self._lock:
+            self._ids = list(state["ids"])
+            self._rows = {item_id: row for row, item_id in enumerate(self._ids)}
+            self._user_codes = dict(state["user_codes"])
+            size = max(self._GROW, 1 << max(len(self._ids), 1).bit_length())
+            for name, values in state["columns"].items():
+                column = np.zeros(size, dtype=values.dtype)
+                column[:len(values)] = values
+                setattr(self, name, column)
+            if "algorithm" not in state["columns"]:
+                # 早于算法标记的快照：全部视为未标记
+                self.algorithm = np.full(size, -1, dtype=np.int8)
+            if "params" not in state["columns"]:
+                self.params = np.zeros(size, dtype=np.int64)
+
+    def recompute(self, params: SchedulerParams, user_id: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+        """重算由其他参数计算的条目，返回 (条目 ID, 按新参数的复习时间（纪元微秒）)
+
+        参数指纹相同或未标记的条目不重算，即使其复习时间被手动修改过。
+        """
+        with self._lock:
+            n = len(self._ids)
+            stale = self.params[:n] != 0
+            stale &= self.params[:n] != params.fingerprint()
+            if user_id is not None:
+                code = self._user_codes.get(user_id)
+                stale &= self.user[:n] == (code if code is not None else -1)
+            rows = np.flatnonzero(stale)
+            due = self.last_review[rows] + scheduled_interval(self.stability[rows], params) * DAY_US
+            return [self._ids[r] for r in rows], due
+
+    def mismatched(self, algorithm: str, user_id: Optional[str] = None) -> List[str]:
+        """状态不是由 algorithm 产生（或未标记）的条目 ID"""
+        with self._lock:
+            n = len(self._ids)
+            other = self.algorithm[:n] != self._ALGORITHM_CODES[algorithm]
+            if user_id is not None:
+                code = self._user_codes.get(user_id)
+                other &= self.user[:n] == (code if code is not None else -1)
+            return [self._ids[r] for r in np.flatnonzero(other)]
+
+
+DEFAULT_PARAMS = SchedulerParams.from_settings()
+
+
+def elapsed_days(last_review_us: Optional[int], now_us: int) -> float:
+    return 0.0 if last_review_us is None else max(0.0, (now_us - last_review_us) / DAY_US)
+
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Union
-from datetime import datetime
+from typing import Optional, List, Union, Dict
+from datetime import date, datetime
 import uuid
 
 # --- User Schemas ---
@@ -122,6 +122,7 @@ class ReviewSchedule(ReviewScheduleBase):
     id: uuid.UUID
     user_id: uuid.UUID
     created_at: datetime
+    completed_at: Optional[datetime] = None
     class Config:
         from_attributes = True
 
@@ -151,6 +152,54 @@ class MemoryItem(MemoryItemBase):
     class Config:
         from_attributes = True
 
+class MemoryItemSummary(MemoryItemBase):
+    """列表用的精简投影，不含 memory_aids"""
+    id: uuid.UUID
+    user_id: uuid.UUID
+    created_at: datetime
+    updated_at: datetime
+    memory_aids_count: int = 0
+
+class FacetCounts(BaseModel):
+    total: int = 0
+    categories: Dict[str, int] = {}
+    difficulties: Dict[str, int] = {}
+    tags: Dict[str, int] = {}
+    starred: int = 0
+
+class SimilarItem(BaseModel):
+    id: uuid.UUID
+    title: Optional[str] = None
+    score: float
+
+class DuplicateCheckRequest(BaseModel):
+    content: str
+    title: Optional[str] = None
+    limit: int = 5
+
+class DuplicateCheckResponse(BaseModel):
+    is_duplicate: bool
+    matches: List[SimilarItem] = []
+
+class ExportedSchedule(BaseModel):
+    review_date: datetime
+    completed: bool = False
+
+class MemoryItemImport(MemoryItemCreate):
+    """NDJSON 导入的一行，与导出格式相同（id 等多余字段忽略）"""
+    created_at: Optional[datetime] = None
+    review_schedules: Optional[List[ExportedSchedule]] = None
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+class ImportResult(BaseModel):
+    imported: int = 0
+    failed: int = 0
+    aids_generated: int = 0
+    errors: List[ImportLineError] = []
+
 class MemoryItemUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
@@ -172,6 +221,62 @@ class ReviewCompletionRequest(BaseModel):
     mastery: int
     difficulty: str
 
+class ReviewResult(ReviewCompletionRequest):
+    schedule_id: uuid.UUID
+    reviewed_at: Optional[datetime] = None
+
+class ReviewBatchRequest(BaseModel):
+    results: List[ReviewResult]
+
+class ReviewResultStatus(BaseModel):
+    schedule_id: uuid.UUID
+    status: str  # completed / already_completed / duplicate / not_found
+    memory_item_id: Optional[uuid.UUID] = None
+    next_review_date: Optional[datetime] = None
+
+class ReviewBatchResponse(BaseModel):
+    completed: int = 0
+    results: List[ReviewResultStatus] = []
+
+# --- Stats Schemas ---
+class RetentionPoint(BaseModel):
+    elapsed_days: float
+    reviews: int
+    recall_rate: float
+    predicted: Optional[float] = None
+
+class RetentionStats(BaseModel):
+    reviews: int = 0
+    measured_reviews: int = 0
+    recall_rate: Optional[float] = None
+    stability_days: Optional[float] = None
+    curve: List[RetentionPoint] = []
+    predicted_retention: Dict[str, float] = {}
+
+class StatsSummary(BaseModel):
+    start_date: date
+    end_date: date
+    items_created: List[int] = []   # one entry per day from start_date to end_date
+    reviews: List[int] = []
+    total_items: int = 0
+    total_reviews: int = 0
+    active_days: int = 0
+    current_streak: int = 0
+    longest_streak: int = 0
+    mastery_distribution: Dict[str, int] = {}
+
+# --- Review Session Schemas ---
+class ReviewSessionEntry(BaseModel):
+    schedule: ReviewSchedule
+    item: MemoryItem
+    overdue_reviews: int = 1
+
+class ReviewSession(BaseModel):
+    generated_at: datetime
+    due_until: datetime
+    due_total: int
+    entries: List[ReviewSessionEntry] = []
+
 class ForgotPasswordPayload(BaseModel):
     email: EmailStr
 
@@ -197,6 +302,16 @@ class ShareResponse(BaseModel):
     share_id: str
     share_url: str
 
+class ShareViewStats(BaseModel):
+    share_id: str
+    memory_item_id: str
+    share_type: str
+    title: str
+    views: int
+    unique_viewers: int  # HyperLogLog estimate
+    created_at: datetime
+    expires_at: Optional[datetime] = None
+
 # --- Media Generation Schemas ---
 class ImageGenerateRequest(BaseModel):
     content: str
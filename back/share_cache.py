@@ -0,0 +1,135 @@
+"""Share Payload Cache
+预先序列化的分享响应（有界 LRU）
+
+- 分享接口无需登录、访问量集中，每个分享只在创建（或首次访问）时渲染一次 JSON 字节与 ETag，
+  之后直接返回缓存的字节
+- 分享内容按条目当前的标题与记忆辅助渲染；这些字段（见 _source）变化或条目 / 分享被删除时，
+  通过 mock_store 的写入监听丢弃相关缓存，其他 worker 重放日志时同样会触发
+- 渲染在锁外进行，写入缓存前在锁内确认分享与条目的这些字段仍是渲染时的值，避免把旧内容放回去
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import mock_store
+import schemas
+from config import settings
+from http_cache import hash_etag
+
+
+def _source(item) -> Optional[tuple]:
+    """share_content 读取的条目字段；memory_aids 取压缩后的字节，比较时无需解压"""
+    return (item["title"], item._memory_aids) if item is not None else None
+
+
+def share_content(item, share_type: str, content_id: Optional[str]) -> dict:
+    """按分享类型从条目的记忆辅助中取出要分享的内容"""
+    aids = item.get("memory_aids") or {}
+    title = item.get("title", "")
+    if share_type == "mindmap":
+        return {"title": title, "content": aids.get("mindMap") or {}, "type": "mindmap"}
+    if share_type in ("mnemonic", "sensory"):
+        options = aids.get("mnemonics" if share_type == "mnemonic" else "sensoryAssociations") or []
+        chosen = None
+        if content_id:
+            chosen = next((o for o in options if o.get("id") == content_id), None)
+        if not chosen and options:
+            chosen = options[0]
+        return {"title": f"{title} - {chosen.get('title', '')}" if chosen else title, "content": chosen or {}, "type": share_type}
+    return {}
+
+
+class SharePayload(NamedTuple):
+    body: bytes
+    etag: str
+    expires_at: object  # datetime 或 None
+    share: object  # 渲染时的分享记录
+    source: Optional[tuple]  # 渲染时条目的 _source，用于判断是否变化
+
+
+class SharePayloadCache:
+    """share_id -> 已序列化的 ShareData"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, SharePayload]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, share_id: str) -> Optional[SharePayload]:
+        """命中时返回缓存；否则渲染并放入缓存，分享不存在时返回 None"""
+        with self._lock:
+            payload = self._entries.get(share_id)
+            if payload is not None:
+                self._entries.move_to_end(share_id)
+                self.hits += 1
+                return payload
+            self.misses += 1
+        payload = self._render(share_id)
+        if payload is None:
+            return None
+        with self._lock:
+            if self._current(share_id, payload):
+                self._entries[share_id] = payload
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return payload
+
+    @staticmethod
+    def _current(share_id: str, payload: SharePayload) -> bool:
+        if mock_store.shares.get(share_id) is not payload.share:
+            return False
+        return _source(mock_store.memory_items.get(payload.share["memory_item_id"])) == payload.source
+
+    def _render(self, share_id: str) -> Optional[SharePayload]:
+        share = mock_store.shares.get(share_id)
+        if share is None:
+            return None
+        item = mock_store.memory_items.get(share["memory_item_id"])
+        if item is not None:
+            content = share_content(item, share["share_type"], share["content_id"])
+        else:
+            # 条目已不存在时退回创建时保存的快照
+            content = json.loads(share["share_content"])
+        body = schemas.ShareData(
+            id=share["id"],
+            title=content.get("title", ""),
+            content=content.get("content", {}),
+            share_type=share["share_type"],
+            created_at=share["created_at"],
+            expires_at=share["expires_at"],
+        ).model_dump_json().encode("utf-8")
+        return SharePayload(body, hash_etag(body), share["expires_at"], share, _source(item))
+
+    def invalidate(self, share_id: str) -> None:
+        with self._lock:
+            self._entries.pop(share_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def on_change(self, table, key, record) -> None:
+        """mock_store 写入监听"""
+        if table is None:
+            self.clear()
+        elif table == "shares":
+            self.invalidate(key)
+        elif table == "memory_items":
+            # 删除条目时其分享已先被级联删除；这里只处理标题与记忆辅助的变化（复习等其他字段的写入不影响分享）
+            source = _source(record)
+            with self._lock:
+                for share_id in mock_store.shares_by_item.get(key, ()):
+                    payload = self._entries.get(share_id)
+                    if payload is not None and payload.source != source:
+                        del self._entries[share_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+share_payloads = SharePayloadCache(settings.SHARE_CACHE_MAX_ENTRIES)
+mock_store.add_listener(share_payloads.on_change)
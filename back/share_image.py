@@ -0,0 +1,337 @@
+"""Share Image Rendering
+分享卡片图片（SVG / PNG）的服务端渲染与缓存
+
+- 思维导图按 tidy tree（Reingold-Tilford）从左到右布局：每棵子树记录逐层的上下轮廓，
+  兄弟子树按轮廓尽量靠拢，父节点居中于首尾子节点，整体 O(节点数 × 深度)
+- 助记与感官联想分享渲染为“标题 -> 若干要点”的小树
+- 默认输出 SVG；PNG 由 cairosvg 栅格化（需要系统的 libcairo，未安装时请求 PNG 返回 501）；
+  布局与栅格化都在进程池中执行，不占用事件循环和 GIL；进程池用 spawn 启动，
+  不在多线程的服务进程中 fork（子进程可能继承其他线程持有的锁而死锁）
+- 图片按分享响应体的摘要（即分享的 ETag）缓存：内存中按字节数有界的 LRU，配置了 STORE_DATA_DIR 时同时写入磁盘，
+  多个 worker 与重启后都能复用；同一图片的并发请求只渲染一次
+- 磁盘缓存超过 disk_bytes 时按修改时间删除最旧的文件（读取命中时刷新修改时间），
+  分享删除或内容变化后不再被引用的图片随之被淘汰
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from config import settings
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+# 布局或样式变化时递增，使旧缓存失效
+RENDERER_VERSION = 1
+
+FONT_SIZE = 14
+NODE_HEIGHT = 32
+PADDING_X = 12
+GAP_X = 40   # 相邻两层之间的水平间距
+GAP_Y = 10   # 相邻子树之间的最小垂直间距
+MARGIN = 24
+TITLE_HEIGHT = 40
+MAX_LABEL_CHARS = 40
+PALETTE = ("#4f46e5", "#0891b2", "#059669", "#d97706", "#db2777")
+
+MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+
+def text_width(text: str) -> float:
+    """按字符宽度估算文字宽度（全角 1em，半角 0.6em）"""
+    return sum(FONT_SIZE if unicodedata.east_asian_width(c) in "WF" else FONT_SIZE * 0.6 for c in text)
+
+
+def _label(text) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= MAX_LABEL_CHARS else text[:MAX_LABEL_CHARS - 1] + "…"
+
+
+class _Box:
+    __slots__ = ("label", "width", "depth", "children", "y")
+
+    def __init__(self, label: str, depth: int):
+        self.label = label
+        self.width = text_width(label) + 2 * PADDING_X
+        self.depth = depth
+        self.children: List["_Box"] = []
+        self.y = 0.0  # 先是相对父节点的偏移，布局完成后为绝对坐标
+
+
+def _boxes(root: dict, max_nodes: int) -> _Box:
+    """按广度优先转换节点，超过 max_nodes 的部分不绘制"""
+    top = _Box(_label(root.get("label")), 0)
+    queue = [(root, top)]
+    count = 1
+    for node, box in queue:
+        for child in node.get("children") or ():
+            if count >= max_nodes:
+                return top
+            if not isinstance(child, dict):
+                continue
+            child_box = _Box(_label(child.get("label")), box.depth + 1)
+            box.children.append(child_box)
+            queue.append((child, child_box))
+            count += 1
+    return top
+
+
+def _layout(box: _Box) -> List[Tuple[float, float]]:
+    """布局子树并返回逐层轮廓 [(上沿, 下沿)]，坐标相对本节点中心"""
+    half = NODE_HEIGHT / 2
+    if not box.children:
+        return [(-half, half)]
+    merged: List[List[float]] = []
+    offsets = []
+    for child in box.children:
+        contour = _layout(child)
+        # 与已放置的兄弟子树在共同层上保持 GAP_Y 的间距
+        offset = 0.0 if not merged else max(
+            merged[level][1] - contour[level][0] + GAP_Y for level in range(min(len(merged), len(contour)))
+        )
+        offsets.append(offset)
+        for level, (top, bottom) in enumerate(contour):
+            if level < len(merged):
+                merged[level][1] = bottom + offset
+            else:
+                merged.append([top + offset, bottom + offset])
+    middle = (offsets[0] + offsets[-1]) / 2
+    for child, offset in zip(box.children, offsets):
+        child.y = offset - middle
+    return [(-half, half)] + [(top - middle, bottom - middle) for top, bottom in merged]
+
+
+def layout(root: dict, max_nodes: int = 300):
+    """返回 (节点列表, 每层的 x 坐标, 宽, 高)；节点的 y 为中心的绝对坐标"""
+    top = _boxes(root, max_nodes)
+    contour = _layout(top)
+    nodes = []
+    stack = [(top, -min(t for t, _ in contour))]
+    while stack:
+        box, y = stack.pop()
+        box.y = y
+        nodes.append(box)
+        stack.extend((child, y + child.y) for child in box.children)
+    depth_widths: Dict[int, float] = {}
+    for box in nodes:
+        depth_widths[box.depth] = max(depth_widths.get(box.depth, 0.0), box.width)
+    columns = [0.0]
+    for depth in range(1, len(depth_widths)):
+        columns.append(columns[-1] + depth_widths[depth - 1] + GAP_X)
+    width = columns[-1] + depth_widths[len(depth_widths) - 1]
+    height = max(b for _, b in contour) - min(t for t, _ in contour)
+    return nodes, columns, width, height
+
+
+def card_tree(share: dict) -> dict:
+    """分享内容 -> 要绘制的树"""
+    content = share.get("content") or {}
+    if share.get("share_type") == "mindmap" and content.get("label"):
+        return content
+    points = []
+    body = content.get("content")
+    if isinstance(body, str):
+        points = [line for line in body.splitlines() if line.strip()]
+    elif isinstance(body, list):
+        points = [" ".join(str(v) for v in entry.values()) if isinstance(entry, dict) else str(entry) for entry in body]
+    points += [p.get("concept", "") for p in content.get("keyPrinciples") or () if isinstance(p, dict)]
+    return {"label": content.get("title") or share.get("title", ""), "children": [{"label": p} for p in points]}
+
+
+def render_svg(share: dict, max_nodes: int = 300) -> str:
+    nodes, columns, width, height = layout(card_tree(share), max_nodes)
+    total_width = width + 2 * MARGIN
+    total_height = height + 2 * MARGIN + TITLE_HEIGHT
+    top = MARGIN + TITLE_HEIGHT
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{total_width:.0f}" height="{total_height:.0f}" '
+        f'viewBox="0 0 {total_width:.0f} {total_height:.0f}" font-family="PingFang SC, Noto Sans CJK SC, sans-serif">',
+        f'<rect width="100%" height="100%" fill="#ffffff"/>',
+        f'<text x="{MARGIN}" y="{MARGIN + FONT_SIZE + 4}" font-size="{FONT_SIZE + 4}" font-weight="bold" fill="#111827">'
+        f'{escape(_label(share.get("title", "")))}</text>',
+    ]
+    for box in nodes:
+        x = MARGIN + columns[box.depth]
+        for child in box.children:
+            x1, y1 = x + box.width, top + box.y
+            x2, y2 = MARGIN + columns[child.depth], top + child.y
+            mid = (x1 + x2) / 2
+            parts.append(f'<path d="M{x1:.1f},{y1:.1f} C{mid:.1f},{y1:.1f} {mid:.1f},{y2:.1f} {x2:.1f},{y2:.1f}" '
+                         f'fill="none" stroke="#cbd5e1" stroke-width="1.5"/>')
+    for box in nodes:
+        x, y = MARGIN + columns[box.depth], top + box.y - NODE_HEIGHT / 2
+        color = PALETTE[box.depth % len(PALETTE)]
+        fill, text_fill = (color, "#ffffff") if box.depth == 0 else ("#ffffff", "#111827")
+        parts.append(f'<rect x="{x:.1f}" y="{y:.1f}" width="{box.width:.1f}" height="{NODE_HEIGHT}" rx="8" '
+                     f'fill="{fill}" stroke="{color}" stroke-width="1.5"/>')
+        parts.append(f'<text x="{x + PADDING_X:.1f}" y="{y + NODE_HEIGHT / 2 + FONT_SIZE * 0.35:.1f}" '
+                     f'font-size="{FONT_SIZE}" fill="{text_fill}">{escape(box.label)}</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render(body: bytes, fmt: str, max_nodes: int = 300) -> bytes:
+    """在进程池中执行：分享响应体（ShareData JSON）-> 图片字节"""
+    svg = render_svg(json.loads(body), max_nodes).encode("utf-8")
+    if fmt == "svg":
+        return svg
+    return cairosvg.svg2png(bytestring=svg, scale=2)
+
+
+class ShareImages:
+    """按内容摘要缓存的分享图片"""
+
+    def __init__(self, workers: int = 2, cache_bytes: int = 64 * 1024 * 1024, max_nodes: int = 300,
+                 disk_bytes: int = 512 * 1024 * 1024):
+        self.workers = workers
+        self.cache_bytes = cache_bytes
+        self.disk_bytes = disk_bytes
+        self.max_nodes = max_nodes
+        self.directory: Optional[str] = None
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._disk_lock = threading.Lock()
+        self._disk_size = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.renders = 0
+
+    @property
+    def png_available(self) -> bool:
+        return cairosvg is not None
+
+    @staticmethod
+    def key(etag: str, fmt: str) -> str:
+        digest = etag.strip('"')
+        return f"{digest}-v{RENDERER_VERSION}.{fmt}"
+
+    def open(self, directory: Optional[str]) -> None:
+        self.directory = directory or None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._disk_size = sum(size for _, size, _ in self._disk_files())
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
+
+    def _remember(self, key: str, data: bytes) -> None:
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = data
+            self._size += len(data)
+            while self._size > self.cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._size -= len(evicted)
+
+    def cached(self, key: str) -> Optional[bytes]:
+        """内存缓存命中的图片"""
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+            return data
+
+    def _load(self, key: str) -> Optional[bytes]:
+        """读取磁盘缓存（阻塞，在线程中调用）"""
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def _store(self, key: str, data: bytes) -> None:
+        self._remember(key, data)
+        if self.directory:
+            path = os.path.join(self.directory, key)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            with self._disk_lock:
+                self._disk_size += len(data)
+                if self._disk_size > self.disk_bytes:
+                    self._trim()
+
+    def _disk_files(self) -> List[Tuple[float, int, str]]:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                continue  # 正在写入
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _trim(self) -> None:
+        """删除最旧的文件直到占用降到上限的 90%；按目录重新统计，其他 worker 写入的文件也计算在内"""
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        target = self.disk_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_size = total
+
+    async def _render(self, key: str, body: bytes, fmt: str) -> bytes:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            data = await asyncio.wrap_future(self._pool.submit(render, body, fmt, self.max_nodes))
+            self.renders += 1
+            await asyncio.to_thread(self._store, key, data)
+            return data
+        finally:
+            self._pending.pop(key, None)
+
+    async def get(self, key: str, body: bytes, fmt: str) -> bytes:
+        """返回缓存的图片，未命中时在进程池中渲染；同一 key 的并发请求等待同一次渲染"""
+        data = self.cached(key)
+        if data is None and self.directory:
+            data = await asyncio.to_thread(self._load, key)
+        if data is not None:
+            return data
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._render(key, body, fmt))
+        # 某个请求断开时不取消其他请求正在等待的渲染
+        return await asyncio.shield(pending)
+
+
+def image_directory() -> Optional[str]:
+    return os.path.join(settings.STORE_DATA_DIR, "share_images") if settings.STORE_DATA_DIR else None
+
+
+share_images = ShareImages(
+    workers=settings.SHARE_IMAGE_WORKERS,
+    cache_bytes=settings.SHARE_IMAGE_CACHE_BYTES,
+    max_nodes=settings.SHARE_IMAGE_MAX_NODES,
+    disk_bytes=settings.SHARE_IMAGE_DISK_BYTES,
+)
@@ -0,0 +1,182 @@
+"""Share View Counters
+分享的浏览量与独立访客数（批量写入存储）
+
+- 分享接口无需登录、访问量集中，浏览时只在内存中累加计数，不写存储；
+  后台任务每 flush_seconds 秒把累计的增量在一个事务中合并进 share_views 表
+- 独立访客数用 HyperLogLog 估计：每个分享 2^precision 个 uint8 寄存器（默认 1 KiB，标准误差约 3%），
+  访客标识（IP + User-Agent）只参与哈希，不会被保存
+- HyperLogLog 可以按寄存器取最大值合并，多个 worker 各自累计后写入同一行也不会重复计数
+- 待写入的分享数超过 max_pending 时在浏览请求中立即写入一次，内存占用有上界
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import mock_store
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HyperLogLog:
+    """寄存器以 bytes 保存，便于写入存储与按最大值合并"""
+
+    def __init__(self, precision: int = 10):
+        self.precision = precision
+        self.size = 1 << precision
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+        self._alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def empty(self) -> bytearray:
+        return bytearray(self.size)
+
+    def add(self, registers: bytearray, key: bytes) -> None:
+        h = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+        index = h >> self._shift
+        rank = self._shift - (h & self._mask).bit_length() + 1
+        if rank > registers[index]:
+            registers[index] = rank
+
+    def merge(self, a: Optional[bytes], b: Optional[bytes]) -> Optional[bytes]:
+        if a is None or len(a) != self.size:
+            return bytes(b) if b is not None else None
+        if b is None:
+            return bytes(a)
+        return np.maximum(np.frombuffer(a, dtype=np.uint8), np.frombuffer(b, dtype=np.uint8)).tobytes()
+
+    def merge_into(self, registers: bytearray, other: bytes) -> None:
+        """按寄存器取最大值，原地合并进 registers"""
+        target = np.frombuffer(registers, dtype=np.uint8)
+        np.maximum(target, np.frombuffer(other, dtype=np.uint8), out=target)
+
+    def estimate(self, registers: Optional[bytes]) -> int:
+        if not registers:
+            return 0
+        values = np.frombuffer(registers, dtype=np.uint8)
+        raw = self._alpha * self.size ** 2 / float(np.sum(np.ldexp(1.0, -values.astype(np.int32))))
+        zeros = int(np.count_nonzero(values == 0))
+        # 小基数时用线性计数修正
+        if raw <= 2.5 * self.size and zeros:
+            return int(round(self.size * math.log(self.size / zeros)))
+        return int(round(raw))
+
+
+class ShareViews:
+    """进程内的浏览计数缓冲与定期写入"""
+
+    def __init__(self, precision: int = 10, flush_seconds: float = 30.0, max_pending: int = 10000):
+        self.hll = HyperLogLog(precision)
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._views: Dict[str, int] = {}
+        self._viewers: Dict[str, bytearray] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+
+    def record(self, share_id: str, viewer: bytes) -> None:
+        """记录一次浏览；viewer 为访客标识"""
+        with self._lock:
+            self._views[share_id] = self._views.get(share_id, 0) + 1
+            registers = self._viewers.get(share_id)
+            if registers is None:
+                registers = self._viewers[share_id] = self.hll.empty()
+            self.hll.add(registers, viewer)
+            full = len(self._views) >= self.max_pending
+        if full:
+            self.flush()
+
+    def _merge(self, current: Optional[dict], pending: tuple) -> Optional[dict]:
+        share_id, views, registers = pending
+        share = mock_store.shares.get(share_id)
+        if share is None:
+            return None
+        return {
+            "share_id": share_id,
+            "user_id": share["user_id"],
+            "views": (current["views"] if current else 0) + views,
+            "viewers": self.hll.merge(current["viewers"] if current else None, registers),
+        }
+
+    def flush(self) -> int:
+        """把累计的增量写入存储，返回写入的分享数"""
+        with self._flush_lock:
+            with self._lock:
+                views, viewers = self._views, self._viewers
+                self._views, self._viewers = {}, {}
+            if not views:
+                return 0
+            try:
+                mock_store.merge_rows("share_views", {
+                    share_id: (share_id, count, viewers[share_id]) for share_id, count in views.items()
+                }, self._merge)
+            except BaseException:
+                # 写入失败（事务已回滚）：把计数合并回待写入的增量，下次再写
+                self._restore(views, viewers)
+                raise
+            self.flushes += 1
+            return len(views)
+
+    def _restore(self, views: Dict[str, int], viewers: Dict[str, bytearray]) -> None:
+        with self._lock:
+            for share_id, count in views.items():
+                self._views[share_id] = self._views.get(share_id, 0) + count
+                registers = self._viewers.get(share_id)
+                if registers is None:
+                    self._viewers[share_id] = viewers[share_id]
+                else:
+                    self.hll.merge_into(registers, viewers[share_id])
+
+    def stats(self, share_id: str) -> dict:
+        """已写入与尚未写入的计数之和"""
+        row = mock_store.share_views.get(share_id)
+        with self._lock:
+            pending_views = self._views.get(share_id, 0)
+            pending_viewers = self._viewers.get(share_id)
+            pending_viewers = bytes(pending_viewers) if pending_viewers is not None else None
+        registers = self.hll.merge(row["viewers"] if row else None, pending_viewers)
+        return {"views": (row["views"] if row else 0) + pending_views, "unique_viewers": self.hll.estimate(registers)}
+
+    def top(self, user_id: str, limit: int) -> List[tuple]:
+        """用户浏览量最高的分享，[(share, stats)]"""
+        ranked = [(share, self.stats(share["id"])) for share in mock_store.user_shares(user_id)]
+        ranked.sort(key=lambda entry: (entry[1]["views"], entry[1]["unique_viewers"]), reverse=True)
+        return ranked[:limit]
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                logger.exception("Share view flush failed")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # 关闭存储前写入剩余的计数
+        self.flush()
+
+
+share_views = ShareViews(
+    precision=settings.SHARE_HLL_PRECISION,
+    flush_seconds=settings.SHARE_VIEWS_FLUSH_SECONDS,
+    max_pending=settings.SHARE_VIEWS_MAX_PENDING,
+)
@@ -0,0 +1,163 @@
+"""Supabase Client Pool
+进程级共享的 PostgREST 客户端，按请求附加用户 JWT
+
+- 整个进程只创建一个 httpx 连接池（keep-alive，可用时启用 HTTP/2）
+- 每个请求得到一个轻量视图，只在发出的请求上附加 Authorization 头，不修改共享会话
+- 通过 httpcore 的 trace 扩展统计新建连接与复用连接的次数
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from postgrest import SyncPostgrestClient, SyncRequestBuilder
+from postgrest._sync.request_builder import SyncRPCFilterRequestBuilder
+
+from config import settings
+from database import require_supabase_config
+
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+logger = logging.getLogger(__name__)
+
+_NEW_CONNECTION_EVENTS = ("connection.connect_tcp.complete", "connection.connect_unix_socket.complete")
+
+
+class PoolMetrics:
+    """连接复用计数（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clients_created = 0
+        self.requests = 0
+        self.connections_opened = 0
+        self.errors = 0
+
+    def record(self, opened: bool, failed: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            self.connections_opened += opened
+            self.errors += failed
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = self.requests - self.connections_opened
+            return {
+                "clients_created": self.clients_created,
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": reused,
+                "reuse_ratio": round(reused / self.requests, 4) if self.requests else None,
+                "errors": self.errors,
+            }
+
+
+class _AuthedSession:
+    """替代 httpx.Client 传给 postgrest 请求构造器：转发到共享客户端并附加用户请求头"""
+
+    def __init__(self, client: httpx.Client, headers: Dict[str, str], metrics: PoolMetrics):
+        self._client = client
+        self._headers = headers
+        self._metrics = metrics
+
+    def request(self, method, url, *, headers=None, **kwargs):
+        merged = httpx.Headers(headers)
+        merged.update(self._headers)
+        opened = False
+
+        def trace(event_name, info):
+            nonlocal opened
+            if event_name in _NEW_CONNECTION_EVENTS:
+                opened = True
+
+        try:
+            response = self._client.request(method, url, headers=merged, extensions={"trace": trace}, **kwargs)
+        except Exception:
+            self._metrics.record(opened, failed=True)
+            raise
+        self._metrics.record(opened)
+        return response
+
+
+class AuthedSupabase:
+    """单个请求使用的数据访问视图，提供与 supabase Client 相同的 table/from_/rpc 接口"""
+
+    def __init__(self, session: _AuthedSession):
+        self._session = session
+
+    def table(self, table_name: str) -> SyncRequestBuilder:
+        return SyncRequestBuilder(self._session, f"/{table_name}")
+
+    from_ = table
+
+    def rpc(self, fn: str, params: Optional[dict] = None, count=None, head: bool = False, get: bool = False):
+        method = "HEAD" if head else "GET" if get else "POST"
+        headers = httpx.Headers({"Prefer": f"count={count}"}) if count else httpx.Headers()
+        if method in ("HEAD", "GET"):
+            return SyncRPCFilterRequestBuilder(self._session, f"/rpc/{fn}", method, headers, httpx.QueryParams(params or {}), json={})
+        return SyncRPCFilterRequestBuilder(self._session, f"/rpc/{fn}", method, headers, httpx.QueryParams(), json=params or {})
+
+
+class SupabasePool:
+    """进程级 PostgREST 客户端"""
+
+    def __init__(self, url: str, key: str, transport: Optional[httpx.BaseTransport] = None):
+        self.metrics = PoolMetrics()
+        self._key = key
+        http_client = httpx.Client(
+            timeout=settings.SUPABASE_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.SUPABASE_POOL_KEEPALIVE_EXPIRY,
+            ),
+            http2=_HTTP2 and transport is None,
+            follow_redirects=True,
+            transport=transport,
+        )
+        self.postgrest = SyncPostgrestClient(
+            f"{url.rstrip('/')}/rest/v1",
+            headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+            http_client=http_client,
+        )
+        self.metrics.clients_created += 1
+
+    def for_token(self, token: Optional[str]) -> AuthedSupabase:
+        """用户 JWT 只附加在该视图发出的请求上"""
+        headers = {"Authorization": f"Bearer {token or self._key}"}
+        return AuthedSupabase(_AuthedSession(self.postgrest.session, headers, self.metrics))
+
+    def close(self) -> None:
+        self.postgrest.session.close()
+
+
+_pool: Optional[SupabasePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SupabasePool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                url, key = require_supabase_config()
+                _pool = SupabasePool(url, key)
+                logger.info("Created shared Supabase PostgREST client")
+    return _pool
+
+
+def pool_metrics() -> Optional[Dict[str, Any]]:
+    return _pool.metrics.snapshot() if _pool is not None else None
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,115 @@
+"""
+memory_aids 压缩存储测试
+"""
+
+import copy
+import json
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+import zlib
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aids_codec
+import mock_store
+from aids_codec import AidsCodec
+from mock_ai_provider import MockAIProvider
+from records import MemoryItemRecord
+
+
+def _sample(n):
+    aids = MockAIProvider().generate_memory_aids(f"历史知识点 {n}：唐朝的建立与发展")
+    aids["mnemonics"][0]["id"] = f"rhyme-{n}"
+    return aids
+
+
+class TestAidsCodec(unittest.TestCase):
+    """编解码与字典测试"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.samples = [_sample(n) for n in range(12)]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_and_count(self):
+        codec = AidsCodec()
+        blob = codec.encode(self.samples[0])
+        self.assertIsInstance(blob, bytes)
+        self.assertEqual(codec.decode(blob), self.samples[0])
+        self.assertEqual(codec.count(blob), 5)
+        self.assertIsNone(codec.encode(None))
+        self.assertIs(codec.encode(blob), blob)
+
+    def test_preset_dictionary_beats_plain_zlib(self):
+        codec = AidsCodec()
+        raw = json.dumps(self.samples[0], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.assertLess(len(codec.encode(self.samples[0])), len(zlib.compress(raw, 9)))
+
+    def test_retrained_dictionary_keeps_old_blobs_readable(self):
+        codec = AidsCodec(self.tmp.name)
+        old_blob = codec.encode(self.samples[0])
+        raw = [json.dumps(s, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for s in self.samples]
+        codec.train(raw, 4096)
+        new_blob = codec.encode(self.samples[1])
+        self.assertNotEqual(old_blob[1:5], new_blob[1:5])
+
+        reloaded = AidsCodec(self.tmp.name)
+        self.assertEqual(reloaded.current, codec.current)
+        self.assertEqual(reloaded.decode(old_blob), self.samples[0])
+        self.assertEqual(reloaded.decode(new_blob), self.samples[1])
+
+    def test_unknown_dictionary_is_reported(self):
+        codec = AidsCodec(self.tmp.name)
+        raw = [json.dumps(s, ensure_ascii=False).encode("utf-8") for s in self.samples]
+        codec.train(raw, 4096)
+        blob = codec.encode(self.samples[0])
+        with self.assertRaises(ValueError):
+            AidsCodec().decode(blob)
+
+    def test_dictionary_trained_by_another_worker_is_loaded(self):
+        # 两个 worker 共用字典目录：一个训练并使用新字典后，另一个无需重启即可解码
+        running = AidsCodec(self.tmp.name)
+        restarted = AidsCodec(self.tmp.name)
+        raw = [json.dumps(s, ensure_ascii=False).encode("utf-8") for s in self.samples]
+        restarted.train(raw, 4096)
+        blob = restarted.encode(self.samples[0])
+        self.assertNotIn(restarted.current[1], running._dicts)
+        self.assertEqual(running.decode(blob), self.samples[0])
+        self.assertNotEqual(running.current, restarted.current)
+
+    def test_samples_loaded_from_either_backend(self):
+        for backend in ("wal", "sqlite"):
+            with self.subTest(backend=backend), tempfile.TemporaryDirectory() as directory:
+                saved = copy.deepcopy(mock_store._state())
+                try:
+                    mock_store.open_store(directory, backend=backend)
+                    kept = mock_store.create_memory_item("u", {"content": "样本", "memory_aids": self.samples[0]})
+                    dropped = mock_store.create_memory_item("u", {"content": "删除", "memory_aids": self.samples[1]})
+                    mock_store.delete_memory_item(dropped["id"])
+                    mock_store.close_store()
+                    with patch.multiple(aids_codec.settings, STORE_DATA_DIR=directory, STORE_BACKEND=backend):
+                        samples = aids_codec._load_samples(None)
+                    self.assertEqual(len(samples), 1)
+                    self.assertEqual(json.loads(samples[0]), kept["memory_aids"])
+                finally:
+                    mock_store.close_store()
+                    mock_store._restore(saved)
+
+    def test_record_stores_compressed_blob(self):
+        record = MemoryItemRecord(id=str(uuid.uuid4()), user_id=str(uuid.uuid4()), memory_aids=self.samples[0])
+        self.assertIsInstance(record._memory_aids, bytes)
+        self.assertEqual(record["memory_aids_count"], 5)
+        self.assertEqual(record["memory_aids"], self.samples[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+级联删除与后台回收测试
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+import ttl_store
+from compactor import Compactor
+from main import app
+from dependencies import get_current_user
+from records import ReviewScheduleRecord
+
+
+def _share(item_id, user_id, expires_at=None):
+    share_id = str(uuid.uuid4())
+    return mock_store.create_share({
+        "id": share_id,
+        "memory_item_id": item_id,
+        "user_id": user_id,
+        "share_type": "mindmap",
+        "content_id": None,
+        "content": {},
+        "created_at": datetime.utcnow().isoformat(),
+        "expires_at": expires_at.isoformat() if expires_at else None,
+        "view_count": 0,
+    })
+
+
+class TestCascadeDelete(unittest.TestCase):
+    """删除条目时级联删除复习计划与分享"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "cascade@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.item = mock_store.create_memory_item(self.user["id"], {"content": "级联删除"})
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store.delete_memory_item(self.item["id"])
+
+    def test_delete_cascades(self):
+        item_id = self.item["id"]
+        share = _share(item_id, self.user["id"])
+        schedules = self.client.get("/api/review_schedules").json()
+        self.assertEqual(len(schedules), 5)
+        self.assertEqual(self.client.post(f"/api/review_schedules/{schedules[0]['id']}/complete", json={"mastery": 80, "difficulty": "medium"}).status_code, 200)
+        self.assertIn(schedules[0]["id"], mock_store.review_schedules)
+
+        self.assertEqual(self.client.delete(f"/api/memory_items/{item_id}").status_code, 204)
+        self.assertEqual(self.client.get("/api/review_schedules").json(), [])
+        for s in schedules:
+            self.assertNotIn(s["id"], mock_store.review_schedules)
+        self.assertNotIn(share["id"], mock_store.shares)
+        self.assertNotIn(item_id, mock_store.schedules_by_item)
+        self.assertNotIn(item_id, mock_store.shares_by_item)
+
+    def test_filter_by_item(self):
+        other = mock_store.create_memory_item(self.user["id"], {"content": "另一条"})
+        try:
+            data = self.client.get("/api/review_schedules", params={"memory_item_id": other["id"]}).json()
+            self.assertEqual(len(data), 5)
+            self.assertTrue(all(s["memory_item_id"] == other["id"] for s in data))
+            self.assertEqual(len(self.client.get("/api/review_schedules").json()), 10)
+        finally:
+            mock_store.delete_memory_item(other["id"])
+
+
+class TestCompactor(unittest.TestCase):
+    """后台回收器测试"""
+
+    def setUp(self):
+        self.user_id = str(uuid.uuid4())
+        self.item = mock_store.create_memory_item(self.user_id, {"content": "回收"})
+
+    def tearDown(self):
+        mock_store.delete_memory_item(self.item["id"])
+
+    def _orphan_schedule(self):
+        sid = str(uuid.uuid4())
+        mock_store._apply("put", "review_schedules", sid, ReviewScheduleRecord(
+            id=sid, memory_item_id=str(uuid.uuid4()), user_id=self.user_id,
+            review_date=datetime.utcnow(), completed=False, created_at=datetime.utcnow(),
+        ))
+        return sid
+
+    def test_reclaims_orphans_and_expired_shares(self):
+        orphan = self._orphan_schedule()
+        expired = _share(self.item["id"], self.user_id, datetime.utcnow() - timedelta(days=30))
+        recent = _share(self.item["id"], self.user_id, datetime.utcnow() - timedelta(days=1))
+        live = _share(self.item["id"], self.user_id)
+
+        compactor = Compactor(share_retention_days=7)
+        compactor.run_once()
+
+        self.assertNotIn(orphan, mock_store.review_schedules)
+        self.assertNotIn(expired["id"], mock_store.shares)
+        self.assertIn(recent["id"], mock_store.shares)
+        self.assertIn(live["id"], mock_store.shares)
+        self.assertEqual(len(mock_store.user_review_schedules(self.user_id)), 5)
+        self.assertEqual(compactor.reclaimed["review_schedules"], 1)
+        self.assertEqual(compactor.reclaimed["shares"], 1)
+        self.assertEqual(compactor.sweeps, 1)
+
+    def test_time_sliced(self):
+        orphans = [self._orphan_schedule() for _ in range(300)]
+        compactor = Compactor(slice_ms=0)
+        # 时间片为 0 时每步只处理一批键，扫描分多步完成
+        steps = 1
+        while compactor.step():
+            steps += 1
+        self.assertGreater(steps, 1)
+        # 扫描只收集命中的键，删除按批进行
+        self.assertTrue(all(sid in mock_store.review_schedules for sid in orphans))
+        compactor.delete_pending()
+        self.assertTrue(all(sid not in mock_store.review_schedules for sid in orphans))
+
+    def test_deletes_in_batches_and_rechecks(self):
+        orphans = [self._orphan_schedule() for _ in range(250)]
+        compactor = Compactor(delete_batch=100)
+        with patch.object(mock_store, "delete_where", wraps=mock_store.delete_where) as delete_where:
+            while compactor.step():
+                pass
+            # 扫描之后、删除之前已被其他请求删除的行不重复计数
+            mock_store.delete_review_schedule(orphans[0])
+            compactor.delete_pending()
+        self.assertEqual(delete_where.call_count, 3)
+        self.assertEqual(compactor.reclaimed["review_schedules"], 249)
+        self.assertTrue(all(sid not in mock_store.review_schedules for sid in orphans))
+
+    def test_runs_only_on_leader(self):
+        class Follower:
+            def is_leader(self):
+                return False
+
+        orphan = self._orphan_schedule()
+        compactor = Compactor(ttl_interval=0.01, leader=Follower())
+        # 进程内的 TTLStore 在 follower 上同样回收
+        local = ttl_store.TTLStore("follower-test", ttl_seconds=0, max_entries=100)
+        local.set("k", 1)
+        ttl_store.registry.append(local)
+        self.addCleanup(ttl_store.registry.remove, local)
+
+        async def run_briefly():
+            task = asyncio.ensure_future(compactor.run())
+            await asyncio.sleep(0.05)
+            task.cancel()
+
+        asyncio.run(run_briefly())
+        self.assertIn(orphan, mock_store.review_schedules)
+        self.assertEqual(compactor.sweeps, 0)
+        self.assertEqual(len(local), 0)
+        self.assertEqual(compactor.reclaimed["follower-test"], 1)
+        mock_store.delete_review_schedule(orphan)
+
+    def test_key_slices_survive_concurrent_changes(self):
+        orphans = [self._orphan_schedule() for _ in range(30)]
+        seen = set()
+        for n, keys in enumerate(mock_store.key_slices("review_schedules", 10)):
+            self.assertLessEqual(len(keys), 10)
+            seen.update(keys)
+            if n == 0:
+                # 两片之间表的大小变化：从同一位置继续，不抛出 RuntimeError
+                mock_store.delete_review_schedule(orphans[-1])
+        self.assertTrue(set(orphans[:-1]) <= seen)
+        for sid in orphans[:-1]:
+            mock_store.delete_review_schedule(sid)
+
+
+if __name__ == "__main__":
+    unittest.main()
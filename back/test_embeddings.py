@@ -0,0 +1,97 @@
+"""
+本地向量与相似条目测试
+"""
+
+import unittest
+import uuid
+import time
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import mock_store
+from embeddings import SimilarityIndex, embed_text, _UserVectors
+from main import app
+from dependencies import get_current_user
+
+
+class TestEmbeddings(unittest.TestCase):
+    """哈希 n-gram 向量测试"""
+
+    def test_embed_is_normalized_and_deterministic(self):
+        a = embed_text("唐朝建立于618年", 256)
+        b = embed_text("唐朝建立于618年", 256)
+        self.assertAlmostEqual(float(np.linalg.norm(a)), 1.0, places=5)
+        np.testing.assert_array_equal(a, b)
+        self.assertFalse(embed_text("", 256).any())
+
+    def test_search_ranks_near_duplicates_first(self):
+        index = SimilarityIndex(dim=256)
+        index.add({"id": "1", "user_id": "u", "title": "", "content": "The Tang dynasty was founded in 618"})
+        index.add({"id": "2", "user_id": "u", "title": "", "content": "Photosynthesis converts light into energy"})
+        index.add({"id": "3", "user_id": "other", "title": "", "content": "The Tang dynasty was founded in 618"})
+        hits = index.search("u", index.embed("\nthe tang dynasty was founded in 618 AD"), k=2)
+        self.assertEqual(hits[0][0], "1")
+        self.assertGreater(hits[0][1], 0.8)
+        self.assertLess(hits[1][1], 0.5)
+
+    def test_remove_keeps_rows_consistent(self):
+        index = SimilarityIndex(dim=64)
+        items = [{"id": str(n), "user_id": "u", "title": "", "content": f"item number {n}"} for n in range(40)]
+        for item in items:
+            index.add(item)
+        for item in items[:39:2]:
+            index.remove(item)
+        hits = index.search("u", index.embed("\nitem number 7"), k=1)
+        self.assertEqual(hits[0][0], "7")
+        self.assertEqual(len(index.search("u", index.embed("x"), k=100)), 20)
+
+    def test_search_scales_to_large_libraries(self):
+        index = SimilarityIndex(dim=256)
+        rng = np.random.default_rng(0)
+        vectors = index._users.setdefault("u", _UserVectors(256))
+        for n in range(20000):
+            vectors.upsert(str(n), rng.standard_normal(256).astype(np.float32))
+        query = index.embed("query")
+        start = time.perf_counter()
+        index.search("u", query, k=10)
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+
+class TestSimilarEndpoints(unittest.TestCase):
+    """相似条目接口测试"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "sim@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.items = [
+            mock_store.create_memory_item(self.user["id"], {"content": "唐朝建立于618年，开国皇帝是李渊"}),
+            mock_store.create_memory_item(self.user["id"], {"content": "光合作用把光能转化为化学能"}),
+        ]
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        for item in self.items:
+            mock_store.delete_memory_item(item["id"])
+
+    def test_duplicate_warning(self):
+        data = self.client.post("/api/memory_items/duplicates", json={"content": "唐朝建立于618年，开国皇帝是李渊"}).json()
+        self.assertTrue(data["is_duplicate"])
+        self.assertEqual(data["matches"][0]["id"], self.items[0]["id"])
+
+        data = self.client.post("/api/memory_items/duplicates", json={"content": "牛顿第二定律"}).json()
+        self.assertFalse(data["is_duplicate"])
+
+    def test_similar_excludes_self(self):
+        item_id = self.items[0]["id"]
+        data = self.client.get(f"/api/memory_items/{item_id}/similar").json()
+        self.assertEqual([d["id"] for d in data], [self.items[1]["id"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+ETag 与条件请求测试
+"""
+
+import os
+import sys
+import unittest
+import uuid
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+import routers.memory_items
+from main import app
+from dependencies import get_current_user
+
+
+class TestETags(unittest.TestCase):
+    """条目、复习计划与分享的条件请求"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "etag@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.item = mock_store.create_memory_item(self.user["id"], {"content": "条件请求"})
+        self.url = f"/api/memory_items/{self.item['id']}"
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store.delete_memory_item(self.item["id"])
+
+    def test_item_not_modified(self):
+        first = self.client.get(self.url)
+        etag = first.headers["etag"]
+        self.assertTrue(etag.startswith('"'))
+
+        cached = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+        self.assertEqual(cached.headers["etag"], etag)
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": f'"other", W/{etag}'}).status_code, 304)
+
+        updated = self.client.put(self.url, json={"starred": True})
+        self.assertNotEqual(updated.headers["etag"], etag)
+        fresh = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertTrue(fresh.json()["starred"])
+
+    def test_aids_etag(self):
+        etag = self.client.get(f"{self.url}/aids").headers["etag"]
+        self.assertEqual(self.client.get(f"{self.url}/aids", headers={"If-None-Match": etag}).status_code, 304)
+        self.assertNotEqual(etag, self.client.get(self.url).headers["etag"])
+
+    def test_if_match(self):
+        etag = self.client.get(self.url).headers["etag"]
+        ok = self.client.put(self.url, json={"title": "新标题"}, headers={"If-Match": etag})
+        self.assertEqual(ok.status_code, 200)
+
+        # 其他客户端已修改，旧 ETag 的写入被拒绝
+        stale = self.client.put(self.url, json={"title": "覆盖"}, headers={"If-Match": etag})
+        self.assertEqual(stale.status_code, 412)
+        self.assertEqual(mock_store.memory_items[self.item["id"]]["title"], "新标题")
+        self.assertEqual(self.client.put(self.url, json={"mastery": 10}, headers={"If-Match": "*"}).status_code, 200)
+
+    def test_write_between_check_and_update(self):
+        etag = self.client.get(self.url).headers["etag"]
+        check = routers.memory_items.match_failed
+
+        def concurrent_write(request, tag):
+            failed = check(request, tag)
+            mock_store.update_memory_item(self.item["id"], {"title": "并发写入"})
+            return failed
+
+        # If-Match 检查通过后条目被另一请求修改：按客户端的版本比较，写入被拒绝
+        with patch.object(routers.memory_items, "match_failed", concurrent_write):
+            response = self.client.put(self.url, json={"title": "覆盖"}, headers={"If-Match": etag})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(mock_store.memory_items[self.item["id"]]["title"], "并发写入")
+
+    def test_etag_changes_on_reschedule(self):
+        schedule_id = mock_store.user_review_schedules(self.user["id"])[0]["id"]
+        self.client.post(f"/api/review_schedules/{schedule_id}/complete", json={"mastery": 80, "difficulty": "medium"})
+        etag = self.client.get(self.url).headers["etag"]
+        mock_store.reschedule(mock_store.DEFAULT_PARAMS._replace(desired_retention=0.8), user_id=self.user["id"])
+        self.assertEqual(self.client.get(self.url, headers={"If-None-Match": etag}).status_code, 200)
+        mock_store.reschedule(user_id=self.user["id"])
+
+    def test_version_conflict_in_store(self):
+        version = mock_store.memory_items[self.item["id"]]["version"]
+        mock_store.update_memory_item(self.item["id"], {"mastery": 5}, expected_version=version)
+        with self.assertRaises(mock_store.VersionConflict):
+            mock_store.update_memory_item(self.item["id"], {"mastery": 6}, expected_version=version)
+        self.assertEqual(mock_store.memory_items[self.item["id"]]["version"], version + 1)
+
+    def test_schedules_etag(self):
+        first = self.client.get("/api/review_schedules")
+        etag = first.headers["etag"]
+        self.assertEqual(self.client.get("/api/review_schedules", headers={"If-None-Match": etag}).status_code, 304)
+
+        mock_store.complete_review_schedule(mock_store.get_review_schedule(first.json()[0]["id"]))
+        self.assertEqual(self.client.get("/api/review_schedules", headers={"If-None-Match": etag}).status_code, 200)
+
+    def test_share_etag(self):
+        share_id = self.client.post("/api/share", json={"memory_item_id": self.item["id"], "share_type": "mindmap"}).json()["share_id"]
+        etag = self.client.get(f"/api/share/{share_id}").headers["etag"]
+        self.assertEqual(self.client.get(f"/api/share/{share_id}", headers={"If-None-Match": etag}).status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+分面索引测试
+"""
+
+import unittest
+import uuid
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from facet_index import FacetIndex
+from main import app
+from dependencies import get_current_user
+
+
+def _item(item_id, user_id="u1", **kw):
+    item = {"id": item_id, "user_id": user_id, "category": "其他", "difficulty": "medium", "tags": [], "starred": False}
+    item.update(kw)
+    return item
+
+
+class TestFacetIndex(unittest.TestCase):
+    """FacetIndex 单元测试"""
+
+    def setUp(self):
+        self.index = FacetIndex()
+        self.index.add(_item("a", category="历史", tags=["唐朝", "考试"], starred=True))
+        self.index.add(_item("b", category="历史", tags=["宋朝"], difficulty="hard"))
+        self.index.add(_item("c", category="英语", tags=["考试"]))
+        self.index.add(_item("d", user_id="u2", category="历史"))
+
+    def test_counts(self):
+        counts = self.index.counts("u1")
+        self.assertEqual(counts["total"], 3)
+        self.assertEqual(counts["categories"], {"历史": 2, "英语": 1})
+        self.assertEqual(counts["difficulties"], {"medium": 2, "hard": 1})
+        self.assertEqual(counts["tags"], {"唐朝": 1, "考试": 2, "宋朝": 1})
+        self.assertEqual(counts["starred"], 1)
+
+    def test_filter_intersection(self):
+        self.assertEqual(self.index.filter("u1", category="历史"), {"a", "b"})
+        self.assertEqual(self.index.filter("u1", tags=["考试"], category="历史"), {"a"})
+        self.assertEqual(self.index.filter("u1", starred=True), {"a"})
+        self.assertEqual(self.index.filter("u1", tags=["不存在"]), set())
+        self.assertEqual(self.index.filter("u2"), {"d"})
+
+    def test_remove_and_update(self):
+        old = _item("a", category="历史", tags=["唐朝", "考试"], starred=True)
+        self.index.remove(old)
+        self.index.add(_item("a", category="英语", tags=["考试"]))
+        counts = self.index.counts("u1")
+        self.assertEqual(counts["categories"], {"历史": 1, "英语": 2})
+        self.assertNotIn("唐朝", counts["tags"])
+        self.assertEqual(counts["starred"], 0)
+
+        self.index.remove(_item("a", category="英语", tags=["考试"]))
+        self.index.remove(_item("a", category="英语", tags=["考试"]))
+        self.assertEqual(self.index.counts("u1")["total"], 2)
+
+    def test_item_ids_is_a_copy(self):
+        ids = self.index.item_ids("u1")
+        # 遍历返回值时的并发写入不影响调用方
+        for item_id in ids:
+            self.index.add(_item(f"{item_id}-new"))
+        self.assertEqual(ids, {"a", "b", "c"})
+        self.assertEqual(len(self.index.item_ids("u1")), 6)
+        self.index.item_ids("u3").add("x")
+        self.assertEqual(self.index.item_ids("u3"), set())
+
+
+class TestFacetEndpoints(unittest.TestCase):
+    """分面接口测试"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "facet@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.items = [
+            mock_store.create_memory_item(self.user["id"], {"content": "a", "category": "历史", "tags": ["唐朝"]}),
+            mock_store.create_memory_item(self.user["id"], {"content": "b", "category": "英语", "starred": True}),
+        ]
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        for item in self.items:
+            mock_store.delete_memory_item(item["id"])
+
+    def test_facets_follow_writes(self):
+        data = self.client.get("/api/memory_items/facets").json()
+        self.assertEqual(data["total"], 2)
+        self.assertEqual(data["categories"], {"历史": 1, "英语": 1})
+
+        item_id = self.items[0]["id"]
+        self.client.put(f"/api/memory_items/{item_id}", json={"category": "英语", "starred": True})
+        data = self.client.get("/api/memory_items/facets").json()
+        self.assertEqual(data["categories"], {"英语": 2})
+        self.assertEqual(data["starred"], 2)
+
+        listed = self.client.get("/api/memory_items", params={"category": "英语", "tag": "唐朝"}).json()
+        self.assertEqual([i["id"] for i in listed], [item_id])
+
+        self.client.delete(f"/api/memory_items/{item_id}")
+        self.assertEqual(self.client.get("/api/memory_items/facets").json()["total"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+学习统计增量索引测试
+"""
+
+import copy
+import os
+import sys
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from learning_stats import LearningStats
+from main import app
+from dependencies import get_current_user
+
+DAY = 20000  # 任意 UTC 日序号
+BASE = datetime(1970, 1, 1) + timedelta(days=DAY)
+
+
+def _item(user_id="u1", day=0, mastery=0, review_count=0):
+    return {"id": str(uuid.uuid4()), "user_id": user_id, "created_at": BASE + timedelta(days=day, hours=3),
+            "mastery": mastery, "review_count": review_count, "review_date": None}
+
+
+class TestLearningStats(unittest.TestCase):
+    """LearningStats 单元测试"""
+
+    def setUp(self):
+        self.stats = LearningStats()
+
+    def _review(self, item, day, mastery=80):
+        changes = {"review_count": item["review_count"] + 1, "review_date": (BASE + timedelta(days=day)).isoformat(), "mastery": mastery}
+        self.stats.update(item, changes)
+        self.stats.review(item["user_id"], changes["review_date"])
+        item.update(changes)
+
+    def test_counts_by_day_and_growth_both_ways(self):
+        items = [_item(day=d) for d in (0, 0, 40, -80)]
+        for item in items:
+            self.stats.add(item)
+        summary = self.stats.summary("u1", DAY + 40, 100)
+        self.assertEqual(summary["first_day"], DAY - 59)
+        self.assertEqual(summary["created"][59], 2)
+        self.assertEqual(summary["created"][-1], 1)
+        self.assertEqual(summary["created"].sum(), 3)  # 第 -80 天在窗口之外
+
+        self.stats.remove(items[0])
+        self.assertEqual(self.stats.summary("u1", DAY, 1)["created"].tolist(), [1])
+        self.assertEqual(self.stats.summary("u1", DAY, 1)["mastery"][0], 3)
+
+    def test_reviews_mastery_and_streaks(self):
+        item = _item()
+        self.stats.add(item)
+        for day in (1, 2, 3, 5, 6):
+            self._review(item, day, mastery=95)
+        summary = self.stats.summary("u1", DAY + 6, 7)
+        self.assertEqual(summary["reviews"].tolist(), [0, 1, 1, 1, 0, 1, 1])
+        self.assertEqual(summary["longest_streak"], 3)
+        self.assertEqual(summary["current_streak"], 2)
+        # 今天还没有复习时，连续天数截至昨天；断了一天则归零
+        self.assertEqual(self.stats.summary("u1", DAY + 7, 7)["current_streak"], 2)
+        self.assertEqual(self.stats.summary("u1", DAY + 8, 7)["current_streak"], 0)
+        self.assertEqual(summary["mastery"][9], 1)
+        self.assertEqual(summary["mastery"].sum(), 1)
+
+        # 删除条目不会抹去复习历史
+        self.stats.remove(item)
+        self.assertEqual(self.stats.summary("u1", DAY + 6, 7)["total_reviews"], 5)
+
+    def test_unknown_user(self):
+        summary = self.stats.summary("nobody", DAY, 30)
+        self.assertEqual(len(summary["reviews"]), 30)
+        self.assertEqual(summary["current_streak"], 0)
+
+
+class TestSummaryEndpoint(unittest.TestCase):
+    """统计接口与存储索引钩子"""
+
+    def setUp(self):
+        self.saved = copy.deepcopy(mock_store._state())
+        self.user = {"id": str(uuid.uuid4()), "email": "stats@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store._restore(self.saved)
+
+    def test_summary(self):
+        items = [mock_store.create_memory_item(self.user["id"], {"content": f"统计 {n}"}) for n in range(3)]
+        schedule = mock_store.user_review_schedules(self.user["id"], items[0]["id"])[0]
+        self.client.post(f"/api/review_schedules/{schedule['id']}/complete", json={"mastery": 100, "difficulty": "easy"})
+        mock_store.delete_memory_item(items[2]["id"])
+
+        data = self.client.get("/api/stats/summary", params={"days": 30}).json()
+        self.assertEqual(len(data["items_created"]), 30)
+        self.assertEqual(data["items_created"][-1], 2)
+        self.assertEqual(data["reviews"][-1], 1)
+        self.assertEqual(data["total_items"], 2)
+        self.assertEqual(data["current_streak"], 1)
+        self.assertEqual(data["mastery_distribution"]["100"], 1)
+        self.assertEqual(data["mastery_distribution"]["0-9"], 1)
+        self.assertEqual(data["end_date"], datetime.utcnow().date().isoformat())
+
+    def test_batch_reviews_counted_on_their_own_days(self):
+        item = mock_store.create_memory_item(self.user["id"], {"content": "离线复习"})
+        schedules = mock_store.user_review_schedules(self.user["id"], item["id"])
+        now = datetime.utcnow()
+        results = [
+            {"schedule_id": s["id"], "mastery": 80, "difficulty": "medium", "reviewed_at": (now - timedelta(days=5 - n)).isoformat()}
+            for n, s in enumerate(schedules)
+        ]
+        self.assertEqual(self.client.post("/api/review_schedules/complete_batch", json={"results": results}).json()["completed"], 5)
+
+        # 五次复习合并为一次条目写入，仍分别计入各自的复习日
+        data = self.client.get("/api/stats/summary", params={"days": 7}).json()
+        self.assertEqual(data["reviews"], [0, 1, 1, 1, 1, 1, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+NDJSON 批量导出/导入测试
+"""
+
+import json
+import os
+import sys
+import unittest
+import uuid
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from main import app
+from dependencies import get_current_user
+
+AIDS = {
+    "mindMap": {"id": "root", "label": "主题", "children": [{"id": "c1", "label": "分支"}]},
+    "mnemonics": [{"id": "m1", "title": "口诀", "content": "内容", "type": "rhyme"}],
+    "sensoryAssociations": [],
+}
+
+
+class TestLibraryIO(unittest.TestCase):
+    """导出/导入接口测试"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "io@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        for item_id in list(mock_store.facets.item_ids(self.user["id"])):
+            mock_store.delete_memory_item(item_id)
+
+    def _switch_user(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "io2@example.com", "full_name": "", "token": ""}
+
+    def test_round_trip(self):
+        for n in range(3):
+            item = mock_store.create_memory_item(self.user["id"], {"content": f"条目 {n}", "tags": ["导出"], "memory_aids": AIDS})
+            mock_store.update_memory_item(item["id"], {"mastery": 60, "review_count": 2})
+        schedule = mock_store.user_review_schedules(self.user["id"])[0]
+        mock_store.complete_review_schedule(schedule)
+
+        response = self.client.get("/api/memory_items/export")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        lines = [json.loads(l) for l in response.text.splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0]["memory_aids"]["mnemonics"][0]["title"], "口诀")
+        self.assertEqual(len(lines[0]["review_schedules"]), 5)
+        self.assertEqual(sum(s["completed"] for l in lines for s in l["review_schedules"]), 1)
+
+        first_user = self.user["id"]
+        self._switch_user()
+        with patch("routers.memory_items.AIManager") as ai:
+            result = self.client.post("/api/memory_items/import", content=response.content).json()
+            ai.assert_not_called()
+        self.assertEqual(result["imported"], 3)
+        self.assertEqual(result["aids_generated"], 0)
+
+        imported = [mock_store.memory_items[i] for i in mock_store.facets.item_ids(self.user["id"])]
+        self.assertEqual(sorted(i["content"] for i in imported), ["条目 0", "条目 1", "条目 2"])
+        self.assertTrue(all(i["review_count"] == 2 and i["mastery"] == 60 for i in imported))
+        self.assertEqual(imported[0]["memory_aids"]["mindMap"]["label"], "主题")
+        schedules = mock_store.user_review_schedules(self.user["id"])
+        self.assertEqual(len(schedules), 15)
+        self.assertEqual(sum(s["completed"] for s in schedules), 1)
+        for item_id in list(mock_store.facets.item_ids(first_user)):
+            mock_store.delete_memory_item(item_id)
+
+    def test_import_empty_schedules(self):
+        body = "\n".join([
+            json.dumps({"content": "没有复习计划", "memory_aids": AIDS, "review_schedules": []}, ensure_ascii=False),
+            json.dumps({"content": "按阶梯复习", "memory_aids": AIDS}, ensure_ascii=False),
+        ])
+        result = self.client.post("/api/memory_items/import", content=body.encode("utf-8")).json()
+        self.assertEqual(result["imported"], 2)
+        # 显式的空列表表示没有复习计划，不回退为阶梯（否则旧条目会全部变成逾期）
+        by_content = {mock_store.memory_items[i]["content"]: i for i in mock_store.facets.item_ids(self.user["id"])}
+        self.assertEqual(mock_store.user_review_schedules(self.user["id"], by_content["没有复习计划"]), [])
+        self.assertEqual(len(mock_store.user_review_schedules(self.user["id"], by_content["按阶梯复习"])), 5)
+
+    def test_import_batches_and_errors(self):
+        lines = [json.dumps({"content": f"导入 {n}", "memory_aids": AIDS}, ensure_ascii=False) for n in range(12)]
+        lines.insert(3, "{not json")
+        lines.insert(7, json.dumps({"title": "缺少内容"}))
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+
+        def chunks():
+            for k in range(0, len(body), 17):
+                yield body[k:k + 17]
+
+        with patch("config.settings.IMPORT_BATCH_SIZE", 5):
+            result = self.client.post("/api/memory_items/import", content=chunks()).json()
+        self.assertEqual(result["imported"], 12)
+        self.assertEqual(result["failed"], 2)
+        self.assertEqual([e["line"] for e in result["errors"]], [4, 8])
+        self.assertEqual(len(mock_store.facets.item_ids(self.user["id"])), 12)
+        self.assertEqual(len(mock_store.user_review_schedules(self.user["id"])), 60)
+
+    def test_import_generates_missing_aids(self):
+        body = "\n".join([
+            json.dumps({"content": "需要生成"}, ensure_ascii=False),
+            json.dumps({"content": "已有辅助", "memory_aids": AIDS}, ensure_ascii=False),
+        ])
+        with patch("routers.memory_items.AIManager") as ai:
+            ai.return_value.generate_memory_aids.return_value = AIDS
+            result = self.client.post("/api/memory_items/import", content=body).json()
+            self.assertEqual(ai.return_value.generate_memory_aids.call_count, 1)
+        self.assertEqual(result["aids_generated"], 1)
+
+        with patch("routers.memory_items.AIManager") as ai:
+            self.client.post("/api/memory_items/import", params={"generate_aids": "false"}, content=body)
+            ai.return_value.generate_memory_aids.assert_not_called()
+
+    def test_oversized_line(self):
+        with patch("config.settings.IMPORT_MAX_LINE_BYTES", 64):
+            response = self.client.post("/api/memory_items/import", content=b"x" * 200)
+        self.assertEqual(response.status_code, 413)
+
+    def test_oversized_line_inside_one_chunk(self):
+        # 超长行后跟换行并与其他行同在一个块中，同样拒绝
+        body = b"x" * 200 + b"\n" + json.dumps({"content": "短行"}).encode("utf-8") + b"\n"
+        with patch("config.settings.IMPORT_MAX_LINE_BYTES", 64):
+            response = self.client.post("/api/memory_items/import", content=body)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("Line 1", response.json()["detail"])
+        self.assertEqual(list(mock_store.facets.item_ids(self.user["id"])), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
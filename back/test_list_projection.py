@@ -0,0 +1,74 @@
+"""
+列表精简投影与按需加载 memory_aids 测试
+"""
+
+import os
+import sys
+import unittest
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from main import app
+from dependencies import get_current_user
+
+
+def _aids(n):
+    return {
+        "mindMap": {"id": "root", "label": f"主题 {n}", "children": [{"id": f"c{k}", "label": "分支" * 20} for k in range(20)]},
+        "mnemonics": [{"id": f"m{k}", "title": "口诀", "content": "内容" * 100, "type": "rhyme"} for k in range(3)],
+        "sensoryAssociations": [{"id": "s1", "title": "视觉", "type": "visual", "content": "画面" * 100}],
+    }
+
+
+class TestListProjection(unittest.TestCase):
+    """列表投影接口测试"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "proj@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.items = [
+            mock_store.create_memory_item(self.user["id"], {"content": f"条目 {n}", "memory_aids": _aids(n)})
+            for n in range(20)
+        ]
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        for item in self.items:
+            mock_store.delete_memory_item(item["id"])
+
+    def test_default_list_is_summary(self):
+        response = self.client.get("/api/memory_items")
+        data = response.json()
+        self.assertEqual(len(data), 20)
+        self.assertNotIn("memory_aids", data[0])
+        self.assertEqual(data[0]["memory_aids_count"], 5)
+
+        full = [self.client.get(f"/api/memory_items/{i['id']}").content for i in self.items]
+        self.assertLess(len(response.content) * 10, sum(len(body) for body in full))
+
+    def test_fields_selector(self):
+        data = self.client.get("/api/memory_items", params={"fields": "title,memory_aids"}).json()
+        self.assertEqual(set(data[0]), {"id", "title", "memory_aids"})
+        self.assertEqual(len(data[0]["memory_aids"]["mnemonics"]), 3)
+
+        data = self.client.get("/api/memory_items", params={"fields": "created_at, tags"}).json()
+        self.assertEqual(set(data[0]), {"id", "created_at", "tags"})
+        self.assertEqual(data[0]["tags"], [])
+
+        response = self.client.get("/api/memory_items", params={"fields": "title,password"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_aids_endpoint(self):
+        item_id = self.items[0]["id"]
+        data = self.client.get(f"/api/memory_items/{item_id}/aids").json()
+        self.assertEqual(data["mindMap"]["label"], "主题 0")
+        self.assertEqual(self.client.get(f"/api/memory_items/{uuid.uuid4()}/aids").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
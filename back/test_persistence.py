@@ -0,0 +1,152 @@
+"""
+存储持久化（WAL + 快照）测试
+"""
+
+import copy
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mock_store
+from persistence import Journal
+
+
+class TestJournal(unittest.TestCase):
+    """Journal 单元测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _open(self, **kw):
+        journal = Journal(self.dir, **kw)
+        state, tail = journal.recover()
+        records = list(tail)
+        journal.open()
+        return journal, state, records
+
+    def test_replay_after_restart(self):
+        journal, state, records = self._open(fsync="always")
+        self.assertIsNone(state)
+        self.assertEqual(records, [])
+        journal.append("put", "t", "a", {"v": 1})
+        journal.append("update", "t", "a", {"v": 2})
+        journal.close()
+
+        journal, _, records = self._open(fsync="never")
+        self.assertEqual([r[1:] for r in records], [("put", "t", "a", {"v": 1}), ("update", "t", "a", {"v": 2})])
+        self.assertEqual(journal.append("delete", "t", "a"), 3)
+        journal.close()
+
+    def test_torn_tail_is_truncated(self):
+        journal, _, _ = self._open(fsync="always")
+        journal.append("put", "t", "a", 1)
+        journal.append("put", "t", "b", 2)
+        journal.close()
+        segment = journal._segments()[-1][1]
+        with open(segment, "r+b") as f:
+            f.truncate(os.path.getsize(segment) - 3)
+
+        journal, _, records = self._open()
+        self.assertEqual([r[3] for r in records], ["a"])
+        journal.append("put", "t", "c", 3)
+        journal.close()
+        _, _, records = self._open()
+        self.assertEqual([r[3] for r in records], ["a", "c"])
+
+    def test_snapshot_then_tail(self):
+        journal, _, _ = self._open(fsync="interval", fsync_interval=0.01, snapshot_every=2)
+        state = {"rows": {}}
+        for n in range(5):
+            state["rows"][n] = n
+            journal.append("put", "rows", n, n)
+            if journal.should_snapshot():
+                journal.snapshot(lambda: copy.deepcopy(state))
+                journal._reap_snapshot(block=True)
+        journal.close()
+
+        journal, snapshot, records = self._open()
+        self.assertEqual(journal.snapshot_seq, 4)
+        self.assertEqual(snapshot, {"rows": {0: 0, 1: 1, 2: 2, 3: 3}})
+        self.assertEqual([r[3] for r in records], [4])
+        self.assertEqual([start for start, _ in journal._segments()], [5])
+        journal.close()
+
+    def test_snapshot_is_consistent_without_fork(self):
+        journal, _, _ = self._open(snapshot_every=1)
+        state = {"rows": {"a": 1}}
+        journal.append("put", "rows", "a", 1)
+        with patch.object(os, "fork", side_effect=AssertionError("must not fork"), create=True):
+            journal.snapshot(lambda: state)
+        # 快照返回后的写入不影响正在写出的快照
+        state["rows"]["b"] = 2
+        journal.append("put", "rows", "b", 2)
+        journal._reap_snapshot(block=True)
+        journal.close()
+
+        journal, snapshot, records = self._open()
+        self.assertEqual(snapshot, {"rows": {"a": 1}})
+        self.assertEqual([r[3] for r in records], ["b"])
+        journal.close()
+
+    def test_rejects_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            Journal(self.dir, fsync="sometimes")
+
+
+class TestStoreRecovery(unittest.TestCase):
+    """mock_store 重启恢复测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = copy.deepcopy(mock_store._state())
+        self.user_id = str(uuid.uuid4())
+
+    def tearDown(self):
+        mock_store.close_store()
+        mock_store._restore(self.saved)
+        self.tmp.cleanup()
+
+    def test_embedding_dim_change_rebuilds_index(self):
+        item = mock_store.create_memory_item(self.user_id, {"content": "维度变化"})
+        state = copy.deepcopy(mock_store._state())
+        state["similar_items"] = {"dim": mock_store.similar_items.dim // 2, "users": {}}
+        # 快照的向量维度与配置不同：不中止启动，按条目重建
+        with self.assertLogs("embeddings", "WARNING"):
+            mock_store._restore(state)
+        hits = mock_store.similar_items.search(self.user_id, mock_store.similar_items.embed("维度变化\n维度变化"), k=1)
+        self.assertEqual(hits[0][0], item["id"])
+
+    def test_restart_restores_items_and_indexes(self):
+        mock_store.open_store(self.tmp.name)
+        item = mock_store.create_memory_item(self.user_id, {"content": "持久化测试", "category": "历史"})
+        mock_store.complete_review_schedule(mock_store.user_review_schedules(self.user_id)[0])
+        mock_store.update_memory_item(item["id"], {"starred": True})
+        gone = mock_store.create_memory_item(self.user_id, {"content": "会被删除"})
+        mock_store.delete_memory_item(gone["id"])
+        mock_store.close_store()
+
+        mock_store._restore(copy.deepcopy(self.saved))
+        self.assertNotIn(item["id"], mock_store.memory_items)
+
+        mock_store.open_store(self.tmp.name)
+        self.assertTrue(mock_store.memory_items[item["id"]]["starred"])
+        self.assertNotIn(gone["id"], mock_store.memory_items)
+        self.assertEqual(mock_store.facets.counts(self.user_id)["categories"], {"历史": 1})
+        hits = mock_store.similar_items.search(self.user_id, mock_store.similar_items.embed("持久化测试\n持久化测试"), k=1)
+        self.assertEqual(hits[0][0], item["id"])
+        schedules = mock_store.user_review_schedules(self.user_id, item["id"])
+        self.assertEqual(len(schedules), 5)
+        self.assertEqual([s["id"] for s in schedules if s["completed"]], list(mock_store.schedules_by_item[item["id"]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+紧凑记录表示测试
+"""
+
+import os
+import pickle
+import sys
+import unittest
+import uuid
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import records
+import schemas
+import mock_store
+from records import MemoryItemRecord, ReviewScheduleRecord, ShareRecord, pack_uuid, to_epoch_us, from_epoch_us
+
+
+class TestRecords(unittest.TestCase):
+    """slots 记录测试"""
+
+    def setUp(self):
+        self.user_id = str(uuid.uuid4())
+        records.share_id(self.user_id)
+        self.addCleanup(records.forget_id, self.user_id)
+        self.item = MemoryItemRecord(
+            id=str(uuid.uuid4()), user_id=self.user_id, title="t", content="c", category="历史",
+            tags=["考试"], type="general", difficulty="medium", mastery=0, review_count=0,
+            starred=False, created_at="2025-01-02T03:04:05.123456", updated_at=datetime(2025, 1, 2),
+        )
+
+    def test_fields_round_trip(self):
+        self.assertEqual(self.item["user_id"], self.user_id)
+        self.assertEqual(self.item["created_at"], datetime(2025, 1, 2, 3, 4, 5, 123456))
+        self.assertIsNone(self.item.get("review_date"))
+        self.assertIsInstance(self.item._id, bytes)
+        self.assertEqual(len(self.item._id), 16)
+        self.assertIsInstance(self.item._created_at, int)
+
+    def test_timezone_aware_values_are_stored_as_utc(self):
+        aware = datetime(2025, 1, 2, 8, 0, tzinfo=timezone(timedelta(hours=8)))
+        self.item.update({"next_review_date": aware})
+        self.assertEqual(self.item["next_review_date"], datetime(2025, 1, 2, 0, 0))
+        self.assertEqual(from_epoch_us(to_epoch_us("2025-01-02T00:00:00Z")), datetime(2025, 1, 2))
+
+    def test_shared_and_interned_values(self):
+        other = MemoryItemRecord(id=str(uuid.uuid4()), user_id=self.user_id, category="历史")
+        self.assertIs(other._user_id, self.item._user_id)
+        self.assertIs(other._category, self.item._category)
+        self.assertEqual(pack_uuid("not-a-uuid"), "not-a-uuid")
+
+    def test_only_user_ids_are_shared(self):
+        size = len(records._shared_ids)
+        for _ in range(3):
+            MemoryItemRecord(id=str(uuid.uuid4()), user_id=str(uuid.uuid4()))
+        self.assertEqual(len(records._shared_ids), size)
+
+        user = mock_store.create_user(f"{uuid.uuid4()}@example.com", "", "")
+        first = ReviewScheduleRecord(id=str(uuid.uuid4()), user_id=user["id"])
+        second = ReviewScheduleRecord(id=str(uuid.uuid4()), user_id=user["id"])
+        self.assertIs(first._user_id, second._user_id)
+        mock_store._apply("delete", "users", user["email"], journal=False)
+        self.assertNotIn(pack_uuid(user["id"]), records._shared_ids)
+
+    def test_dict_interface(self):
+        self.assertIn("memory_aids", self.item)
+        self.assertEqual(set(self.item.to_dict()), set(MemoryItemRecord.FIELDS))
+        with self.assertRaises(KeyError):
+            self.item["unknown"] = 1
+        self.assertEqual(self.item.get("unknown", "x"), "x")
+
+    def test_pickle_and_schema_validation(self):
+        restored = pickle.loads(pickle.dumps(self.item, protocol=pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(restored.to_dict(), self.item.to_dict())
+        model = schemas.MemoryItem.model_validate(restored)
+        self.assertEqual(str(model.id), self.item["id"])
+        self.assertEqual(model.tags, ["考试"])
+
+        schedule = ReviewScheduleRecord(id=str(uuid.uuid4()), memory_item_id=self.item._id, user_id=self.user_id,
+                                        review_date=datetime(2025, 1, 3), completed=False, created_at=datetime(2025, 1, 2))
+        self.assertIs(schedule._memory_item_id, self.item._id)
+        self.assertEqual(schemas.ReviewSchedule.model_validate(schedule).memory_item_id, uuid.UUID(self.item["id"]))
+
+    def test_unpickle_state_missing_new_slots(self):
+        # 新增 version 之前写出的快照
+        old_state = self.item.__getstate__()[:-1]
+        restored = MemoryItemRecord.__new__(MemoryItemRecord)
+        restored.__setstate__(old_state)
+        self.assertIsNone(restored["version"])
+        self.assertEqual(restored["title"], self.item["title"])
+
+
+class TestShareAndSessionRecords(unittest.TestCase):
+    """分享与扫码会话的时间字段以原生形式保存"""
+
+    def test_legacy_share_dict_is_converted(self):
+        share_id = str(uuid.uuid4())
+        # 旧日志中的分享是 ISO 字符串组成的 dict
+        mock_store._apply("put", "shares", share_id, {
+            "id": share_id, "memory_item_id": str(uuid.uuid4()), "user_id": str(uuid.uuid4()),
+            "share_type": "mindmap", "content_id": None, "share_content": "{}",
+            "expires_at": "2025-01-02T03:04:05+08:00", "created_at": "2025-01-01T00:00:00",
+        }, journal=False)
+        try:
+            share = mock_store.shares[share_id]
+            self.assertIsInstance(share, ShareRecord)
+            self.assertEqual(share["expires_at"], datetime(2025, 1, 1, 19, 4, 5))
+            self.assertIsInstance(share._created_at, int)
+        finally:
+            mock_store.delete_share(share_id)
+
+    def test_qr_session_timestamps(self):
+        session = mock_store.create_qr_session()
+        mock_store.confirm_qr_session(session["id"], "u1", "u1@example.com")
+        stored = mock_store.get_qr_session(session["id"])
+        self.assertEqual(stored["status"], "confirmed")
+        self.assertIsInstance(stored["confirmed_at"], datetime)
+        self.assertGreaterEqual(stored["confirmed_at"], stored["created_at"])
+        restored = pickle.loads(pickle.dumps(stored))
+        self.assertEqual(restored.to_dict(), stored.to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+复习提醒调度测试
+"""
+
+import copy
+import json
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mock_store
+from records import to_epoch_us
+from reminders import FileSink, QueueSink, ReminderDispatcher, ReminderQueue
+
+
+class TestReminderQueue(unittest.TestCase):
+    """最小堆与惰性删除"""
+
+    def test_pop_due_groups_by_user(self):
+        q = ReminderQueue()
+        q.set("a", "u1", 30)
+        q.set("b", "u1", 10)
+        q.set("c", "u2", 20)
+        q.set("a", "u1", 5)   # 提前：旧堆项作废
+        q.set("c", "u2", None)
+        self.assertEqual(q.next_fire(), 5)
+        due = q.pop_due(25)
+        self.assertEqual(dict(due), {"u1": [(5, "a"), (10, "b")]})
+        self.assertEqual(len(q), 0)
+        self.assertIsNone(q.next_fire())
+
+    def test_heap_stays_bounded(self):
+        q = ReminderQueue()
+        for n in range(5000):
+            q.set("a", "u", n)
+        self.assertLessEqual(len(q._heap), 1026)
+
+
+class TestReminderDispatcher(unittest.TestCase):
+    """合并摘要、冷却与重启后重建"""
+
+    def setUp(self):
+        self.saved = copy.deepcopy(mock_store._state())
+        self.user_id = str(uuid.uuid4())
+        self.sink = QueueSink()
+        self.dispatcher = ReminderDispatcher(self.sink, cooldown_seconds=3600)
+        mock_store.add_listener(self.dispatcher.on_change)
+        self.dispatcher.rebuild()
+        self.items = [
+            mock_store.create_memory_item(self.user_id, {"content": f"提醒 {n}", "title": f"标题 {n}"})
+            for n in range(3)
+        ]
+
+    def tearDown(self):
+        mock_store.remove_listener(self.dispatcher.on_change)
+        mock_store._restore(self.saved)
+
+    def _digests(self):
+        digests = []
+        while not self.sink.queue.empty():
+            digests.append(self.sink.queue.get())
+        return digests
+
+    def test_digest_cooldown_and_restart(self):
+        now = datetime.utcnow()
+        self.assertEqual(self.dispatcher.dispatch(now), 0)
+        self.assertEqual(len(self.dispatcher.queue), 3)
+
+        # 第 1 天的复习到期：三个条目合并为一条摘要
+        day1 = now + timedelta(days=1, minutes=1)
+        self.assertEqual(self.dispatcher.dispatch(day1), 1)
+        digest, = self._digests()
+        self.assertEqual(digest.user_id, self.user_id)
+        self.assertEqual(digest.due_count, 3)
+        self.assertEqual(set(digest.titles), {"标题 0", "标题 1", "标题 2"})
+
+        # 完成一个条目的第 1 天复习后，第 3 天的复习进入队列
+        first = mock_store.user_review_schedules(self.user_id, self.items[0]["id"])[0]
+        mock_store.complete_review_schedule(first)
+        self.assertEqual(len(self.dispatcher.queue), 1)
+
+        # 重启：未完成的到期已提醒过，不会重发
+        self.dispatcher.rebuild()
+        self.assertEqual(len(self.dispatcher.queue), 1)
+        day3 = now + timedelta(days=3, minutes=1)
+        self.assertEqual(self.dispatcher.dispatch(day3), 1)
+        self.assertEqual(self._digests()[0].item_ids, [self.items[0]["id"]])
+
+    def test_cooldown_defers_and_merges(self):
+        due = datetime.utcnow() + timedelta(days=1, minutes=1)
+        for item in self.items[:2]:
+            mock_store.complete_review_schedule(mock_store.user_review_schedules(self.user_id, item["id"])[0])
+        mock_store.update_memory_item(self.items[2]["id"], {"title": "改名"})
+
+        # 冷却期内不发送
+        mock_store.mark_reminded(self.user_id, due - timedelta(minutes=30))
+        self.assertEqual(self.dispatcher.dispatch(due), 0)
+        self.assertEqual(self.dispatcher.dispatch(due + timedelta(minutes=31)), 1)
+        self.assertEqual(self._digests()[0].titles, ["改名"])
+
+    def test_deleted_items_leave_the_queue(self):
+        mock_store.delete_memory_item(self.items[0]["id"])
+        self.assertEqual(len(self.dispatcher.queue), 2)
+        self.assertEqual(self.dispatcher.dispatch(datetime.utcnow() + timedelta(days=2)), 1)
+        self.assertEqual(self._digests()[0].due_count, 2)
+
+    def test_file_sink(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "reminders.ndjson")
+            self.dispatcher.sink = FileSink(path)
+            self.dispatcher.dispatch(datetime.utcnow() + timedelta(days=1, minutes=1))
+            with open(path, encoding="utf-8") as f:
+                line = json.loads(f.readline())
+        self.assertEqual(line["due_count"], 3)
+        self.assertEqual(to_epoch_us(line["earliest_due"]) // 1_000_000, to_epoch_us(self.items[0]["created_at"] + timedelta(days=1)) // 1_000_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+"""
+批量提交复习结果测试
+"""
+
+import os
+import sys
+import time
+import unittest
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+import routers.reviews
+from main import app
+from dependencies import get_current_user
+from records import ReviewScheduleRecord
+from routers.review_sessions import _due_entries
+
+
+class TestReviewBatch(unittest.TestCase):
+    """离线复习结果一次回放"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "batch@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.items = [mock_store.create_memory_item(self.user["id"], {"content": f"批量 {n}"}) for n in range(2)]
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        for item in self.items:
+            mock_store.delete_memory_item(item["id"])
+
+    def _schedules(self, item):
+        return mock_store.user_review_schedules(self.user["id"], item["id"])
+
+    def test_batch_applies_once_per_item(self):
+        first, second = self._schedules(self.items[0])[:2]
+        other = self._schedules(self.items[1])[0]
+        reviewed = datetime.utcnow() - timedelta(days=2)
+        results = [
+            {"schedule_id": second["id"], "mastery": 90, "difficulty": "easy", "reviewed_at": (reviewed + timedelta(days=1)).isoformat()},
+            {"schedule_id": first["id"], "mastery": 70, "difficulty": "medium", "reviewed_at": reviewed.isoformat() + "Z"},
+            {"schedule_id": other["id"], "mastery": 40, "difficulty": "hard"},
+            {"schedule_id": other["id"], "mastery": 40, "difficulty": "hard"},
+            {"schedule_id": str(uuid.uuid4()), "mastery": 80, "difficulty": "medium"},
+        ]
+        versions = [mock_store.memory_items[i["id"]]["version"] for i in self.items]
+        response = self.client.post("/api/review_schedules/complete_batch", json={"results": results})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["completed"], 3)
+        self.assertEqual([r["status"] for r in data["results"]], ["completed", "completed", "completed", "duplicate", "not_found"])
+
+        item = mock_store.memory_items[self.items[0]["id"]]
+        self.assertEqual(item["review_count"], 2)
+        self.assertEqual(item["reps"], 2)
+        self.assertEqual(item["mastery"], 90)
+        self.assertEqual(item["review_date"], reviewed + timedelta(days=1))
+        self.assertAlmostEqual(item["last_interval"], 1.0)
+        # 每个条目只写一次
+        self.assertEqual([mock_store.memory_items[i["id"]]["version"] for i in self.items], [v + 1 for v in versions])
+        self.assertTrue(all(s["completed"] for s in (mock_store.get_review_schedule(first["id"]), mock_store.get_review_schedule(other["id"]))))
+
+        # 重连后重复提交同一批结果不会再次计数
+        replay = self.client.post("/api/review_schedules/complete_batch", json={"results": results[:3]}).json()
+        self.assertEqual(replay["completed"], 0)
+        self.assertEqual({r["status"] for r in replay["results"]}, {"already_completed"})
+        self.assertEqual(mock_store.memory_items[self.items[0]["id"]]["review_count"], 2)
+
+    def test_other_users_schedules_are_not_found(self):
+        schedule = self._schedules(self.items[0])[0]
+        self.user = {**self.user, "id": str(uuid.uuid4())}
+        data = self.client.post("/api/review_schedules/complete_batch", json={"results": [
+            {"schedule_id": schedule["id"], "mastery": 80, "difficulty": "medium"},
+        ]}).json()
+        self.assertEqual(data["results"][0]["status"], "not_found")
+        self.assertFalse(mock_store.get_review_schedule(schedule["id"])["completed"])
+
+    def test_concurrent_batches_complete_once(self):
+        schedule = self._schedules(self.items[0])[0]
+        body = {"results": [{"schedule_id": schedule["id"], "mastery": 80, "difficulty": "medium"}]}
+        review_changes = routers.reviews._review_changes
+
+        def slow_review_changes(*args):
+            # 放大检查与写入之间的窗口
+            time.sleep(0.05)
+            return review_changes(*args)
+
+        with patch.object(routers.reviews, "_review_changes", slow_review_changes):
+            with ThreadPoolExecutor(2) as pool:
+                responses = list(pool.map(lambda _: self.client.post("/api/review_schedules/complete_batch", json=body).json(), range(2)))
+        self.assertEqual(sorted(r["completed"] for r in responses), [0, 1])
+        self.assertEqual(mock_store.memory_items[self.items[0]["id"]]["review_count"], 1)
+
+    def test_orphan_schedule_not_completed(self):
+        sid = str(uuid.uuid4())
+        mock_store._apply("put", "review_schedules", sid, ReviewScheduleRecord(
+            id=sid, memory_item_id=str(uuid.uuid4()), user_id=self.user["id"],
+            review_date=datetime.utcnow(), completed=False, created_at=datetime.utcnow(),
+        ))
+        self.addCleanup(mock_store.delete_review_schedule, sid)
+        # 条目已不存在：先校验，复习计划不会被标记完成
+        response = self.client.post(f"/api/review_schedules/{sid}/complete", json={"mastery": 80, "difficulty": "medium"})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(mock_store.review_schedules[sid]["completed"])
+
+
+class TestReviewLadder(unittest.TestCase):
+    """复习阶梯随条目保存"""
+
+    def setUp(self):
+        self.user_id = str(uuid.uuid4())
+        self.item = mock_store.create_memory_item(self.user_id, {"content": "阶梯"})
+
+    def tearDown(self):
+        mock_store.delete_memory_item(self.item["id"])
+
+    def test_ladder_change_keeps_existing_items(self):
+        schedules = mock_store.user_review_schedules(self.user_id)
+        mock_store.complete_review_schedule(schedules[4])
+        # 缩短配置的阶梯后，已有条目仍按创建时的阶梯计算，第 5 次复习不会变成孤立行
+        with patch.object(mock_store, "REVIEW_LADDER", (1, 3)):
+            after = mock_store.user_review_schedules(self.user_id)
+            self.assertEqual(sorted(s["id"] for s in after), sorted(s["id"] for s in schedules))
+            self.assertTrue(mock_store.get_review_schedule(schedules[4]["id"])["completed"])
+            self.assertEqual(mock_store.get_review_schedule(schedules[3]["id"])["id"], schedules[3]["id"])
+            other = mock_store.create_memory_item(self.user_id, {"content": "新阶梯"})
+            try:
+                self.assertEqual(len(mock_store.user_review_schedules(self.user_id, other["id"])), 2)
+            finally:
+                mock_store.delete_memory_item(other["id"])
+
+    def test_trailing_occurrence_after_ladder(self):
+        user = {"id": self.user_id, "email": "ladder@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: user
+        self.addCleanup(app.dependency_overrides.clear)
+        client = TestClient(app)
+        for schedule in mock_store.user_review_schedules(self.user_id):
+            self.assertEqual(client.post(f"/api/review_schedules/{schedule['id']}/complete", json={"mastery": 80, "difficulty": "medium"}).status_code, 200)
+
+        # 阶梯走完后按调度器的 next_review_date 生成一次待复习，复习会话与提醒看到的是同一个日期
+        item = mock_store.memory_items[self.item["id"]]
+        pending = [s for s in mock_store.user_review_schedules(self.user_id) if not s["completed"]]
+        self.assertEqual(len(pending), 1)
+        trailing = pending[0]
+        self.assertEqual(trailing["review_date"], item["next_review_date"])
+        self.assertEqual(mock_store.next_due(item), item["next_review_date"])
+        self.assertEqual(mock_store.get_review_schedule(trailing["id"])["id"], trailing["id"])
+        entries = _due_entries(self.user_id, item["next_review_date"])
+        self.assertEqual([s["id"] for s, _, _ in entries], [trailing["id"]])
+
+        # 完成后保存该次复习，下一次使用新的 ID
+        self.assertEqual(client.post(f"/api/review_schedules/{trailing['id']}/complete", json={"mastery": 90, "difficulty": "easy"}).status_code, 200)
+        self.assertTrue(mock_store.get_review_schedule(trailing["id"])["completed"])
+        following = [s for s in mock_store.user_review_schedules(self.user_id) if not s["completed"]]
+        self.assertEqual(len(following), 1)
+        self.assertNotEqual(following[0]["id"], trailing["id"])
+        self.assertEqual(following[0]["review_date"], item["next_review_date"])
+        self.assertEqual(mock_store.get_review_schedule(following[0]["id"])["id"], following[0]["id"])
+
+
+if __name__ == "__main__":
+    unittest.main()
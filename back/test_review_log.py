@@ -0,0 +1,118 @@
+"""
+复习事件日志与保持率分析测试
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from main import app
+from dependencies import get_current_user
+from review_log import EVENT_DTYPE, ReviewEvent, ReviewLog, forgetting_curve, retention_stats
+from scheduler import AGAIN, GOOD
+
+
+def _events(user_id, n, stability, seed=0):
+    rng = np.random.default_rng(seed)
+    elapsed = rng.uniform(0.5, 60, n)
+    recalled = rng.random(n) < forgetting_curve(elapsed, stability)
+    now = datetime.utcnow()
+    return [
+        ReviewEvent(user_id, str(uuid.uuid4()), now, float(t), 5.0, GOOD if r else AGAIN, 80 if r else 30)
+        for t, r in zip(elapsed, recalled)
+    ]
+
+
+class TestReviewLog(unittest.TestCase):
+    """列式存储与分片文件"""
+
+    def test_columns_per_user(self):
+        log = ReviewLog(shards=4)
+        alice, bob = str(uuid.uuid4()), str(uuid.uuid4())
+        log.append(_events(alice, 3, 10) + _events(bob, 2, 10))
+        log.append(_events(alice, 1, 10))
+        self.assertEqual(len(log.columns(alice)), 4)
+        self.assertEqual(len(log.columns(bob)), 2)
+        self.assertEqual(len(log.columns(str(uuid.uuid4()))), 0)
+        self.assertEqual(log.columns(alice).dtype, EVENT_DTYPE)
+
+    def test_shard_files_survive_reopen_and_other_writers(self):
+        user = str(uuid.uuid4())
+        with tempfile.TemporaryDirectory() as tmp:
+            first = ReviewLog(shards=4)
+            first.open(tmp)
+            first.append(_events(user, 5, 10))
+            # 另一个 worker 追加到同一个分片
+            other = ReviewLog(shards=4)
+            other.open(tmp)
+            other.append(_events(user, 2, 10, seed=1))
+            self.assertEqual(len(first.columns(user)), 7)
+
+            # 写了一半的记录不会被读入
+            path = first._path(first._shard(uuid.UUID(user).bytes))
+            with open(path, "ab") as f:
+                f.write(b"\0" * 10)
+            reopened = ReviewLog(shards=4)
+            reopened.open(tmp)
+            self.assertEqual(len(reopened.columns(user)), 7)
+            first.close()
+
+    def test_fit_recovers_stability(self):
+        user = str(uuid.uuid4())
+        log = ReviewLog()
+        log.append(_events(user, 100_000, stability=12.0))
+        events = log.columns(user)
+        start = time.perf_counter()
+        stats = retention_stats(events)
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 0.05)
+        self.assertEqual(stats["reviews"], 100_000)
+        self.assertAlmostEqual(stats["stability_days"], 12.0, delta=1.5)
+        self.assertAlmostEqual(stats["predicted_retention"]["7"], float(forgetting_curve(7, 12.0)), delta=0.02)
+        self.assertTrue(all(abs(p["recall_rate"] - p["predicted"]) < 0.05 for p in stats["curve"]))
+
+    def test_empty_and_first_reviews(self):
+        stats = retention_stats(np.zeros(0, dtype=EVENT_DTYPE))
+        self.assertEqual(stats["reviews"], 0)
+        self.assertIsNone(stats["stability_days"])
+        self.assertEqual(stats["predicted_retention"], {})
+
+
+class TestRetentionEndpoint(unittest.TestCase):
+    """复习接口追加事件，统计接口从事件列计算"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "log@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.item = mock_store.create_memory_item(self.user["id"], {"content": "事件日志"})
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store.delete_memory_item(self.item["id"])
+
+    def test_reviews_are_logged(self):
+        first, second = mock_store.user_review_schedules(self.user["id"])[:2]
+        self.client.post(f"/api/review_schedules/{first['id']}/complete", json={"mastery": 80, "difficulty": "medium"})
+        reviewed_at = (datetime.utcnow() + timedelta(minutes=-1)).isoformat()
+        self.client.post("/api/review_schedules/complete_batch", json={"results": [
+            {"schedule_id": second["id"], "mastery": 40, "difficulty": "hard", "reviewed_at": reviewed_at},
+        ]})
+        data = self.client.get("/api/stats/retention").json()
+        self.assertEqual(data["reviews"], 2)
+        self.assertEqual(self.client.get("/api/stats/retention", params={"days": 1}).json()["reviews"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+今日复习会话接口测试
+"""
+
+import os
+import sys
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from main import app
+from dependencies import get_current_user
+
+AIDS = {"mindMap": {"id": "root", "label": "根"}, "mnemonics": [{"id": "m1", "title": "口诀", "content": "内容", "type": "rhyme"}], "sensoryAssociations": []}
+
+
+class TestReviewSession(unittest.TestCase):
+    """到期计划与条目、记忆辅助一次返回"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "session@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.items = []
+        for n, category in enumerate(["历史", "历史", "历史", "地理", "地理"]):
+            created = (datetime.utcnow() - timedelta(days=10 - n)).isoformat()
+            self.items.append(mock_store.create_memory_item(
+                self.user["id"], {"content": f"条目 {n}", "category": category, "memory_aids": AIDS, "created_at": created},
+                keep_progress=True,
+            ))
+        # 今天刚创建的条目没有到期计划
+        self.fresh = mock_store.create_memory_item(self.user["id"], {"content": "新条目"})
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        for item_id in list(mock_store.facets.item_ids(self.user["id"])):
+            mock_store.delete_memory_item(item_id)
+
+    def test_session_joins_items_and_aids(self):
+        response = self.client.get("/api/review_sessions/today")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["due_total"], 5)
+        entries = data["entries"]
+        self.assertEqual([e["item"]["id"] for e in entries], [i["id"] for i in self.items])
+        self.assertEqual(entries[0]["item"]["memory_aids"]["mnemonics"][0]["title"], "口诀")
+        # 10 天前创建的条目第 1、3、7 天的复习都已到期，只占一个位置
+        self.assertEqual(entries[0]["overdue_reviews"], 3)
+        self.assertEqual(entries[0]["schedule"]["memory_item_id"], entries[0]["item"]["id"])
+        self.assertNotIn(self.fresh["id"], [e["item"]["id"] for e in entries])
+
+    def test_limit_and_interleave(self):
+        data = self.client.get("/api/review_sessions/today", params={"limit": 4, "interleave": True}).json()
+        self.assertEqual(data["due_total"], 5)
+        self.assertEqual([e["item"]["category"] for e in data["entries"]], ["历史", "地理", "历史", "地理"])
+
+    def test_completion_changes_session(self):
+        first = self.client.get("/api/review_sessions/today")
+        etag = first.headers["etag"]
+        self.assertEqual(self.client.get("/api/review_sessions/today", headers={"If-None-Match": etag}).status_code, 304)
+
+        schedule_id = first.json()["entries"][-1]["schedule"]["id"]
+        self.client.post(f"/api/review_schedules/{schedule_id}/complete", json={"mastery": 80, "difficulty": "medium"})
+        after = self.client.get("/api/review_sessions/today", headers={"If-None-Match": etag})
+        self.assertEqual(after.status_code, 200)
+        # 6 天前创建的条目还有第 3 天的复习未完成
+        last = after.json()["entries"][-1]
+        self.assertEqual(last["overdue_reviews"], 1)
+        self.assertNotEqual(last["schedule"]["id"], schedule_id)
+
+    def test_gzip_when_accepted(self):
+        compressed = self.client.get("/api/review_sessions/today", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(compressed.headers["content-encoding"], "gzip")
+        self.assertEqual(compressed.headers["vary"], "Accept-Encoding")
+        self.assertLess(int(compressed.headers["content-length"]), len(compressed.content))
+
+        plain = self.client.get("/api/review_sessions/today", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", plain.headers)
+        self.assertEqual(plain.json()["entries"], compressed.json()["entries"])
+
+        refused = self.client.get("/api/review_sessions/today", headers={"Accept-Encoding": "gzip;q=0"})
+        self.assertNotIn("content-encoding", refused.headers)
+
+    def test_gzip_and_identity_have_distinct_etags(self):
+        compressed = self.client.get("/api/review_sessions/today", headers={"Accept-Encoding": "gzip"})
+        plain = self.client.get("/api/review_sessions/today", headers={"Accept-Encoding": "identity"})
+        self.assertNotEqual(compressed.headers["etag"], plain.headers["etag"])
+        # 任一表示的 ETag 都能换来 304，并带回客户端缓存的那个 ETag
+        for etag in (compressed.headers["etag"], plain.headers["etag"]):
+            again = self.client.get("/api/review_sessions/today", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+            self.assertEqual(again.status_code, 304)
+            self.assertEqual(again.headers["etag"], etag)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+"""
+间隔重复调度引擎测试
+"""
+
+import os
+import sys
+import time
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from main import app
+from dependencies import get_current_user
+from records import to_epoch_us
+from scheduler import (
+    AGAIN, DAY_US, EASY, FSRS, GOOD, HARD, SM2, ScheduleColumns, SchedulerParams,
+    convert_state, rating_from_review, review, scheduled_interval,
+)
+
+
+class TestEngine(unittest.TestCase):
+    """SM-2 与 FSRS 单次复习"""
+
+    def _run(self, params, ratings, label="medium"):
+        state = None
+        history = []
+        for rating in ratings:
+            elapsed = state.interval_days if state else 0
+            state = review(params, state and state.stability, state and state.sr_difficulty, state and state.reps, rating, elapsed, label)
+            history.append(state)
+        return history
+
+    def test_sm2_classic_intervals(self):
+        history = self._run(SchedulerParams(algorithm=SM2), [GOOD, GOOD, GOOD])
+        self.assertEqual([s.interval_days for s in history], [1, 6, 15])
+        self.assertAlmostEqual(history[-1].sr_difficulty, 2.5)
+
+        lapse = self._run(SchedulerParams(algorithm=SM2), [GOOD, GOOD, AGAIN, GOOD])
+        self.assertEqual([s.interval_days for s in lapse], [1, 6, 1, 1])
+        self.assertEqual(lapse[2].reps, 0)
+
+    def test_fsrs_intervals_grow_and_lapse_shrinks(self):
+        history = self._run(SchedulerParams(algorithm=FSRS), [GOOD, GOOD, GOOD, AGAIN])
+        intervals = [s.interval_days for s in history]
+        self.assertEqual(intervals[0], 4)
+        self.assertLess(intervals[0], intervals[1])
+        self.assertLess(intervals[1], intervals[2])
+        self.assertLess(intervals[3], intervals[2])
+        self.assertGreater(history[3].sr_difficulty, history[2].sr_difficulty)
+
+    def test_label_and_rating_effects(self):
+        easy = self._run(SchedulerParams(), [GOOD], label="easy")[0]
+        hard = self._run(SchedulerParams(), [GOOD], label="hard")[0]
+        self.assertLess(easy.sr_difficulty, hard.sr_difficulty)
+        self.assertEqual(rating_from_review(40), AGAIN)
+        self.assertEqual(rating_from_review(75), GOOD)
+        self.assertEqual(rating_from_review(75, "hard"), HARD)
+        self.assertEqual(rating_from_review(95, "easy"), EASY)
+
+    def test_retention_changes_interval(self):
+        stability = np.array([10.0, 100.0])
+        self.assertEqual(scheduled_interval(stability, SchedulerParams()).tolist(), [10, 100])
+        stricter = scheduled_interval(stability, SchedulerParams(desired_retention=0.95))
+        self.assertTrue(np.all(stricter < [10, 100]))
+        self.assertEqual(int(scheduled_interval(1e6, SchedulerParams(max_interval_days=365))), 365)
+
+    def test_invalid_params(self):
+        with self.assertRaises(ValueError):
+            SchedulerParams(algorithm="leitner").validate()
+
+
+class TestScheduleColumns(unittest.TestCase):
+    """列存储整体重算"""
+
+    def test_recompute_vectorized(self):
+        n = 100_000
+        columns = ScheduleColumns()
+        now = to_epoch_us(datetime.utcnow())
+        params = SchedulerParams()
+        rng = np.random.default_rng(0)
+        stabilities = rng.uniform(1, 200, n)
+        for k in range(n):
+            columns.upsert(f"i{k}", f"u{k % 10}", now, float(stabilities[k]), now + int(scheduled_interval(stabilities[k], params)) * DAY_US,
+                           FSRS, params.fingerprint())
+
+        ids, due = columns.recompute(params)
+        self.assertEqual(ids, [])
+
+        start = time.perf_counter()
+        ids, due = columns.recompute(params._replace(desired_retention=0.8))
+        elapsed = time.perf_counter() - start
+        self.assertGreater(len(ids), n * 0.9)
+        self.assertLess(elapsed, 0.5)
+        k = int(ids[0][1:])
+        self.assertEqual(due[0], now + int(scheduled_interval(stabilities[k], params._replace(desired_retention=0.8))) * DAY_US)
+
+        user_ids, _ = columns.recompute(params._replace(desired_retention=0.8), user_id="u3")
+        self.assertTrue(all(int(i[1:]) % 10 == 3 for i in user_ids))
+
+        columns.remove("i0")
+        self.assertEqual(len(columns), n - 1)
+        restored = ScheduleColumns()
+        restored.restore_state(columns.snapshot_state())
+        self.assertEqual(len(restored.recompute(params._replace(desired_retention=0.8))[0]), len(ids) - (ids[0] == "i0"))
+
+
+class TestReviewCompletion(unittest.TestCase):
+    """复习完成接口使用调度引擎"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "sched@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.item = mock_store.create_memory_item(self.user["id"], {"content": "调度"})
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store.delete_memory_item(self.item["id"])
+
+    def test_complete_updates_state_and_reschedule(self):
+        schedule_id = mock_store.user_review_schedules(self.user["id"])[0]["id"]
+        data = self.client.post(f"/api/review_schedules/{schedule_id}/complete", json={"mastery": 80, "difficulty": "medium"}).json()
+        item = mock_store.memory_items[self.item["id"]]
+        self.assertEqual(data["review_count"], 1)
+        self.assertIsNotNone(item["stability"])
+        self.assertEqual(item["reps"], 1)
+        interval = item["next_review_date"] - item["review_date"]
+        self.assertEqual(interval, timedelta(days=int(scheduled_interval(item["stability"], SchedulerParams()))))
+
+        self.assertEqual(mock_store.reschedule(SchedulerParams(), user_id=self.user["id"]), 0)
+        self.assertEqual(mock_store.reschedule(SchedulerParams(desired_retention=0.7), user_id=self.user["id"]), 1)
+        self.assertGreater(mock_store.memory_items[self.item["id"]]["next_review_date"] - item["review_date"], interval)
+        mock_store.reschedule(SchedulerParams(), user_id=self.user["id"])
+
+    def test_reschedule_keeps_dates_when_nothing_changed(self):
+        schedule_id = mock_store.user_review_schedules(self.user["id"])[0]["id"]
+        self.client.post(f"/api/review_schedules/{schedule_id}/complete", json={"mastery": 80, "difficulty": "medium"})
+        manual = datetime(2030, 1, 1)
+        self.client.put(f"/api/memory_items/{self.item['id']}", json={"next_review_date": manual.isoformat()})
+        item = mock_store.memory_items[self.item["id"]]
+        version = item["version"]
+
+        # 参数未变：手动设置的日期保留，也不写入
+        self.assertEqual(mock_store.reschedule(user_id=self.user["id"]), 0)
+        self.assertEqual(item["next_review_date"], manual)
+        self.assertEqual(item["version"], version)
+
+        # 参数变化：重算并经 update_memory_item 写入，version 与 updated_at 随之变化
+        updated_at = item["updated_at"]
+        self.assertEqual(mock_store.reschedule(mock_store.DEFAULT_PARAMS._replace(desired_retention=0.8), user_id=self.user["id"]), 1)
+        self.assertNotEqual(item["next_review_date"], manual)
+        self.assertEqual(item["version"], version + 1)
+        self.assertGreater(item["updated_at"], updated_at)
+        mock_store.reschedule(user_id=self.user["id"])
+
+    def test_algorithm_switch_converts_state(self):
+        schedule_id = mock_store.user_review_schedules(self.user["id"])[0]["id"]
+        self.client.post(f"/api/review_schedules/{schedule_id}/complete", json={"mastery": 80, "difficulty": "medium"})
+        item = mock_store.memory_items[self.item["id"]]
+        self.assertEqual(item["sr_algorithm"], FSRS)
+        stability, difficulty = item["stability"], item["sr_difficulty"]
+
+        # 切换到 SM-2：D 换算为 EF，下次复习时间按 SM-2 重算
+        sm2 = SchedulerParams(algorithm=SM2)
+        mock_store.reschedule(sm2, user_id=self.user["id"])
+        self.assertEqual(item["sr_algorithm"], SM2)
+        self.assertEqual(item["sr_difficulty"], convert_state(stability, difficulty, FSRS, SM2)[1])
+        self.assertGreaterEqual(item["sr_difficulty"], 1.3)
+        self.assertEqual(item["next_review_date"] - item["review_date"], timedelta(days=int(scheduled_interval(stability, sm2))))
+        self.assertEqual(mock_store.reschedule(sm2, user_id=self.user["id"]), 0)
+
+        mock_store.reschedule(SchedulerParams(), user_id=self.user["id"])
+        self.assertEqual(item["sr_algorithm"], FSRS)
+        self.assertAlmostEqual(item["sr_difficulty"], difficulty)
+
+    def test_untagged_state_is_tagged(self):
+        now = datetime.utcnow()
+        mock_store.update_memory_item(self.item["id"], {
+            "review_date": now, "next_review_date": now + timedelta(days=3), "stability": 3.0, "sr_difficulty": 5.0, "reps": 1,
+        })
+        mock_store.reschedule(SchedulerParams(), user_id=self.user["id"])
+        item = mock_store.memory_items[self.item["id"]]
+        self.assertEqual(item["sr_algorithm"], FSRS)
+        self.assertEqual(item["sr_difficulty"], 5.0)
+
+    def test_review_converts_other_algorithm_state(self):
+        state = review(SchedulerParams(), 10.0, 2.5, 3, rating=GOOD, elapsed_days=10, algorithm=SM2)
+        expected = review(SchedulerParams(), 10.0, 5.0, 3, rating=GOOD, elapsed_days=10)
+        self.assertEqual(state, expected)
+        self.assertEqual(convert_state(10.0, 5.0, FSRS, SM2), (10.0, 2.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+分享响应缓存测试
+"""
+
+import os
+import sys
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from main import app
+from dependencies import get_current_user
+from share_cache import SharePayloadCache, share_payloads
+
+
+def _aids(mnemonic_title):
+    return {
+        "mindMap": {"id": "root", "label": "根", "children": []},
+        "mnemonics": [{"id": "m1", "title": mnemonic_title, "content": "口诀", "type": "rhyme"}],
+        "sensoryAssociations": [],
+    }
+
+
+class TestSharePayloadCache(unittest.TestCase):
+    """预先序列化的分享响应与失效"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "share@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.item = mock_store.create_memory_item(self.user["id"], {"title": "唐诗", "content": "床前明月光", "memory_aids": _aids("旧口诀")})
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store.delete_memory_item(self.item["id"])
+
+    def _share(self, **extra):
+        body = {"memory_item_id": self.item["id"], "share_type": "mnemonic", **extra}
+        return self.client.post("/api/share", json=body).json()["share_id"]
+
+    def test_rendered_at_creation(self):
+        share_id = self._share()
+        misses = share_payloads.misses
+        response = self.client.get(f"/api/share/{share_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(share_payloads.misses, misses)
+        self.assertEqual(response.json()["title"], "唐诗 - 旧口诀")
+        self.assertEqual(response.headers["cache-control"], "public, max-age=300")
+
+        cached = self.client.get(f"/api/share/{share_id}", headers={"If-None-Match": response.headers["etag"]})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.headers["cache-control"], "public, max-age=300")
+
+    def test_invalidated_when_aids_change(self):
+        share_id = self._share()
+        etag = self.client.get(f"/api/share/{share_id}").headers["etag"]
+
+        # 复习等不涉及记忆辅助的写入不会丢弃缓存
+        mock_store.update_memory_item(self.item["id"], {"mastery": 40})
+        self.assertEqual(self.client.get(f"/api/share/{share_id}", headers={"If-None-Match": etag}).status_code, 304)
+
+        mock_store.update_memory_item(self.item["id"], {"memory_aids": _aids("新口诀")})
+        fresh = self.client.get(f"/api/share/{share_id}", headers={"If-None-Match": etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.json()["title"], "唐诗 - 新口诀")
+
+    def test_invalidated_when_title_changes(self):
+        share_id = self._share()
+        etag = self.client.get(f"/api/share/{share_id}").headers["etag"]
+        mock_store.update_memory_item(self.item["id"], {"title": "宋词"})
+        fresh = self.client.get(f"/api/share/{share_id}", headers={"If-None-Match": etag})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh.json()["title"], "宋词 - 旧口诀")
+
+    def test_deleted_and_expired(self):
+        share_id = self._share()
+        mock_store.delete_share(share_id)
+        self.assertEqual(self.client.get(f"/api/share/{share_id}").status_code, 404)
+
+        soon = self._share(expires_at=(datetime.utcnow() + timedelta(seconds=60)).isoformat())
+        max_age = int(self.client.get(f"/api/share/{soon}").headers["cache-control"].rsplit("=", 1)[1])
+        self.assertLessEqual(max_age, 60)
+
+        past = self._share(expires_at=(datetime.utcnow() - timedelta(seconds=1)).isoformat())
+        self.assertEqual(self.client.get(f"/api/share/{past}").status_code, 410)
+
+    def test_bounded(self):
+        cache = SharePayloadCache(max_entries=2)
+        mock_store.add_listener(cache.on_change)
+        try:
+            ids = [self._share() for _ in range(3)]
+            for share_id in ids:
+                cache.get(share_id)
+            self.assertEqual(len(cache), 2)
+            cache.get(ids[1])
+            cache.get(ids[0])
+            self.assertEqual(cache.hits, 1)
+            self.assertEqual(cache.misses, 4)
+        finally:
+            mock_store.remove_listener(cache.on_change)
+
+
+if __name__ == "__main__":
+    unittest.main()
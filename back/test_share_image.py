@@ -0,0 +1,164 @@
+"""
+分享卡片图片渲染测试
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+import share_image
+from main import app
+from dependencies import get_current_user
+from share_image import GAP_Y, NODE_HEIGHT, ShareImages, card_tree, layout, render_svg, share_images
+
+
+def _tree(depth, fanout, prefix="n"):
+    node = {"id": prefix, "label": prefix}
+    if depth:
+        node["children"] = [_tree(depth - 1, fanout - (i % 2), f"{prefix}{i}") for i in range(fanout)]
+    return node
+
+
+class TestTidyTree(unittest.TestCase):
+    """布局"""
+
+    def test_no_overlap_and_parents_centered(self):
+        nodes, columns, width, height = layout(_tree(4, 3))
+        by_depth = {}
+        for box in nodes:
+            by_depth.setdefault(box.depth, []).append(box.y)
+            if box.children:
+                self.assertAlmostEqual(box.y, (box.children[0].y + box.children[-1].y) / 2)
+        for ys in by_depth.values():
+            ys.sort()
+            for a, b in zip(ys, ys[1:]):
+                self.assertGreaterEqual(b - a, NODE_HEIGHT + GAP_Y - 1e-6)
+        self.assertEqual(len(columns), 5)
+        self.assertAlmostEqual(min(b.y for b in nodes), NODE_HEIGHT / 2)
+        self.assertAlmostEqual(max(b.y for b in nodes) + NODE_HEIGHT / 2, height)
+
+    def test_max_nodes(self):
+        nodes, _, _, _ = layout(_tree(6, 4), max_nodes=50)
+        self.assertEqual(len(nodes), 50)
+
+    def test_cards_for_other_share_types(self):
+        tree = card_tree({"title": "口诀", "share_type": "mnemonic", "content": {
+            "title": "口诀", "content": "第一句\n\n第二句", "keyPrinciples": [{"concept": "要点", "example": ""}],
+        }})
+        self.assertEqual([c["label"] for c in tree["children"]], ["第一句", "第二句", "要点"])
+        svg = render_svg({"title": "<b>", "share_type": "mindmap", "content": {"id": "r", "label": "a & b"}})
+        self.assertIn("a &amp; b", svg)
+        self.assertIn("&lt;b&gt;", svg)
+
+
+class TestShareImageEndpoint(unittest.TestCase):
+    """缓存与并发合并"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "image@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.item = mock_store.create_memory_item(self.user["id"], {"title": "导图", "content": "图片", "memory_aids": {
+            "mindMap": _tree(2, 3), "mnemonics": [], "sensoryAssociations": [],
+        }})
+        self.share_id = self.client.post("/api/share", json={"memory_item_id": self.item["id"], "share_type": "mindmap"}).json()["share_id"]
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store.delete_memory_item(self.item["id"])
+
+    @classmethod
+    def tearDownClass(cls):
+        share_images.close()
+
+    def test_svg_rendered_once(self):
+        url = f"/api/share/{self.share_id}/image"
+        renders = share_images.renders
+        first = self.client.get(url, params={"format": "svg"})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers["content-type"], "image/svg+xml")
+        self.assertTrue(first.content.startswith(b"<svg"))
+        self.assertIn(b">n22<", first.content)
+
+        again = self.client.get(url, params={"format": "svg"})
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(share_images.renders, renders + 1)
+        self.assertEqual(self.client.get(url, params={"format": "svg"}, headers={"If-None-Match": first.headers["etag"]}).status_code, 304)
+
+        # 记忆辅助变化后分享内容变化，图片随之重新渲染
+        mock_store.update_memory_item(self.item["id"], {"memory_aids": {"mindMap": _tree(1, 2, "m"), "mnemonics": [], "sensoryAssociations": []}})
+        changed = self.client.get(url, params={"format": "svg"})
+        self.assertNotEqual(changed.headers["etag"], first.headers["etag"])
+        self.assertEqual(share_images.renders, renders + 2)
+
+    def test_svg_is_default(self):
+        response = self.client.get(f"/api/share/{self.share_id}/image")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "image/svg+xml")
+
+    def test_png(self):
+        response = self.client.get(f"/api/share/{self.share_id}/image", params={"format": "png"})
+        if share_image.cairosvg is None:
+            self.assertEqual(response.status_code, 501)
+        else:
+            self.assertEqual(response.headers["content-type"], "image/png")
+            self.assertTrue(response.content.startswith(b"\x89PNG"))
+
+    def test_concurrent_requests_share_one_render(self):
+        images = ShareImages(workers=1)
+        body = self.client.get(f"/api/share/{self.share_id}").content
+
+        async def burst():
+            return await asyncio.gather(*(images.get("k.svg", body, "svg") for _ in range(5)))
+
+        try:
+            results = asyncio.run(burst())
+            # 服务进程是多线程的，进程池不能 fork
+            self.assertEqual(images._pool._mp_context.get_start_method(), "spawn")
+        finally:
+            images.close()
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(images.renders, 1)
+
+    def test_disk_hit_read_off_the_loop(self):
+        with tempfile.TemporaryDirectory() as directory:
+            images = ShareImages()
+            images.open(directory)
+            images._store("k.svg", b"<svg/>")
+            images.close()
+            with patch("share_image.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+                self.assertEqual(asyncio.run(images.get("k.svg", b"", "svg")), b"<svg/>")
+            to_thread.assert_called_once_with(images._load, "k.svg")
+            self.assertEqual(images.renders, 0)
+            self.assertEqual(images.cached("k.svg"), b"<svg/>")
+
+    def test_disk_cache_bounded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            images = ShareImages(disk_bytes=1000)
+            images.open(directory)
+            for n in range(10):
+                images._store(f"{n}.svg", b"x" * 300)
+                os.utime(os.path.join(directory, f"{n}.svg"), (n, n))
+            # 超过上限时删除最旧的文件，降到上限的 90% 以内
+            remaining = sorted(os.listdir(directory))
+            self.assertLessEqual(sum(os.path.getsize(os.path.join(directory, f)) for f in remaining), 900)
+            self.assertIn("9.svg", remaining)
+            self.assertNotIn("0.svg", remaining)
+
+            # 重新打开时按目录统计已有占用
+            reopened = ShareImages(disk_bytes=1000)
+            reopened.open(directory)
+            self.assertEqual(reopened._disk_size, 300 * len(remaining))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+分享浏览计数与 HyperLogLog 测试
+"""
+
+import os
+import sys
+import unittest
+import uuid
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from main import app
+from compactor import Compactor
+from dependencies import get_current_user
+from share_views import HyperLogLog, ShareViews, share_views
+
+
+class TestHyperLogLog(unittest.TestCase):
+    """独立访客估计"""
+
+    def test_estimate_and_merge(self):
+        hll = HyperLogLog(precision=10)
+        a, b = hll.empty(), hll.empty()
+        for n in range(6000):
+            hll.add(a, f"viewer-{n}".encode())
+        for n in range(4000, 10000):
+            hll.add(b, f"viewer-{n}".encode())
+            hll.add(b, f"viewer-{n}".encode())  # 重复访问不增加估计值
+        self.assertLess(abs(hll.estimate(bytes(a)) - 6000) / 6000, 0.1)
+        self.assertLess(abs(hll.estimate(hll.merge(bytes(a), bytes(b))) - 10000) / 10000, 0.1)
+        self.assertEqual(hll.estimate(None), 0)
+
+    def test_small_counts_exact_enough(self):
+        hll = HyperLogLog(precision=10)
+        registers = hll.empty()
+        for n in range(20):
+            hll.add(registers, f"v{n}".encode())
+        self.assertEqual(hll.estimate(bytes(registers)), 20)
+
+
+class TestShareViews(unittest.TestCase):
+    """批量写入与热门分享接口"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "views@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.item = mock_store.create_memory_item(self.user["id"], {"title": "热门", "content": "浏览"})
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store.delete_memory_item(self.item["id"])
+
+    def _share(self):
+        return self.client.post("/api/share", json={"memory_item_id": self.item["id"], "share_type": "mindmap"}).json()["share_id"]
+
+    def test_views_buffered_until_flush(self):
+        share_id = self._share()
+        for n in range(5):
+            self.client.get(f"/api/share/{share_id}", headers={"User-Agent": f"ua-{n % 2}"})
+        self.assertNotIn(share_id, mock_store.share_views)
+        self.assertEqual(share_views.stats(share_id), {"views": 5, "unique_viewers": 2})
+
+        share_views.flush()
+        row = mock_store.share_views[share_id]
+        self.assertEqual(row["views"], 5)
+        self.assertEqual(row["user_id"], self.user["id"])
+        self.client.get(f"/api/share/{share_id}", headers={"User-Agent": "ua-0"})
+        share_views.flush()
+        self.assertEqual(share_views.stats(share_id), {"views": 6, "unique_viewers": 2})
+
+    def test_failed_flush_keeps_counts(self):
+        share_id = self._share()
+        self.client.get(f"/api/share/{share_id}", headers={"User-Agent": "ua-0"})
+
+        def fail(*args):
+            # 写入期间又到达一次浏览
+            share_views.record(share_id, b"other-viewer")
+            raise OSError("disk full")
+
+        with patch.object(mock_store, "merge_rows", side_effect=fail):
+            with self.assertRaises(OSError):
+                share_views.flush()
+        # 失败的增量与写入期间新到的浏览合并，都保留在待写入的增量中
+        self.assertEqual(share_views.stats(share_id), {"views": 2, "unique_viewers": 2})
+        share_views.flush()
+        self.assertEqual(mock_store.share_views[share_id]["views"], 2)
+
+    def test_top_shares(self):
+        quiet, popular = self._share(), self._share()
+        for n in range(3):
+            self.client.get(f"/api/share/{popular}", headers={"X-Forwarded-For": f"10.0.0.{n}, 172.16.0.1"})
+        self.client.get(f"/api/share/{quiet}")
+        share_views.flush()
+        self.client.get(f"/api/share/{quiet}")
+
+        top = self.client.get("/api/share/top", params={"limit": 2}).json()
+        self.assertEqual([s["share_id"] for s in top], [popular, quiet])
+        self.assertEqual((top[0]["views"], top[0]["unique_viewers"]), (3, 3))
+        self.assertEqual(top[1]["views"], 2)
+        self.assertEqual(top[0]["title"], "热门")
+
+    def test_bounded_pending(self):
+        views = ShareViews(max_pending=2)
+        first, second = self._share(), self._share()
+        views.record(first, b"a")
+        self.assertEqual(views.flushes, 0)
+        views.record(second, b"a")
+        self.assertEqual(views.flushes, 1)
+        self.assertEqual(mock_store.share_views[first]["views"], 1)
+
+    def test_rows_removed_with_share(self):
+        share_id = self._share()
+        self.client.get(f"/api/share/{share_id}")
+        share_views.flush()
+        mock_store.delete_share(share_id)
+        self.assertNotIn(share_id, mock_store.share_views)
+
+        # 其他路径删除分享后留下的计数由压缩器回收
+        orphan = self._share()
+        self.client.get(f"/api/share/{orphan}")
+        share_views.flush()
+        mock_store._apply("delete", "shares", orphan)
+        Compactor().run_once()
+        self.assertNotIn(orphan, mock_store.share_views)
+
+        # 分享已不存在时，尚未写入的计数被丢弃
+        gone = self._share()
+        self.client.get(f"/api/share/{gone}")
+        mock_store.delete_share(gone)
+        share_views.flush()
+        self.assertNotIn(gone, mock_store.share_views)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+多 worker 共享存储（SQLite 变更日志）测试
+"""
+
+import copy
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+import uuid
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import mock_store
+from persistence import SQLiteJournal
+
+BACK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class _Replica:
+    """模拟一个 worker 的本地副本"""
+
+    def __init__(self, path, **kw):
+        self.rows = {}
+        self.journal = SQLiteJournal(path, **kw)
+        state, tail = self.journal.recover()
+        self.restore(state)
+        self.replay(tail)
+        self.journal.open()
+
+    def replay(self, records):
+        for _, op, _, key, value in records:
+            if op == "put":
+                self.rows[key] = value
+            elif op == "delete":
+                self.rows.pop(key, None)
+
+    def restore(self, state):
+        self.rows = dict(state or {})
+
+    def put(self, key, value):
+        with self.journal.transaction(self.replay, self.restore):
+            self.rows[key] = value
+            self.journal.append("put", "t", key, value)
+            if self.journal.should_snapshot():
+                self.journal.snapshot(lambda: self.rows)
+
+    def catch_up(self):
+        return self.journal.catch_up(self.replay, self.restore)
+
+
+class TestSQLiteJournal(unittest.TestCase):
+    """SQLiteJournal 单元测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "store.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_changes_propagate_between_connections(self):
+        a, b = _Replica(self.path), _Replica(self.path)
+        a.put("x", 1)
+        self.assertTrue(b.catch_up())
+        self.assertEqual(b.rows, {"x": 1})
+        self.assertFalse(b.catch_up())
+
+        # 写入前先追上其他连接的变更，序号全局连续
+        b.put("y", 2)
+        a.put("z", 3)
+        self.assertEqual(a.rows, {"x": 1, "y": 2, "z": 3})
+        self.assertEqual(a.journal.seq, 3)
+        a.journal.close()
+        b.journal.close()
+
+    def test_lagging_replica_reloads_snapshot(self):
+        a, b = _Replica(self.path, snapshot_every=3), _Replica(self.path, snapshot_every=3)
+        for n in range(10):
+            a.put(f"k{n}", n)
+        # 早期变更已被快照覆盖并删除，b 通过加载快照追上
+        self.assertTrue(b.catch_up())
+        self.assertEqual(b.rows, a.rows)
+        self.assertEqual(_Replica(self.path).rows, a.rows)
+        a.journal.close()
+        b.journal.close()
+
+    def test_failed_transaction_resyncs(self):
+        a = _Replica(self.path)
+        a.put("x", 1)
+        with self.assertRaises(RuntimeError):
+            with a.journal.transaction(a.replay, a.restore):
+                a.rows["bad"] = 0
+                a.journal.append("put", "t", "bad", 0)
+                raise RuntimeError("boom")
+        self.assertEqual(a.rows, {"x": 1})
+        self.assertEqual(a.journal.seq, 1)
+        a.journal.close()
+
+    def test_failed_transaction_without_changes_skips_resync(self):
+        a = _Replica(self.path)
+        a.put("x", 1)
+        restores = []
+        with self.assertRaises(RuntimeError):
+            with a.journal.transaction(a.replay, restores.append):
+                raise RuntimeError("conflict")
+        self.assertEqual(restores, [])
+        a.put("y", 2)
+        self.assertEqual(_Replica(self.path).rows, {"x": 1, "y": 2})
+        a.journal.close()
+
+    def test_append_requires_transaction(self):
+        a = _Replica(self.path)
+        with self.assertRaises(RuntimeError):
+            a.journal.append("put", "t", "x", 1)
+        a.journal.close()
+
+
+class TestSharedStore(unittest.TestCase):
+    """mock_store 跨进程共享测试"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = copy.deepcopy(mock_store._state())
+        self.user_id = str(uuid.uuid4())
+
+    def tearDown(self):
+        mock_store.close_store()
+        mock_store._restore(self.saved)
+        self.tmp.cleanup()
+
+    def _other_worker(self, code):
+        env = dict(os.environ, STORE_DATA_DIR=self.tmp.name, STORE_BACKEND="sqlite")
+        script = "import mock_store\nmock_store.open_store()\n" + textwrap.dedent(code) + "\nmock_store.close_store()\n"
+        result = subprocess.run([sys.executable, "-c", script], cwd=BACK_DIR, env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout.strip()
+
+    def test_writes_visible_across_workers(self):
+        mock_store.open_store(self.tmp.name, backend="sqlite")
+        self.assertTrue(mock_store.is_shared())
+
+        item_id = self._other_worker(f"""
+            item = mock_store.create_memory_item({self.user_id!r}, {{"content": "另一个 worker", "category": "历史"}})
+            print(item["id"])
+        """)
+        self.assertNotIn(item_id, mock_store.memory_items)
+        self.assertTrue(mock_store.sync())
+        self.assertEqual(mock_store.memory_items[item_id]["content"], "另一个 worker")
+        self.assertEqual(mock_store.facets.counts(self.user_id)["categories"], {"历史": 1})
+        self.assertEqual(len(mock_store.user_review_schedules(self.user_id)), 5)
+
+        # 本 worker 创建的扫码会话在另一个 worker 上确认
+        session = mock_store.create_qr_session()
+        self._other_worker(f"mock_store.confirm_qr_session({session['id']!r}, {self.user_id!r}, 'shared@example.com')")
+        mock_store.sync()
+        self.assertEqual(mock_store.get_qr_session(session["id"])["status"], "confirmed")
+
+        # 级联删除在另一个 worker 上同样生效
+        mock_store.delete_memory_item(item_id)
+        remaining = self._other_worker(f"print(len(mock_store.user_review_schedules({self.user_id!r})), {item_id!r} in mock_store.memory_items)")
+        self.assertEqual(remaining, "0 False")
+
+    def test_idempotency_key_shared_between_workers(self):
+        mock_store.open_store(self.tmp.name, backend="sqlite")
+        item = mock_store.create_memory_item(self.user_id, {"content": "幂等"})
+        share = {"memory_item_id": item["id"], "user_id": self.user_id, "share_type": "mindmap", "content_id": None,
+                 "share_content": "{}", "expires_at": None, "created_at": None}
+        first = mock_store.create_share({**share, "id": str(uuid.uuid4())}, idempotency_key="retry-1")
+        # 重试落到另一个 worker 上，返回同一个分享
+        retried = self._other_worker(f"""
+            share = mock_store.create_share({{**{share!r}, "id": "other"}}, idempotency_key="retry-1")
+            print(share["id"], len(mock_store.shares_by_item[{item['id']!r}]))
+        """)
+        self.assertEqual(retried, f"{first['id']} 1")
+
+    def test_version_conflict_does_not_reload(self):
+        mock_store.open_store(self.tmp.name, backend="sqlite")
+        item = mock_store.create_memory_item(self.user_id, {"content": "冲突"})
+        mock_store.update_memory_item(item["id"], {"mastery": 1}, expected_version=1)
+        with patch.object(mock_store._journal, "_resync") as resync:
+            with self.assertRaises(mock_store.VersionConflict):
+                mock_store.update_memory_item(item["id"], {"mastery": 2}, expected_version=1)
+            # 另一个 worker 抢先更新时冲突在写锁内才发现，同样只回滚
+            self._other_worker(f"mock_store.update_memory_item({item['id']!r}, {{'mastery': 3}})")
+            with self.assertRaises(mock_store.VersionConflict):
+                mock_store.update_memory_item(item["id"], {"mastery": 2}, expected_version=2)
+        resync.assert_not_called()
+        self.assertEqual(mock_store.memory_items[item["id"]]["mastery"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
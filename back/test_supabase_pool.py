@@ -0,0 +1,89 @@
+"""
+共享 Supabase/PostgREST 客户端测试
+"""
+
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from supabase_pool import SupabasePool
+
+
+class _PostgrestHandler(BaseHTTPRequestHandler):
+    """记录收到的请求，返回空结果集（HTTP/1.1 keep-alive）"""
+
+    protocol_version = "HTTP/1.1"
+    seen = []
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        type(self).seen.append((self.command, self.path, self.headers.get("Authorization"), self.headers.get("apiKey")))
+        body = json.dumps([]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSupabasePool(unittest.TestCase):
+    """连接池复用与按请求附加 JWT"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _PostgrestHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _PostgrestHandler.seen = []
+        self.pool = SupabasePool(self.url, "anon-key")
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_per_request_jwt_on_shared_session(self):
+        alice = self.pool.for_token("alice-jwt")
+        bob = self.pool.for_token("bob-jwt")
+        alice.table("memory_items").select("*").eq("id", "1").execute()
+        bob.table("memory_items").select("id").execute()
+        bob.rpc("get_stats", {"days": 7}).execute()
+
+        auth = [seen[2] for seen in _PostgrestHandler.seen]
+        self.assertEqual(auth, ["Bearer alice-jwt", "Bearer bob-jwt", "Bearer bob-jwt"])
+        self.assertTrue(all(seen[3] == "anon-key" for seen in _PostgrestHandler.seen))
+        self.assertEqual(_PostgrestHandler.seen[2][:2], ("POST", "/rest/v1/rpc/get_stats"))
+        # 共享会话本身的 Authorization 未被修改
+        self.assertEqual(self.pool.postgrest.session.headers["Authorization"], "Bearer anon-key")
+
+    def test_connection_reuse_metrics(self):
+        for n in range(5):
+            self.pool.for_token(f"user-{n}").table("shares").select("*").execute()
+        metrics = self.pool.metrics.snapshot()
+        self.assertEqual(metrics["clients_created"], 1)
+        self.assertEqual(metrics["requests"], 5)
+        self.assertEqual(metrics["connections_opened"], 1)
+        self.assertEqual(metrics["connections_reused"], 4)
+        self.assertEqual(metrics["reuse_ratio"], 0.8)
+
+
+if __name__ == "__main__":
+    unittest.main()
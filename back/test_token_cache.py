@@ -0,0 +1,84 @@
+"""
+JWT 验证缓存测试
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jwt
+from fastapi import HTTPException
+
+import dependencies
+from config import settings
+from dependencies import get_current_user
+
+
+def _token(secret=None, **claims):
+    payload = {"sub": str(uuid.uuid4()), "email": "jwt@example.com", "exp": time.time() + 3600, **claims}
+    return jwt.encode(payload, secret or settings.SUPABASE_JWT_SECRET, algorithm="HS256")
+
+
+def _authenticate(token):
+    return asyncio.run(get_current_user(f"Bearer {token}"))
+
+
+class TestTokenCache(unittest.TestCase):
+    """已验证令牌与被拒绝令牌的缓存"""
+
+    def test_valid_token_verified_once(self):
+        token = _token(full_name="测试")
+        with patch.object(dependencies.jwt, "decode", wraps=jwt.decode) as decode:
+            first = _authenticate(token)
+            second = _authenticate(token)
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first["token"], token)
+        self.assertEqual(first["full_name"], "测试")
+
+        # 调用方修改返回值不影响缓存
+        first["id"] = "changed"
+        self.assertNotEqual(_authenticate(token)["id"], "changed")
+        self.assertGreater(dependencies._valid_tokens.metrics()["hit_rate"], 0)
+
+    def test_cached_until_exp(self):
+        exp = time.time() + 60
+        token = _token(exp=exp)
+        _authenticate(token)
+        with patch.object(dependencies.jwt, "decode", wraps=jwt.decode) as decode:
+            with patch("ttl_store.now_us", return_value=int((exp - 1) * 1_000_000)):
+                _authenticate(token)
+            self.assertEqual(decode.call_count, 0)
+            # 过了 exp 缓存不再命中，重新验证
+            with patch("ttl_store.now_us", return_value=int((exp + 1) * 1_000_000)):
+                _authenticate(token)
+            self.assertEqual(decode.call_count, 1)
+
+    def test_rejected_tokens_cached(self):
+        forged = _token(secret="another-secret-that-is-long-enough-for-hs256")
+        with patch.object(dependencies.jwt, "decode", wraps=jwt.decode) as decode:
+            for _ in range(3):
+                with self.assertRaises(HTTPException) as raised:
+                    _authenticate(forged)
+                self.assertEqual(raised.exception.status_code, 401)
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(raised.exception.detail, "Invalid token")
+
+    def test_missing_sub_is_unauthorized(self):
+        token = jwt.encode({"email": "x@example.com", "exp": time.time() + 60}, settings.SUPABASE_JWT_SECRET, algorithm="HS256")
+        with self.assertRaises(HTTPException) as raised:
+            _authenticate(token)
+        self.assertEqual(raised.exception.status_code, 401)
+        with self.assertRaises(HTTPException) as raised:
+            _authenticate(token)
+        self.assertEqual(raised.exception.detail, "Invalid token: 'sub' claim missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
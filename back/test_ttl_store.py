@@ -0,0 +1,136 @@
+"""
+到期索引与临时数据回收测试
+"""
+
+import os
+import sys
+import unittest
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import mock_store
+from main import app
+from dependencies import get_current_user
+from records import to_epoch_us
+from scheduler import DAY_US
+from ttl_store import ExpiryHeap, TTLStore, now_us
+
+
+class TestExpiryHeap(unittest.TestCase):
+    """最小堆与惰性删除"""
+
+    def test_pop_due_skips_stale_entries(self):
+        heap = ExpiryHeap()
+        heap.set("a", 10)
+        heap.set("b", 20)
+        heap.set("a", 30)  # 续期后旧堆项失效
+        heap.set("c", 5)
+        heap.discard("c")
+        self.assertEqual(heap.pop_due(25, limit=10), ["b"])
+        self.assertEqual(heap.deadline("a"), 30)
+        self.assertEqual(heap.pop_due(100, limit=10), ["a"])
+        self.assertEqual(len(heap), 0)
+
+    def test_heap_stays_bounded_under_churn(self):
+        heap = ExpiryHeap()
+        for n in range(50000):
+            heap.set(n % 100, n)
+        self.assertEqual(len(heap), 100)
+        self.assertLess(len(heap._heap), 2 * 100 + 1024 + 1)
+        self.assertEqual(len(heap.pop_soonest(10)), 10)
+
+
+class TestTTLStore(unittest.TestCase):
+    """进程内 TTL 键值存储"""
+
+    def test_expiry_and_limit(self):
+        store = TTLStore("test", ttl_seconds=60, max_entries=3)
+        store.set("short", 1, ttl_seconds=-1)
+        self.assertIsNone(store.get("short"))
+        for key in "abc":
+            store.set(key, key.upper())
+        # 超出容量时淘汰最早到期的键
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.counters["evicted"], 1)
+        self.assertEqual(store.get("a"), "A")
+
+        self.assertEqual(store.expire_due(limit=10, now=now_us() + 61_000_000), 3)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.metrics()["expired"], 3)
+
+
+class TestEphemeralTables(unittest.TestCase):
+    """二维码会话、分享的到期回收与幂等键"""
+
+    def setUp(self):
+        self.user = {"id": str(uuid.uuid4()), "email": "ttl@example.com", "full_name": "", "token": ""}
+        app.dependency_overrides[get_current_user] = lambda: self.user
+        self.client = TestClient(app)
+        self.item = mock_store.create_memory_item(self.user["id"], {"content": "到期"})
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store.delete_memory_item(self.item["id"])
+
+    def test_qr_sessions_expire(self):
+        session = mock_store.create_qr_session()
+        deadline = mock_store.expiry["qr_sessions"].deadline(session["id"])
+        self.assertEqual(deadline, to_epoch_us(session["created_at"]) + 300 * 1_000_000)
+        self.assertIsNotNone(mock_store.get_qr_session(session["id"]))
+
+        mock_store.expire_due(limit=1_000_000, now=deadline)
+        self.assertNotIn(session["id"], mock_store.qr_sessions)
+        self.assertEqual(self.client.get("/api/auth/qr/status", params={"login_id": session["id"]}).status_code, 404)
+        self.assertGreaterEqual(mock_store.expiry_metrics()["qr_sessions"]["expired"], 1)
+
+    def test_qr_session_limit(self):
+        limit = mock_store._MAX_ROWS["qr_sessions"]
+        mock_store._MAX_ROWS["qr_sessions"] = len(mock_store.qr_sessions) + 2
+        try:
+            first = mock_store.create_qr_session()
+            mock_store.create_qr_session()
+            mock_store.create_qr_session()
+            self.assertNotIn(first["id"], mock_store.qr_sessions)
+            self.assertEqual(len(mock_store.qr_sessions), mock_store._MAX_ROWS["qr_sessions"])
+        finally:
+            mock_store._MAX_ROWS["qr_sessions"] = limit
+
+    def test_expired_shares_kept_for_retention(self):
+        expires_at = datetime.utcnow() + timedelta(hours=1)
+        share_id = self.client.post("/api/share", json={
+            "memory_item_id": self.item["id"], "share_type": "mindmap", "expires_at": expires_at.isoformat(),
+        }).json()["share_id"]
+        deadline = mock_store.expiry["shares"].deadline(share_id)
+        self.assertEqual(deadline, to_epoch_us(expires_at) + 7 * DAY_US)
+
+        mock_store.expire_due(limit=1_000_000, now=deadline - 1)
+        self.assertIn(share_id, mock_store.shares)
+        mock_store.expire_due(limit=1_000_000, now=deadline)
+        self.assertNotIn(share_id, mock_store.shares)
+        self.assertNotIn(self.item["id"], mock_store.shares_by_item)
+
+    def test_idempotency_key(self):
+        body = {"memory_item_id": self.item["id"], "share_type": "mindmap"}
+        key = str(uuid.uuid4())
+        first = self.client.post("/api/share", json=body, headers={"Idempotency-Key": key}).json()
+        retry = self.client.post("/api/share", json=body, headers={"Idempotency-Key": key}).json()
+        self.assertEqual(first, retry)
+        self.assertEqual(len(mock_store.shares_by_item[self.item["id"]]), 1)
+        other = self.client.post("/api/share", json=body).json()
+        self.assertNotEqual(other["share_id"], first["share_id"])
+
+        # 键保存在存储中（其他 worker 可见），按到期索引回收
+        row = mock_store.idempotency_keys[f"{self.user['id']}:{key}"]
+        self.assertEqual(row["share_id"], first["share_id"])
+        mock_store.expire_due(limit=1_000_000, now=mock_store.expiry["idempotency_keys"].deadline(row["key"]))
+        self.assertNotIn(row["key"], mock_store.idempotency_keys)
+        again = self.client.post("/api/share", json=body, headers={"Idempotency-Key": key}).json()
+        self.assertNotEqual(again["share_id"], first["share_id"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+用户按 ID / 微信 openid / unionid 索引测试
+"""
+
+import copy
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jwt
+from fastapi.testclient import TestClient
+
+import mock_store
+from config import settings
+from main import app
+from dependencies import get_current_user
+from reminders import _wechat_openid
+
+
+class TestUserIndex(unittest.TestCase):
+    """索引随 create_user / update_user 维护，重启后重建"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = copy.deepcopy(mock_store._state())
+        self.email = f"{uuid.uuid4()}@membuddy.local"
+        self.user = mock_store.create_user(self.email, "微信用户", "")
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+        mock_store.close_store()
+        mock_store._restore(self.saved)
+        self.tmp.cleanup()
+
+    def test_lookup_by_id_and_wechat_ids(self):
+        self.assertIs(mock_store.get_user_by_id(self.user["id"]), self.user)
+        self.assertIsNone(mock_store.find_wechat_user("openid-1"))
+
+        mock_store.update_user(self.email, {"wechat_openid": "openid-1", "wechat_unionid": "union-1"})
+        self.assertIs(mock_store.find_wechat_user("openid-1"), self.user)
+        # 同一微信账号在另一个应用中的 openid 不同，按 unionid 找到
+        self.assertIs(mock_store.find_wechat_user("openid-2", "union-1"), self.user)
+        self.assertEqual(_wechat_openid(self.user["id"]), "openid-1")
+
+        mock_store.update_user(self.email, {"wechat_openid": "openid-3", "wechat_unionid": None})
+        self.assertIsNone(mock_store.find_wechat_user("openid-1"))
+        self.assertIsNone(mock_store.find_wechat_user("openid-2", "union-1"))
+        self.assertIs(mock_store.find_wechat_user("openid-3"), self.user)
+
+    def test_reset_password_by_id(self):
+        app.dependency_overrides[get_current_user] = lambda: {"id": self.user["id"], "email": self.email, "full_name": "", "token": ""}
+        client = TestClient(app)
+        self.assertEqual(client.post("/api/auth/reset-password", json={"password": "new-secret"}).status_code, 200)
+        self.assertNotEqual(mock_store.users[self.email]["password"], "new-secret")
+        self.assertTrue(mock_store.check_password(mock_store.users[self.email], "new-secret"))
+
+        app.dependency_overrides[get_current_user] = lambda: {"id": str(uuid.uuid4()), "email": "", "full_name": "", "token": ""}
+        self.assertEqual(client.post("/api/auth/reset-password", json={"password": "x"}).status_code, 404)
+
+    def test_secrets_not_persisted(self):
+        mock_store.open_store(self.tmp.name)
+        client = TestClient(app)
+        email = f"{uuid.uuid4()}@example.com"
+        self.assertEqual(client.post("/api/auth/login", json={"email": email, "password": "plain-secret"}).status_code, 200)
+        self.assertEqual(client.post("/api/auth/login", json={"email": email, "password": "wrong"}).status_code, 401)
+
+        login_id = client.post("/api/auth/qr/prepare").json()["login_id"]
+        app.dependency_overrides[get_current_user] = lambda: {"id": self.user["id"], "email": self.email, "full_name": "扫码", "token": ""}
+        self.assertTrue(client.post("/api/auth/qr/confirm", params={"login_id": login_id}).json()["ok"])
+        token = client.get("/api/auth/qr/status", params={"login_id": login_id}).json()["access_token"]
+        claims = jwt.decode(token, settings.SUPABASE_JWT_SECRET, algorithms=["HS256"])
+        self.assertEqual((claims["sub"], claims["email"], claims["full_name"]), (self.user["id"], self.email, "扫码"))
+
+        # 日志与快照中只有密码哈希，没有访问令牌
+        mock_store._journal.snapshot(mock_store._state)
+        mock_store.close_store()
+        for name in os.listdir(self.tmp.name):
+            with open(os.path.join(self.tmp.name, name), "rb") as f:
+                data = f.read()
+            self.assertNotIn(b"plain-secret", data)
+            self.assertNotIn(token.encode(), data)
+
+    def test_rebuilt_after_restart(self):
+        mock_store.open_store(self.tmp.name)
+        user = mock_store.create_user(f"{uuid.uuid4()}@membuddy.local", "", "")
+        mock_store.update_user(user["email"], {"wechat_openid": "openid-restart"})
+        mock_store.close_store()
+
+        mock_store._restore(copy.deepcopy(self.saved))
+        self.assertIsNone(mock_store.find_wechat_user("openid-restart"))
+        mock_store.open_store(self.tmp.name)
+        self.assertEqual(mock_store.find_wechat_user("openid-restart")["id"], user["id"])
+        self.assertEqual(mock_store.get_user_by_id(user["id"])["email"], user["email"])
+
+
+if __name__ == "__main__":
+    unittest.main()
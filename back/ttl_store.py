@@ -0,0 +1,158 @@
+"""TTL Store
+按到期时间索引的临时数据
+
+- ExpiryHeap：键 -> 到期时间（纪元微秒）的最小堆；更新或删除时旧堆项留在堆中，出堆时丢弃，
+  过期堆项过多时整体重建，堆大小保持在键数的常数倍以内
+- TTLStore：带 ExpiryHeap 的进程内键值存储（如已验证的 JWT），读取时惰性判断过期，
+  后台按批回收到期键；超过 max_entries 时淘汰最早到期的键
+- mock_store 中的分享、二维码登录会话与幂等键用同样的 ExpiryHeap 建立到期索引，到期行经 _apply 删除（会写入日志）；
+  幂等键需要在多个 worker 之间共享，因此保存在存储中而不是 TTLStore
+"""
+
+import heapq
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+
+class ExpiryHeap:
+    """键 -> 到期时间的最小堆（惰性删除）；调用方负责加锁"""
+
+    def __init__(self):
+        self._heap: List[Tuple[int, Hashable]] = []
+        self._deadlines: Dict[Hashable, int] = {}
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def set(self, key: Hashable, deadline_us: Optional[int]) -> None:
+        """deadline_us 为 None 表示永不过期"""
+        if deadline_us is None:
+            self._deadlines.pop(key, None)
+            return
+        if self._deadlines.get(key) == deadline_us:
+            return
+        self._deadlines[key] = deadline_us
+        heapq.heappush(self._heap, (deadline_us, key))
+        if len(self._heap) > 2 * len(self._deadlines) + 1024:
+            self._heap = [(deadline, k) for k, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, key: Hashable) -> None:
+        self._deadlines.pop(key, None)
+
+    def deadline(self, key: Hashable) -> Optional[int]:
+        return self._deadlines.get(key)
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._deadlines.clear()
+
+    def _pop(self) -> Optional[Tuple[int, Hashable]]:
+        while self._heap:
+            deadline, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                return deadline, key
+        return None
+
+    def pop_due(self, now: int, limit: int) -> List[Hashable]:
+        """取出最多 limit 个到期时间不晚于 now 的键"""
+        due = []
+        while len(due) < limit and self._heap and self._heap[0][0] <= now:
+            entry = self._pop()
+            if entry is None:
+                break
+            if entry[0] > now:
+                # 丢弃失效堆项后堆顶已不再到期，放回
+                self.set(entry[1], entry[0])
+                break
+            due.append(entry[1])
+        return due
+
+    def pop_soonest(self, count: int) -> List[Hashable]:
+        """取出最早到期的 count 个键（超过容量时淘汰用）"""
+        keys = []
+        while len(keys) < count:
+            entry = self._pop()
+            if entry is None:
+                break
+            keys.append(entry[1])
+        return keys
+
+
+class TTLStore:
+    """进程内带过期时间的键值存储"""
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int):
+        self.name = name
+        self.ttl_us = int(ttl_seconds * 1_000_000)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values: Dict[Hashable, Any] = {}
+        self._expiry = ExpiryHeap()
+        self.counters = Counter()
+
+    def __len__(self):
+        return len(self._values)
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl_us = self.ttl_us if ttl_seconds is None else int(ttl_seconds * 1_000_000)
+        with self._lock:
+            self._values[key] = value
+            self._expiry.set(key, now_us() + ttl_us)
+            over = len(self._values) - self.max_entries
+            if over > 0:
+                for evicted in self._expiry.pop_soonest(over):
+                    del self._values[evicted]
+                self.counters["evicted"] += over
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            deadline = self._expiry.deadline(key)
+            # 尚未被后台回收的过期键同样视为不存在
+            if deadline is None or deadline <= now_us():
+                self.counters["misses"] += 1
+                return default
+            self.counters["hits"] += 1
+            return self._values[key]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            self._expiry.discard(key)
+            return self._values.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+            self._expiry.clear()
+
+    def expire_due(self, limit: int, now: Optional[int] = None) -> int:
+        """回收最多 limit 个到期键，返回回收数"""
+        with self._lock:
+            keys = self._expiry.pop_due(now_us() if now is None else now, limit)
+            for key in keys:
+                del self._values[key]
+            self.counters["expired"] += len(keys)
+            return len(keys)
+
+    def metrics(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "entries": len(self._values), "max_entries": self.max_entries, **self.counters,
+            "hit_rate": self.counters["hits"] / lookups if lookups else None,
+        }
+
+
+# 由后台压缩器按批回收的 TTLStore
+registry: List[TTLStore] = []
+
+
+def register(store: TTLStore) -> TTLStore:
+    registry.append(store)
+    return store